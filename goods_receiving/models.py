@@ -2,6 +2,7 @@ from django.db import models
 from django.utils import timezone
 from users.models import CustomUser
 from inventory.models import Item, Supplier
+from inventory.numbering import next_document_number
 from purchase_requisition.models import PurchaseRequisition
 
 class GoodsReceivingNote(models.Model):
@@ -21,19 +22,7 @@ class GoodsReceivingNote(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.grn_no:
-            today = timezone.now().date()
-            prefix = f"GRN-{today.strftime('%Y%m')}-"
-            last_grn = GoodsReceivingNote.objects.filter(
-                grn_no__startswith=prefix
-            ).order_by('-grn_no').first()
-            
-            if last_grn:
-                last_number = int(last_grn.grn_no.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-                
-            self.grn_no = f"{prefix}{new_number:04d}"
+            self.grn_no = next_document_number('GRN', GoodsReceivingNote, 'grn_no')
             
         # Update PR status to 'received' if PR is provided
         if self.pr and self.pr.status == 'ordered':
@@ -41,6 +30,13 @@ class GoodsReceivingNote(models.Model):
             self.pr.save()
             
         super().save(*args, **kwargs)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='grn_created_idx'),
+            models.Index(fields=['supplier', '-created_at'], name='grn_supplier_created_idx'),
+            models.Index(fields=['-date'], name='grn_date_idx'),
+        ]
 
 class GRNItem(models.Model):
     grn = models.ForeignKey(GoodsReceivingNote, on_delete=models.CASCADE, related_name='items')
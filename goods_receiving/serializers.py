@@ -1,8 +1,10 @@
 from rest_framework import serializers
+from inventory.fieldsets import DynamicFieldsMixin
 from goods_receiving.models import GoodsReceivingNote, GRNItem
 from inventory.serializers import ItemSerializer, SupplierSerializer
 
-class GRNItemSerializer(serializers.ModelSerializer):
+class GRNItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('item_details',)
     item_details = ItemSerializer(source='item', read_only=True)
     item_code = serializers.ReadOnlyField(source='item.code')
     item_description = serializers.ReadOnlyField(source='item.description')
@@ -12,7 +14,8 @@ class GRNItemSerializer(serializers.ModelSerializer):
         model = GRNItem
         fields = '__all__'
 
-class GoodsReceivingNoteSerializer(serializers.ModelSerializer):
+class GoodsReceivingNoteSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('supplier_details',)
     items = GRNItemSerializer(many=True, read_only=True)
     supplier_details = SupplierSerializer(source='supplier', read_only=True)
     pr_no = serializers.ReadOnlyField(source='pr.pr_no')
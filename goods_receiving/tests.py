@@ -1,3 +1,166 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from inventory import services
+from inventory.models import Category, UnitOfMeasure, Item, ItemTransaction, Supplier
+from goods_receiving.models import GoodsReceivingNote, GRNItem
+
+User = get_user_model()
+
+
+class GRNBulkPostingTests(TestCase):
+    """Test cases for document-level GRN posting"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="storekeeper", password="password123")
+        self.supplier = Supplier.objects.create(name="Test Supplier")
+        self.items = [
+            Item.objects.create(code=f"ITEM{n:03d}", description=f"Item {n}")
+            for n in range(30)
+        ]
+
+    def _receive(self, items):
+        grn = GoodsReceivingNote.objects.create(
+            supplier=self.supplier,
+            date=timezone.now().date(),
+            received_by=self.user
+        )
+        with CaptureQueriesContext(connection) as queries:
+            services.receive_grn_items(grn, [
+                {'item_id': item.id, 'quantity': 4, 'unit_price': '2.50'}
+                for item in items
+            ])
+        return grn, len(queries)
+
+    def test_lines_and_ledger_are_posted(self):
+        """Test that bulk posting creates lines, ledger rows and balances"""
+        grn, _ = self._receive(self.items[:3])
+
+        self.assertEqual(grn.items.count(), 3)
+        self.assertEqual(grn.items.first().total_price, Decimal('10.00'))
+        self.assertEqual(
+            ItemTransaction.objects.filter(reference_type='GRN', reference_id=grn.id).count(), 3
+        )
+        item = Item.objects.get(pk=self.items[0].pk)
+        self.assertEqual(item.current_balance, 4)
+        self.assertEqual(item.current_price, Decimal('2.50'))
+
+    def test_query_count_does_not_grow_with_lines(self):
+        """Test that a 30-line GRN costs as many queries as a 3-line one"""
+        _, small = self._receive(self.items[:3])
+        _, large = self._receive(self.items)
+
+        self.assertEqual(small, large)
+        self.assertEqual(GRNItem.objects.count(), 33)
+
+
+class GoodsReceivingAPIQueryTests(TestCase):
+    """Lock in the query budget of the goods receiving endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="storekeeper", password="password123")
+        supplier = Supplier.objects.create(name="Test Supplier")
+        category = Category.objects.create(name="Test Category")
+        uom = UnitOfMeasure.objects.create(name="Each", abbreviation="EA")
+        items = [
+            Item.objects.create(code=f"ITEM{n:03d}", description=f"Item {n}", category=category, unit_of_measure=uom)
+            for n in range(3)
+        ]
+        for _ in range(5):
+            self.grn = GoodsReceivingNote.objects.create(
+                supplier=supplier,
+                date=timezone.now().date(),
+                received_by=self.user,
+                checked_by=self.user
+            )
+            services.receive_grn_items(self.grn, [
+                {'item_id': item.id, 'quantity': 2, 'unit_price': '1.50'} for item in items
+            ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_grn_list(self):
+        """Test listing GRNs costs count + page + items"""
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/goods-receiving-notes/')
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertNotIn('supplier_details', response.data['results'][0])
+
+    def test_grn_list_expanded(self):
+        """Test expanding suppliers and item details keeps the query budget"""
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                '/api/goods-receiving-notes/', {'expand': 'supplier_details,items.item_details'}
+            )
+        result = response.data['results'][0]
+        self.assertEqual(result['supplier_details']['name'], "Test Supplier")
+        self.assertEqual(result['items'][0]['item_details']['category_name'], "Test Category")
+
+    def test_grn_detail(self):
+        """Test retrieving a GRN costs the row + its items"""
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/goods-receiving-notes/{self.grn.id}/')
+
+    def test_item_list(self):
+        """Test the line endpoint joins its items"""
+        with self.assertNumQueries(2):
+            self.client.get('/api/grn-items/')
+
+
+class GRNCreateValidationTests(TestCase):
+    """Test cases for checking GRN lines before they are posted"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="storekeeper", password="password123")
+        self.supplier = Supplier.objects.create(name="Test Supplier")
+        self.item = Item.objects.create(code="ITEM001", description="Item 1")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create(self, lines):
+        return self.client.post('/api/goods-receiving-notes/', {
+            'supplier': self.supplier.id,
+            'date': timezone.now().date().isoformat(),
+            'received_by': self.user.id,
+            'items': lines,
+        }, format='json')
+
+    def test_valid_lines_are_posted(self):
+        """Test that lines naming the item either way are received"""
+        response = self._create([{'item': self.item.id, 'quantity': 3, 'unit_price': '2.00'}])
+
+        self.assertEqual(response.status_code, 201)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_balance, 3)
+
+    def test_duplicate_items_are_rejected(self):
+        """Test that two lines for the same item are a 400, not an integrity error"""
+        response = self._create([
+            {'item_id': self.item.id, 'quantity': 3, 'unit_price': '2.00'},
+            {'item_id': self.item.id, 'quantity': 1, 'unit_price': '2.00'},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.data)
+        self.assertFalse(GoodsReceivingNote.objects.exists())
+
+    def test_bad_quantities_and_items_are_rejected(self):
+        """Test that quantities below 1 and unknown items are a 400"""
+        for line in [
+            {'item_id': self.item.id, 'quantity': -5, 'unit_price': '2.00'},
+            {'item_id': self.item.id, 'quantity': 0, 'unit_price': '2.00'},
+            {'item_id': self.item.id + 100, 'quantity': 1, 'unit_price': '2.00'},
+        ]:
+            response = self._create([line])
+            self.assertEqual(response.status_code, 400, line)
+            self.assertIn('items', response.data)
+
+        self.assertFalse(GoodsReceivingNote.objects.exists())
+        self.assertEqual(Item.objects.get(pk=self.item.pk).current_balance, 0)
 
-# Create your tests here.
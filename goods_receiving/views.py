@@ -1,15 +1,22 @@
-from rest_framework import viewsets, permissions, filters, status
+from rest_framework import viewsets, permissions, filters, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from goods_receiving.models import GoodsReceivingNote, GRNItem
 from goods_receiving.serializers import GoodsReceivingNoteSerializer, GRNItemSerializer
 from purchase_requisition.models import PurchaseRequisition
+from inventory import services
+from inventory.models import Item
+from inventory.serializers import DocumentLineSerializer
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import Prefetch
+from inventory.fieldsets import is_requested, with_item_details
 
 class GoodsReceivingNoteViewSet(viewsets.ModelViewSet):
-    queryset = GoodsReceivingNote.objects.all().order_by('-created_at')
+    queryset = GoodsReceivingNote.objects.select_related(
+        'supplier', 'pr', 'received_by', 'checked_by'
+    ).order_by('-created_at')
     serializer_class = GoodsReceivingNoteSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -17,6 +24,14 @@ class GoodsReceivingNoteViewSet(viewsets.ModelViewSet):
     search_fields = ['grn_no', 'invoice_no', 'supplier__name']
     ordering_fields = ['grn_no', 'date', 'created_at']
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if is_requested(self.request, 'items') or is_requested(self.request, 'total_amount'):
+            lines = GRNItem.objects.select_related('item__unit_of_measure')
+            lines = with_item_details(lines, self.request, 'items.item_details')
+            queryset = queryset.prefetch_related(Prefetch('items', queryset=lines))
+        return queryset
+    
     @action(detail=False, methods=['get'])
     def from_pr(self, request):
         """Get purchase requisition details for creating a GRN"""
@@ -44,20 +59,21 @@ class GoodsReceivingNoteViewSet(viewsets.ModelViewSet):
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         """Create a goods receiving note with items"""
-        # Extract nested items data
-        items_data = request.data.pop('items', [])
+        # Extract and check the nested lines
+        lines = DocumentLineSerializer(data=request.data.pop('items', []), many=True)
+        if not lines.is_valid():
+            raise serializers.ValidationError({'items': lines.errors})
         
         # Create goods receiving note
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         grn = serializer.save()
         
-        # Create items
-        for item_data in items_data:
-            item_data['grn'] = grn.id
-            item_serializer = GRNItemSerializer(data=item_data)
-            item_serializer.is_valid(raise_exception=True)
-            item_serializer.save()
+        # Create items and post them to stock in one go
+        try:
+            services.receive_grn_items(grn, lines.validated_data)
+        except (KeyError, TypeError, ValueError, ArithmeticError, Item.DoesNotExist) as e:
+            raise serializers.ValidationError({'items': str(e)})
         
         # Refresh and return the complete object
         grn = self.get_queryset().get(id=grn.id)
@@ -65,8 +81,11 @@ class GoodsReceivingNoteViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 class GRNItemViewSet(viewsets.ModelViewSet):
-    queryset = GRNItem.objects.all()
+    queryset = GRNItem.objects.select_related('item__unit_of_measure')
     serializer_class = GRNItemSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['grn', 'item']
+    
+    def get_queryset(self):
+        return with_item_details(super().get_queryset(), self.request)
@@ -9,7 +9,8 @@ from django.views.decorators.http import require_POST
 from django.db import transaction
 
 from goods_receiving.models import GoodsReceivingNote, GRNItem
-from inventory.models import Item, Supplier
+from inventory.models import Supplier
+from inventory import services
 from purchase_requisition.models import PurchaseRequisition
 from users.models import CustomUser
 
@@ -106,16 +107,8 @@ def grn_create(request):
                                 'unit_price': unit_price
                             })
                 
-                # Create GRN items
-                for item_data in items_data:
-                    total_price = float(item_data['quantity']) * float(item_data['unit_price'])
-                    GRNItem.objects.create(
-                        grn=grn,
-                        item_id=item_data['item_id'],
-                        quantity=item_data['quantity'],
-                        unit_price=item_data['unit_price'],
-                        total_price=total_price
-                    )
+                # Create GRN items and post them to stock in one go
+                services.receive_grn_items(grn, items_data)
                 
                 # If this is linked to a PR, update its status
                 if grn.pr:
@@ -134,13 +127,10 @@ def grn_create(request):
     # Get ordered purchase requisitions for dropdown
     purchase_requisitions = PurchaseRequisition.objects.filter(status='ordered').order_by('-date')
     
-    # Get items for dropdowns
-    items = Item.objects.all().order_by('code')
-    
+    # Items are looked up on demand by the form's item pickers
     context = {
         'suppliers': suppliers,
         'purchase_requisitions': purchase_requisitions,
-        'items': items,
         'today': timezone.now().date(),
     }
     
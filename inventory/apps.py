@@ -7,3 +7,8 @@ class InventoryConfig(AppConfig):
     
     def ready(self):
         import inventory.signals
+        from django.db.models.signals import pre_migrate, post_migrate
+        from inventory.indexes import create_trigram_extension
+        from inventory.partitions import create_ledger_partitions
+        pre_migrate.connect(create_trigram_extension, sender=self)
+        post_migrate.connect(create_ledger_partitions, sender=self)
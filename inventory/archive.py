@@ -0,0 +1,155 @@
+"""
+Ledger archival with opening-balance compaction.
+
+archive_ledger() moves the ItemTransaction rows dated before a cut-off
+out of the live ledger, into ArchivedItemTransaction (with their original
+ids) or into a gzipped NDJSON file, and writes one 'opening' row per item
+dated the day before the cut-off, so every ledger query only reads the
+period that is kept. `manage.py archive_ledger` runs it, by default for
+everything older than LEDGER_ARCHIVE_MONTHS.
+
+The opening row carries the item's balance at that point as both
+quantity_in and balance_after: its current balance less the rows that are
+kept, so the opening row and the kept rows add up to the current balance
+even when an archived row was posted, with a back date, after some of the
+kept ones. The opening row starts the item's balance_after chain although
+its id is newer (see inventory.reconcile).
+
+Items and their daily movement rollup are not touched: the rollup keeps
+the archived days, and rebuild_movements() leaves them alone.
+"""
+import datetime
+import gzip
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, IntegerField, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from inventory.models import ArchivedItemTransaction, Item, ItemDailyMovement, ItemTransaction, LedgerArchive
+from inventory.partitions import add_months
+from inventory.services import lock_items
+from reports import cache as report_cache
+
+ARCHIVE_BATCH_SIZE = 2000
+ARCHIVED_FIELDS = [field.attname for field in ItemTransaction._meta.concrete_fields]
+
+
+class ArchiveError(Exception):
+    """Raised when the ledger cannot be archived up to the requested date."""
+
+
+def default_cutoff(today=None):
+    """First day of the month LEDGER_ARCHIVE_MONTHS before this one."""
+    return add_months(today or datetime.date.today(), -settings.LEDGER_ARCHIVE_MONTHS)
+
+
+def archived_through():
+    """The latest cut-off archived so far, or None."""
+    return LedgerArchive.objects.aggregate(cutoff=Max('cutoff'))['cutoff']
+
+
+def _archived_rows(rows):
+    for values in rows.order_by('id').values_list(*ARCHIVED_FIELDS).iterator(chunk_size=ARCHIVE_BATCH_SIZE):
+        yield dict(zip(ARCHIVED_FIELDS, values))
+
+
+def _copy_to_table(rows):
+    total = 0
+    batch = []
+    for row in _archived_rows(rows):
+        batch.append(ArchivedItemTransaction(**row))
+        if len(batch) == ARCHIVE_BATCH_SIZE:
+            ArchivedItemTransaction.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    ArchivedItemTransaction.objects.bulk_create(batch)
+    return total + len(batch)
+
+
+def _write_file(rows, path):
+    total = 0
+    with gzip.open(path, 'xt', encoding='utf-8') as archive:
+        for row in _archived_rows(rows):
+            archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+            total += 1
+    return total
+
+
+@transaction.atomic
+def archive_ledger(cutoff, path=None, created_by=None):
+    """
+    Move the ledger rows dated before `cutoff` to the archive table, or to
+    gzipped NDJSON at `path` (which must not exist yet), and replace them
+    with one opening-balance row per item still in stock. Returns the
+    LedgerArchive recording the run.
+    """
+    through = archived_through()
+    if through and cutoff <= through:
+        raise ArchiveError(f"The ledger is already archived up to {through}.")
+
+    rows = ItemTransaction.objects.filter(date__lt=cutoff)
+    # No posting can touch these items until the archive is committed
+    items = lock_items(rows.values_list('item_id', flat=True).distinct())
+
+    # Each item's balance before the kept rows: not the sum of the archived
+    # rows, since an item may have been created with a balance, nor the
+    # latest-dated archived balance_after, since rows are chained in
+    # posting order and dates can be entered in the past
+    kept = dict(
+        ItemTransaction.objects.filter(item_id__in=items, date__gte=cutoff).values('item_id').annotate(
+            net=Sum(F('quantity_in') - F('quantity_out'), output_field=IntegerField())
+        ).values_list('item_id', 'net')
+    )
+    balances = {item_id: item.current_balance - kept.get(item_id, 0) for item_id, item in items.items()}
+    negative = sorted(item.code for item_id, item in items.items() if balances[item_id] < 0)
+    if negative:
+        raise ArchiveError(
+            f"The kept ledger rows exceed the current balance of {', '.join(negative)}; "
+            f"run reconcile_ledger first."
+        )
+
+    # Weighted-average price at the cut-off, from the rollup
+    closing_price = ItemDailyMovement.objects.filter(
+        item=OuterRef('pk'), date__lt=cutoff
+    ).order_by('-date').values('closing_price')[:1]
+    prices = dict(
+        Item.objects.filter(id__in=balances).annotate(
+            price=Coalesce(Subquery(closing_price), F('current_price'))
+        ).values_list('id', 'price')
+    )
+
+    row_count = _write_file(rows, path) if path else _copy_to_table(rows)
+    rows.delete()
+
+    opening_date = cutoff - datetime.timedelta(days=1)
+    ItemTransaction.objects.bulk_create(
+        [
+            ItemTransaction(
+                item_id=item_id,
+                transaction_type='opening',
+                reference_type='OPEN',
+                quantity_in=balance,
+                quantity_out=0,
+                balance_after=balance,
+                unit_price=prices[item_id],
+                total_price=balance * prices[item_id],
+                date=opening_date,
+                created_by=created_by,
+            )
+            for item_id, balance in sorted(balances.items())
+            if balance > 0
+        ],
+        batch_size=ARCHIVE_BATCH_SIZE
+    )
+
+    report_cache.bump_version(report_cache.LEDGER)
+    return LedgerArchive.objects.create(
+        cutoff=cutoff,
+        row_count=row_count,
+        item_count=len(balances),
+        location=str(path or ArchivedItemTransaction._meta.db_table),
+        created_by=created_by,
+    )
@@ -0,0 +1,117 @@
+"""
+Cached dashboard statistics.
+
+The dashboard is opened by every user at the start of a shift and its
+figures change only when stock is posted or a document changes, so they
+are computed once and kept in the cache named by settings.DASHBOARD_CACHE
+(shared by all processes unless it is a local-memory cache), in three
+sections that are invalidated separately:
+
+- stock: item count, low-stock count and list, inventory value; dropped
+  when stock is posted (services.post_movements) or an item is edited;
+- requisitions: the pending count and recent requisitions, counted as
+  StoreRequisition.pending_for counts them (the pending requisitions
+  page): one entry per acting role, and one per user for everyone else,
+  who follow their own requisitions; dropped for every role and the
+  requester when a store requisition is saved or deleted;
+- receiving: the recent GRNs; dropped when a GRN is saved or deleted.
+
+Invalidation runs when the surrounding transaction commits, so a
+concurrent request cannot cache figures from before the change.
+DASHBOARD_CACHE_TIMEOUT bounds how stale a section can get through paths
+that bypass these hooks, such as bulk updates in the shell.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Sum
+
+from goods_receiving.models import GoodsReceivingNote
+from inventory.models import Item
+from store_requisition.models import StoreRequisition
+
+STOCK_KEY = 'dashboard:stock'
+RECEIVING_KEY = 'dashboard:receiving'
+REQUISITIONS_KEY = 'dashboard:requisitions:{}'
+RECENT_LIMIT = 5
+
+
+def _cache():
+    return caches[settings.DASHBOARD_CACHE]
+
+
+def _cached(key, compute):
+    cache = _cache()
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, settings.DASHBOARD_CACHE_TIMEOUT)
+    return value
+
+
+def _stock_stats():
+    low_stock_items = Item.objects.filter(current_balance__lte=F('min_stock_level'))
+    return {
+        'total_items': Item.objects.count(),
+        'low_stock_count': low_stock_items.count(),
+        'inventory_value': Item.objects.aggregate(
+            total_value=Sum(F('current_balance') * F('current_price'))
+        )['total_value'] or 0,
+        'low_stock_items': list(
+            low_stock_items.select_related('category', 'unit_of_measure').order_by('current_balance')[:RECENT_LIMIT]
+        ),
+    }
+
+
+def _requisition_stats(user):
+    return {
+        'pending_requisitions': StoreRequisition.pending_for(user).count(),
+        'recent_requisitions': list(
+            StoreRequisition.objects.select_related('department').order_by('-created_at')[:RECENT_LIMIT]
+        ),
+    }
+
+
+def _receiving_stats():
+    return {
+        'recent_grns': list(GoodsReceivingNote.objects.select_related('supplier').order_by('-created_at')[:RECENT_LIMIT]),
+    }
+
+
+def _user_key(user_id):
+    return f'user:{user_id}'
+
+
+def requisitions_key(user):
+    role = user.role
+    if role in StoreRequisition.ROLE_PENDING_STATUSES:
+        return REQUISITIONS_KEY.format(role)
+    return REQUISITIONS_KEY.format(_user_key(user.pk))
+
+
+def dashboard_stats(user):
+    """The dashboard figures for `user`, from the cache where possible."""
+    return {
+        **_cached(STOCK_KEY, _stock_stats),
+        **_cached(requisitions_key(user), lambda: _requisition_stats(user)),
+        **_cached(RECEIVING_KEY, _receiving_stats),
+    }
+
+
+def _delete_on_commit(*keys):
+    transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+def invalidate_stock():
+    _delete_on_commit(STOCK_KEY)
+
+
+def invalidate_requisitions(requester_id=None):
+    keys = [REQUISITIONS_KEY.format(role) for role in StoreRequisition.ROLE_PENDING_STATUSES]
+    if requester_id is not None:
+        keys.append(REQUISITIONS_KEY.format(_user_key(requester_id)))
+    _delete_on_commit(*keys)
+
+
+def invalidate_receiving():
+    _delete_on_commit(RECEIVING_KEY)
@@ -0,0 +1,152 @@
+"""
+The global document search index.
+
+Every SR, SIV, PR and GRN has one DocumentIndex row holding its type,
+number, date, department, supplier and status. inventory.signals keeps the
+rows current on save and delete, and `manage.py rebuild_document_index`
+fills the table for documents that already exist. search_documents() finds
+documents of all four types by number, department or supplier with one
+query on that table, instead of a query per list view with joins.
+"""
+from django.db.models import Case, IntegerField, Value, When
+
+from inventory.models import DocumentIndex
+from inventory.search import apply_search
+from store_requisition.models import StoreRequisition, StoreIssue
+from purchase_requisition.models import PurchaseRequisition
+from goods_receiving.models import GoodsReceivingNote
+
+SEARCH_FIELDS = ('number', 'department', 'supplier')
+INDEXED_FIELDS = ['number', 'date', 'department', 'supplier', 'status', 'updated_at']
+REBUILD_BATCH_SIZE = 500
+
+
+def _department_name(department):
+    return department.name if department else ''
+
+
+def _sr_entry(sr):
+    return {
+        'number': sr.requisition_no,
+        'date': sr.requested_date,
+        'department': _department_name(sr.department),
+        'status': sr.status,
+    }
+
+
+def _siv_entry(siv):
+    return {
+        'number': siv.siv_no,
+        'date': siv.date,
+        'department': _department_name(siv.sr.department),
+    }
+
+
+def _pr_entry(pr):
+    return {
+        'number': pr.pr_no,
+        'date': pr.date,
+        'department': _department_name(pr.requested_by.department),
+        'status': pr.status,
+    }
+
+
+def _grn_entry(grn):
+    return {
+        'number': grn.grn_no,
+        'date': grn.date,
+        'supplier': grn.supplier.name,
+    }
+
+
+# model: (document type, entry builder, select_related for rebuilds)
+INDEXED_DOCUMENTS = {
+    StoreRequisition: ('SR', _sr_entry, ['department']),
+    StoreIssue: ('SIV', _siv_entry, ['sr__department']),
+    PurchaseRequisition: ('PR', _pr_entry, ['requested_by__department']),
+    GoodsReceivingNote: ('GRN', _grn_entry, ['supplier']),
+}
+
+
+def index_documents(documents):
+    """Insert or refresh the index rows of `documents` in one statement."""
+    rows = []
+    for document in documents:
+        document_type, entry, _ = INDEXED_DOCUMENTS[type(document)]
+        rows.append(DocumentIndex(document_type=document_type, document_id=document.pk, **entry(document)))
+    if rows:
+        DocumentIndex.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['document_type', 'document_id'],
+            update_fields=INDEXED_FIELDS,
+        )
+
+
+def unindex_document(document):
+    document_type = INDEXED_DOCUMENTS[type(document)][0]
+    DocumentIndex.objects.filter(document_type=document_type, document_id=document.pk).delete()
+
+
+def rename_department(department):
+    """Carry a department's new name into the rows that show it."""
+    DocumentIndex.objects.filter(
+        document_type='SR',
+        document_id__in=StoreRequisition.objects.filter(department=department).values('id')
+    ).update(department=department.name)
+    DocumentIndex.objects.filter(
+        document_type='SIV',
+        document_id__in=StoreIssue.objects.filter(sr__department=department).values('id')
+    ).update(department=department.name)
+    DocumentIndex.objects.filter(
+        document_type='PR',
+        document_id__in=PurchaseRequisition.objects.filter(requested_by__department=department).values('id')
+    ).update(department=department.name)
+
+
+def rename_supplier(supplier):
+    DocumentIndex.objects.filter(
+        document_type='GRN',
+        document_id__in=GoodsReceivingNote.objects.filter(supplier=supplier).values('id')
+    ).update(supplier=supplier.name)
+
+
+def rebuild_index():
+    """Re-index every document and drop rows whose document is gone. Returns the row count."""
+    total = 0
+    for model, (document_type, _, related) in INDEXED_DOCUMENTS.items():
+        batch = []
+        for document in model.objects.select_related(*related).iterator(chunk_size=REBUILD_BATCH_SIZE):
+            batch.append(document)
+            if len(batch) == REBUILD_BATCH_SIZE:
+                index_documents(batch)
+                batch = []
+        index_documents(batch)
+        DocumentIndex.objects.filter(document_type=document_type).exclude(
+            document_id__in=model.objects.values('id')
+        ).delete()
+        total += DocumentIndex.objects.filter(document_type=document_type).count()
+    return total
+
+
+def search_documents(term, document_type=None):
+    """
+    Index rows matching `term`: exact number first, then number prefix,
+    then other number matches, then department/supplier matches; newest
+    first within each group.
+    """
+    term = (term or '').strip()
+    if not term:
+        return DocumentIndex.objects.none()
+    documents = DocumentIndex.objects.all()
+    if document_type:
+        documents = documents.filter(document_type=document_type)
+    return apply_search(documents, term, SEARCH_FIELDS).annotate(
+        search_rank=Case(
+            When(number__iexact=term, then=Value(0)),
+            When(number__istartswith=term, then=Value(1)),
+            When(number__icontains=term, then=Value(2)),
+            default=Value(3),
+            output_field=IntegerField(),
+        )
+    ).order_by('search_rank', '-date', '-id')
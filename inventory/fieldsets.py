@@ -0,0 +1,98 @@
+"""
+Sparse fieldsets and opt-in expansion for the API serializers.
+
+    ?fields=id,requisition_no,items.item_code,items.quantity
+    ?expand=items.item_details
+
+`fields` limits the output to the listed fields; dotted paths reach into
+nested serializers. Nested objects named in a serializer's
+`expandable_fields` (such as `item_details`) are left out unless they are
+listed in `expand`. Viewsets use is_requested()/is_expanded() to prefetch
+only what the response will contain.
+"""
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _param_paths(request, param):
+    if request is None:
+        return None
+    query_params = getattr(request, 'query_params', request.GET)
+    if param not in query_params:
+        return None
+    return {path.strip() for path in query_params.get(param, '').split(',') if path.strip()}
+
+
+def requested_fields(request):
+    """Paths listed in ?fields=, or None when the whole object is wanted."""
+    return _param_paths(request, FIELDS_PARAM)
+
+
+def expanded_fields(request):
+    """Paths listed in ?expand=."""
+    return _param_paths(request, EXPAND_PARAM) or set()
+
+
+def is_requested(request, path):
+    """Whether `path` (e.g. "items") is part of the response."""
+    fields = requested_fields(request)
+    if fields is None:
+        return True
+    return any(field == path or field.startswith(f'{path}.') for field in fields)
+
+
+def is_expanded(request, path):
+    """Whether the expandable field at `path` (e.g. "items.item_details") was asked for."""
+    return path in expanded_fields(request) and is_requested(request, path)
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin implementing ?fields= and ?expand=. The field
+    selection applies to reads only, so a sparse response can never make a
+    write skip validation of a field.
+    """
+    expandable_fields = ()
+
+    def _path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(names))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        path = self._path()
+        prefix = f'{path}.' if path else ''
+
+        expand = expanded_fields(request)
+        for name in self.expandable_fields:
+            if f'{prefix}{name}' not in expand:
+                fields.pop(name, None)
+
+        requested = requested_fields(request)
+        if requested is None or request.method not in SAFE_METHODS:
+            return fields
+
+        # Field names at this level, from paths below this serializer
+        wanted = {
+            field[len(prefix):].split('.')[0]
+            for field in requested
+            if field.startswith(prefix)
+        }
+        if not wanted:
+            return fields
+        return {name: field for name, field in fields.items() if name in wanted}
+
+
+def with_item_details(queryset, request, path='item_details'):
+    """Join what ItemSerializer reads for document lines whose `path` is expanded."""
+    if is_expanded(request, path):
+        return queryset.select_related('item__category')
+    return queryset
@@ -0,0 +1,59 @@
+"""
+Index expressions for the item search paths.
+
+The project runs on PostgreSQL, but the tests also run on SQLite. These
+wrappers render their PostgreSQL operator classes (and GIN) only there;
+other backends get a plain expression index in their place.
+"""
+from django.contrib.postgres.indexes import OpClass
+from django.db import connections
+from django.db.models import Index
+
+
+class PostgresOpClass(OpClass):
+    """OpClass that is only rendered on PostgreSQL."""
+    opclass = None
+
+    def __init__(self, expression):
+        super().__init__(expression, name=self.opclass)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        if connection.vendor != 'postgresql':
+            return compiler.compile(self.get_source_expressions()[0])
+        return super().as_sql(compiler, connection, **extra_context)
+
+
+class PatternOps(PostgresOpClass):
+    """
+    text_pattern_ops, so that istartswith (UPPER(col) LIKE 'ABC%') can read
+    a b-tree index whatever the database collation is.
+    """
+    opclass = 'text_pattern_ops'
+
+
+class TrigramOps(PostgresOpClass):
+    """gin_trgm_ops, for use inside a TrigramIndex."""
+    opclass = 'gin_trgm_ops'
+
+
+class TrigramIndex(Index):
+    """
+    GIN index built with pg_trgm on PostgreSQL. It serves icontains
+    (UPPER(col) LIKE '%ABC%') for search terms of three or more characters.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            using = ' USING gin'
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+
+def create_trigram_extension(using='default', **kwargs):
+    """
+    pre_migrate receiver: the trigram indexes need pg_trgm, and the project
+    does not keep migrations where a CreateExtension operation could live.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import archive
+
+
+class Command(BaseCommand):
+    help = 'Move old transaction ledger rows to the archive and replace them with opening balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help='Archive rows dated before this date (YYYY-MM-DD); defaults to LEDGER_ARCHIVE_MONTHS ago',
+        )
+        parser.add_argument(
+            '--file',
+            help='Write the rows to this gzipped NDJSON file instead of the archive table',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = options['before']
+        if cutoff:
+            try:
+                cutoff = date.fromisoformat(cutoff)
+            except ValueError:
+                raise CommandError(f'Invalid date for --before: {cutoff}')
+        else:
+            cutoff = archive.default_cutoff()
+        try:
+            result = archive.archive_ledger(cutoff, path=options['file'])
+        except (archive.ArchiveError, FileExistsError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {result.row_count} ledger rows dated before {cutoff} for {result.item_count} items '
+            f'to {result.location}.'
+        ))
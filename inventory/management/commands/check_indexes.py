@@ -0,0 +1,120 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+
+from inventory.models import Item, ItemTransaction, ItemDailyMovement, ItemBalanceSnapshot, DocumentIndex
+from store_requisition.models import StoreRequisition, StoreIssue
+from purchase_requisition.models import PurchaseRequisition
+from goods_receiving.models import GoodsReceivingNote
+
+
+def canonical_queries():
+    """
+    The project's hot filter and ordering paths. Keep this list in step
+    with the list views, reports and the Meta.indexes that serve them.
+    """
+    return [
+        ('dashboard low stock',
+         Item.objects.filter(current_balance__lte=F('min_stock_level')).order_by('current_balance')[:5]),
+        ('item typeahead',
+         Item.objects.filter(code__istartswith='ABC')[:20]),
+        ('item search',
+         Item.objects.filter(description__icontains='pencil')[:20]),
+        ('item list by category',
+         Item.objects.filter(category_id=1).order_by('code')[:10]),
+        ('item ledger',
+         ItemTransaction.objects.filter(item_id=1).order_by('-date', '-created_at', '-id')[:20]),
+        ('transaction report',
+         ItemTransaction.objects.order_by('-date', '-created_at', '-id')[:20]),
+        ('transactions by type',
+         ItemTransaction.objects.filter(transaction_type='issue').order_by('-date')[:20]),
+        ('item movements as of',
+         ItemDailyMovement.objects.filter(item_id=1, date__lte='2025-03-31').order_by('-date')[:1]),
+        ('item snapshot',
+         ItemBalanceSnapshot.objects.filter(item_id=1, date='2025-03-31')),
+        ('transactions by document',
+         ItemTransaction.objects.filter(reference_type='GRN', reference_id=1)),
+        ('pending requisition queue',
+         StoreRequisition.objects.filter(status__in=['pending', 'checked']).order_by('-created_at')[:10]),
+        ('requisitions by status',
+         StoreRequisition.objects.filter(status='approved').order_by('-created_at')[:10]),
+        ('requisitions by department',
+         StoreRequisition.objects.filter(department_id=1).order_by('-created_at')[:10]),
+        ('requisition report',
+         StoreRequisition.objects.order_by('-requested_date')[:20]),
+        ('store issue list',
+         StoreIssue.objects.order_by('-created_at')[:10]),
+        ('purchase requisitions by status',
+         PurchaseRequisition.objects.filter(status='pending_approval').order_by('-created_at')[:10]),
+        ('purchase report',
+         PurchaseRequisition.objects.order_by('-date')[:20]),
+        ('document search',
+         DocumentIndex.objects.filter(number__istartswith='SR-2025')[:20]),
+        ('goods receiving list',
+         GoodsReceivingNote.objects.order_by('-created_at')[:10]),
+        ('goods receiving by supplier',
+         GoodsReceivingNote.objects.filter(supplier_id=1).order_by('-created_at')[:10]),
+    ]
+
+
+def plan_problems(vendor, plan):
+    """Full table scans and unindexed sorts found in an EXPLAIN plan."""
+    problems = []
+    if vendor == 'postgresql':
+        for table in re.findall(r'Seq Scan on (\w+)', plan):
+            problems.append(f'full scan of {table}')
+    elif vendor == 'sqlite':
+        for line in plan.splitlines():
+            match = re.search(r'\bSCAN (\w+)(.*)', line)
+            if match and 'INDEX' not in match.group(2):
+                problems.append(f'full scan of {match.group(1)}')
+            if 'USE TEMP B-TREE FOR ORDER BY' in line:
+                problems.append('sort not served by an index')
+    return problems
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the canonical queries and report any that are not served by an index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail',
+            action='store_true',
+            help='Exit with an error if any query is missing an index',
+        )
+        parser.add_argument(
+            '--show-plans',
+            action='store_true',
+            help='Print the full query plan for every query',
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'Plan checks are not supported on {vendor}.')
+
+        missing = 0
+        for label, queryset in canonical_queries():
+            with transaction.atomic():
+                if vendor == 'postgresql':
+                    # Small tables are cheaper to scan, so make the planner
+                    # show whether an index could be used at all
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = queryset.explain()
+
+            problems = plan_problems(vendor, plan)
+            if problems:
+                missing += 1
+                self.stdout.write(self.style.WARNING(f'MISSING  {label}: {", ".join(problems)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK       {label}'))
+
+            if options['show_plans']:
+                self.stdout.write(plan)
+
+        if missing and options['fail']:
+            raise CommandError(f'{missing} canonical queries are missing an index.')
+        self.stdout.write(f'{missing} of {len(canonical_queries())} queries need attention.')
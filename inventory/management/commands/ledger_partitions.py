@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import partitions
+
+
+class Command(BaseCommand):
+    help = 'Partition the transaction ledger by month and manage its partitions (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['convert', 'create', 'list', 'detach', 'attach'],
+            help='convert the ledger to a partitioned table, create partitions ahead, '
+                 'list them, detach old months or attach a detached month',
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=partitions.MONTHS_AHEAD,
+            help='Months after the current one to create partitions for (convert, create)',
+        )
+        parser.add_argument(
+            '--before',
+            help='Detach the months before this one (YYYY-MM)',
+        )
+        parser.add_argument(
+            '--month',
+            help='Month to attach (YYYY-MM)',
+        )
+
+    def handle(self, *args, **options):
+        action = options['action']
+        try:
+            if action == 'convert':
+                created = partitions.convert_ledger(months_ahead=options['ahead'])
+                self.stdout.write(self.style.SUCCESS(f'Partitioned the ledger into {len(created)} monthly partitions.'))
+            elif action == 'create':
+                created = partitions.ensure_partitions(months_ahead=options['ahead'])
+                if not created and not partitions.is_partitioned():
+                    raise CommandError('The ledger is not partitioned; run `ledger_partitions convert` first.')
+                self.stdout.write(self.style.SUCCESS(f'Created {len(created)} partitions.'))
+            elif action == 'list':
+                for name, bound in partitions.list_partitions():
+                    self.stdout.write(f'{name}\t{bound}')
+            elif action == 'detach':
+                if not options['before']:
+                    raise CommandError('detach needs --before YYYY-MM.')
+                detached = partitions.detach_partitions(partitions.parse_month(options['before']))
+                for name in detached:
+                    self.stdout.write(name)
+                self.stdout.write(self.style.SUCCESS(f'Detached {len(detached)} partitions.'))
+            else:
+                if not options['month']:
+                    raise CommandError('attach needs --month YYYY-MM.')
+                name = partitions.attach_partition(partitions.parse_month(options['month']))
+                self.stdout.write(self.style.SUCCESS(f'Attached {name}.'))
+        except partitions.PartitioningError as e:
+            raise CommandError(str(e))
@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import rollups
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the per-item daily movement rollup from the transaction ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only rebuild days from this date (YYYY-MM-DD) on',
+        )
+
+    def handle(self, *args, **options):
+        since = options['since']
+        if since:
+            try:
+                since = date.fromisoformat(since)
+            except ValueError:
+                raise CommandError(f'Invalid date for --since: {since}')
+        total = rollups.rebuild_movements(date_from=since)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} daily movement rows.'))
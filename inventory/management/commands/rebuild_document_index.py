@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inventory import documents
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the global document search index from the SR, SIV, PR and GRN tables'
+
+    def handle(self, *args, **options):
+        total = documents.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} documents.'))
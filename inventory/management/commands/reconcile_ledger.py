@@ -0,0 +1,68 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Check that balance_after chains and item balances agree with the ledger, and optionally repair them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help='Processes to check item ranges in parallel',
+        )
+        parser.add_argument(
+            '--range-size',
+            type=int,
+            default=reconcile.RANGE_SIZE,
+            help='Item ids per unit of work',
+        )
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Recompute broken balance_after chains and item balances from the ledger quantities',
+        )
+        parser.add_argument(
+            '--fail',
+            action='store_true',
+            help='Exit with an error if any discrepancy is found',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['range_size'] < 1:
+            raise CommandError('--workers and --range-size must be at least 1.')
+
+        chain_count = drift_count = repaired = 0
+        unrepairable = []
+        for result in reconcile.reconcile(
+            repair=options['repair'], workers=options['workers'], range_size=options['range_size']
+        ):
+            chain_count += result['chain_count']
+            drift_count += result['drift_count']
+            repaired += len(result['repaired'])
+            unrepairable.extend(result['unrepairable'])
+            for txn_id, item_id, previous, opening in result['chain']:
+                self.stdout.write(self.style.WARNING(
+                    f'CHAIN    item {item_id} transaction {txn_id}: previous balance {previous}, '
+                    f'row starts from {opening}'
+                ))
+            for item_id, code, current, ledger in result['drift']:
+                self.stdout.write(self.style.WARNING(
+                    f'BALANCE  item {item_id} {code}: current balance {current}, ledger total {ledger}'
+                ))
+
+        self.stdout.write(f'{chain_count} broken ledger rows, {drift_count} items off their ledger total.')
+        if options['repair']:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {repaired} items.'))
+            if repaired:
+                self.stdout.write('Run rebuild_daily_movements to carry repaired balance_after values into the rollup.')
+            if unrepairable:
+                self.stdout.write(self.style.ERROR(
+                    f'Not repaired, the ledger goes below zero: items {", ".join(map(str, unrepairable))}'
+                ))
+        if (chain_count or drift_count) and options['fail'] and not options['repair']:
+            raise CommandError(f'{chain_count + drift_count} ledger discrepancies found.')
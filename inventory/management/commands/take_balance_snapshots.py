@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import snapshots
+
+
+class Command(BaseCommand):
+    help = 'Store every item\'s balance and price at the end of a day, for as-of stock queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Day to snapshot (YYYY-MM-DD); defaults to yesterday',
+        )
+
+    def handle(self, *args, **options):
+        day = options['date']
+        if day:
+            try:
+                day = date.fromisoformat(day)
+            except ValueError:
+                raise CommandError(f'Invalid date for --date: {day}')
+        try:
+            total = snapshots.take_snapshots(day)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} balance snapshots.'))
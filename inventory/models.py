@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 from users.models import CustomUser
+from inventory.indexes import PatternOps, TrigramIndex, TrigramOps
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -31,6 +33,8 @@ class Item(models.Model):
     current_price = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     min_stock_level = models.PositiveIntegerField(default=0)
     current_balance = models.PositiveIntegerField(default=0)
+    # Approved but not yet issued store requisition quantities
+    reserved_qty = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -40,12 +44,37 @@ class Item(models.Model):
     @property
     def is_low_stock(self):
         return self.current_balance <= self.min_stock_level
+    
+    @property
+    def available_quantity(self):
+        """Available to promise: on hand minus reserved."""
+        return self.current_balance - self.reserved_qty
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'code'], name='item_category_code_idx'),
+            # Partial index: only low-stock rows, for the low stock filters
+            models.Index(
+                fields=['current_balance'],
+                name='item_low_stock_idx',
+                condition=models.Q(current_balance__lte=models.F('min_stock_level')),
+            ),
+            # Prefix lookups for the item typeahead (istartswith)
+            models.Index(PatternOps(Upper('code')), name='item_code_prefix_idx'),
+            models.Index(PatternOps(Upper('description')), name='item_description_prefix_idx'),
+            # Substring search (icontains) through pg_trgm
+            TrigramIndex(TrigramOps(Upper('code')), name='item_code_trgm_idx'),
+            TrigramIndex(TrigramOps(Upper('description')), name='item_description_trgm_idx'),
+            # Available to promise, for the in-stock item pickers
+            models.Index(models.F('current_balance') - models.F('reserved_qty'), name='item_available_idx'),
+        ]
 
 class ItemTransaction(models.Model):
     TRANSACTION_TYPES = (
         ('purchase', 'Purchase'),
         ('issue', 'Issue'),
         ('adjustment', 'Adjustment'),
+        ('opening', 'Opening Balance'),
     )
     
     item = models.ForeignKey(Item, on_delete=models.CASCADE)
@@ -64,6 +93,110 @@ class ItemTransaction(models.Model):
     
     def __str__(self):
         return f"{self.transaction_type} - {self.item.code} - {self.date}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date', '-created_at', '-id'], name='txn_ledger_order_idx'),
+            models.Index(fields=['item', '-date', '-created_at', '-id'], name='txn_item_ledger_idx'),
+            models.Index(fields=['transaction_type', '-date'], name='txn_type_date_idx'),
+            models.Index(fields=['reference_type', 'reference_id'], name='txn_reference_idx'),
+        ]
+
+class ArchivedItemTransaction(models.Model):
+    """
+    Ledger rows moved out of ItemTransaction by `manage.py archive_ledger`,
+    with their original ids. The live ledger keeps one opening-balance row
+    per item at the cut-off in their place (see inventory.archive).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='archived_transactions')
+    transaction_type = models.CharField(max_length=20, choices=ItemTransaction.TRANSACTION_TYPES)
+    reference_id = models.IntegerField(null=True, blank=True)
+    reference_type = models.CharField(max_length=50, null=True, blank=True)
+    quantity_in = models.PositiveIntegerField(default=0)
+    quantity_out = models.PositiveIntegerField(default=0)
+    balance_after = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=15, decimal_places=2)
+    total_price = models.DecimalField(max_digits=15, decimal_places=2)
+    date = models.DateField()
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='+')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.transaction_type} - {self.item.code} - {self.date}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', '-date', '-created_at', '-id'], name='archived_txn_item_idx'),
+        ]
+
+class LedgerArchive(models.Model):
+    """One run of the ledger archival: rows dated before `cutoff` were moved out."""
+    cutoff = models.DateField()
+    row_count = models.PositiveIntegerField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    location = models.CharField(max_length=255, blank=True)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Ledger before {self.cutoff}"
+
+class ItemDailyMovement(models.Model):
+    """
+    Ledger totals per item per day, maintained by the posting service in
+    the same transaction as the ledger rows (see inventory.rollups), so that
+    period reports read one row per item and day instead of every
+    ItemTransaction. closing_balance is the balance_after of the last
+    ledger row posted for that item and day, closing_price the item's
+    weighted-average price after it.
+    """
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='daily_movements')
+    date = models.DateField()
+    quantity_in = models.PositiveIntegerField(default=0)
+    quantity_out = models.PositiveIntegerField(default=0)
+    value_in = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    value_out = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    closing_balance = models.PositiveIntegerField(default=0)
+    closing_price = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    transaction_count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.item.code} - {self.date}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'date'], name='daily_movement_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='daily_movement_date_idx'),
+        ]
+
+class ItemBalanceSnapshot(models.Model):
+    """
+    An item's balance, price and value at the end of `date`, taken by
+    `manage.py take_balance_snapshots`. As-of queries start from the latest
+    snapshot on or before the requested date and add only the daily
+    movements after it (see inventory.snapshots).
+    """
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='balance_snapshots')
+    date = models.DateField()
+    balance = models.PositiveIntegerField(default=0)
+    unit_price = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    value = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    
+    def __str__(self):
+        return f"{self.item.code} - {self.date}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'date'], name='balance_snapshot_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='balance_snapshot_date_idx'),
+        ]
 
 class Supplier(models.Model):
     name = models.CharField(max_length=150)
@@ -76,3 +209,55 @@ class Supplier(models.Model):
     
     def __str__(self):
         return self.name
+
+class DocumentSequence(models.Model):
+    """
+    Counter behind the SR/SIV/PR/GRN numbers. One row per prefix
+    (e.g. "SR-202501-"), so a new series starts every month.
+    """
+    prefix = models.CharField(max_length=20, unique=True)
+    last_number = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.prefix}{self.last_number:04d}"
+
+class DocumentIndex(models.Model):
+    """
+    One compact row per SR, SIV, PR and GRN, kept up to date on save, so
+    documents of every type can be found by number in a single query.
+    """
+    DOCUMENT_TYPES = (
+        ('SR', 'Store Requisition'),
+        ('SIV', 'Store Issue Voucher'),
+        ('PR', 'Purchase Requisition'),
+        ('GRN', 'Goods Receiving Note'),
+    )
+    
+    document_type = models.CharField(max_length=3, choices=DOCUMENT_TYPES)
+    document_id = models.PositiveIntegerField()
+    number = models.CharField(max_length=20)
+    date = models.DateField(null=True, blank=True)
+    department = models.CharField(max_length=100, blank=True)
+    supplier = models.CharField(max_length=200, blank=True)
+    status = models.CharField(max_length=20, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.get_document_type_display()} {self.number}"
+    
+    @property
+    def status_label(self):
+        return self.status.replace('_', ' ').title()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document_type', 'document_id'], name='document_index_unique'),
+        ]
+        indexes = [
+            models.Index(PatternOps(Upper('number')), name='document_number_prefix_idx'),
+            TrigramIndex(TrigramOps(Upper('number')), name='document_number_trgm_idx'),
+            TrigramIndex(TrigramOps(Upper('department')), name='document_department_trgm_idx'),
+            TrigramIndex(TrigramOps(Upper('supplier')), name='document_supplier_trgm_idx'),
+            models.Index(fields=['-date', '-id'], name='document_date_idx'),
+        ]
@@ -0,0 +1,128 @@
+"""
+Document number allocation for store requisitions, store issues, purchase
+requisitions and goods receiving notes.
+
+Numbers look like "SR-202501-0001": a series code, the year and month, and
+a counter that restarts every month. Counters live in DocumentSequence and
+are incremented atomically in the database, so concurrent saves never get
+the same number and never need to scan the document table.
+
+Set DOCUMENT_NUMBER_BLOCK_SIZE above 1 to let each worker process reserve
+a block of numbers at a time. That removes the per-document round trip to
+the counter row at the cost of numbers not being strictly increasing
+across workers, and of gaps when a worker exits with part of a block left.
+"""
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from inventory.models import DocumentSequence
+
+
+def _existing_max(model, field, prefix):
+    """Highest number already issued for a prefix, used to seed a counter."""
+    last = model.objects.filter(
+        **{f'{field}__startswith': prefix}
+    ).order_by(f'-{field}').values_list(field, flat=True).first()
+    return int(last.split('-')[-1]) if last else 0
+
+
+def _increment(prefix, count):
+    """Add `count` to an existing counter and return the new value, or None."""
+    now = timezone.now()
+    if connection.vendor in ('postgresql', 'sqlite'):
+        table = connection.ops.quote_name(DocumentSequence._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET last_number = last_number + %s, updated_at = %s "
+                f"WHERE prefix = %s RETURNING last_number",
+                [count, now, prefix]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    updated = DocumentSequence.objects.filter(prefix=prefix).update(
+        last_number=F('last_number') + count, updated_at=now
+    )
+    if not updated:
+        return None
+    # The UPDATE holds the row lock until commit, so this read is ours
+    return DocumentSequence.objects.filter(prefix=prefix).values_list('last_number', flat=True).get()
+
+
+@transaction.atomic
+def allocate(prefix, count=1, seed=None):
+    """
+    Reserve `count` consecutive numbers for a prefix and return the first.
+    `seed` is called once, when the counter for the prefix does not exist
+    yet, and should return the last number already in use.
+    """
+    last = _increment(prefix, count)
+    if last is None:
+        start = seed() if seed else 0
+        try:
+            with transaction.atomic():
+                DocumentSequence.objects.create(prefix=prefix, last_number=start + count)
+            last = start + count
+        except IntegrityError:
+            # Another transaction created the counter first
+            last = _increment(prefix, count)
+    return last - count + 1
+
+
+class NumberAllocator:
+    """
+    Hands out document numbers, optionally from per-process blocks.
+    Unused numbers from a block are only kept once the transaction that
+    reserved them has committed, so a rolled-back save can never lead to
+    a number being issued twice.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def get_block_size(self):
+        if self.block_size is not None:
+            return self.block_size
+        return max(getattr(settings, 'DOCUMENT_NUMBER_BLOCK_SIZE', 1), 1)
+
+    def _release(self, prefix, numbers):
+        with self._lock:
+            self._blocks.setdefault(prefix, deque()).extend(numbers)
+
+    def next(self, prefix, seed=None):
+        with self._lock:
+            block = self._blocks.get(prefix)
+            if block:
+                return block.popleft()
+
+        block_size = self.get_block_size()
+        first = allocate(prefix, block_size, seed)
+        if block_size > 1:
+            rest = range(first + 1, first + block_size)
+            transaction.on_commit(lambda: self._release(prefix, rest))
+        return first
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+allocator = NumberAllocator()
+
+
+def next_document_number(series, model, field, date=None):
+    """
+    Return the next number for a document series, e.g.
+    next_document_number('SR', StoreRequisition, 'requisition_no').
+    """
+    date = date or timezone.now().date()
+    prefix = f"{series}-{date.strftime('%Y%m')}-"
+    number = allocator.next(prefix, seed=lambda: _existing_max(model, field, prefix))
+    return f"{prefix}{number:04d}"
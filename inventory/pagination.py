@@ -0,0 +1,190 @@
+"""
+Keyset (cursor) pagination for the transaction ledger.
+
+Page-number pagination needs a COUNT(*) and an OFFSET that grows with the
+page number, which gets slower the deeper you go into ItemTransaction.
+Keyset pagination instead remembers the (date, created_at, id) of the last
+row shown and asks for the rows that sort after it, so every page costs
+the same indexed range read. Cursors are opaque base64 tokens.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+# Pages run newest first; id breaks ties between rows created in the same instant
+LEDGER_ORDERING = ('date', 'created_at', 'id')
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded."""
+
+
+def encode_cursor(obj, fields, reverse=False):
+    # isoformat() keeps microseconds, which DjangoJSONEncoder would truncate
+    values = [getattr(obj, field) for field in fields]
+    values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+    payload = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, model, fields):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        raw_values = payload['v']
+        if len(raw_values) != len(fields):
+            raise InvalidCursor(token)
+        values = [
+            model._meta.get_field(field).to_python(value)
+            for field, value in zip(fields, raw_values)
+        ]
+        return values, bool(payload.get('r'))
+    except (ValueError, TypeError, KeyError, ValidationError) as e:
+        raise InvalidCursor(token) from e
+
+
+def _beyond(fields, values, lookup):
+    """(f1, f2, f3) <lookup> (v1, v2, v3) written as an OR of prefixes."""
+    condition = Q()
+    for i, field in enumerate(fields):
+        prefix = {f: v for f, v in zip(fields[:i], values[:i])}
+        prefix[f'{field}__{lookup}'] = values[i]
+        condition |= Q(**prefix)
+    return condition
+
+
+class KeysetPage:
+    """One page of keyset results, iterable like a Paginator page."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def keyset_page(queryset, cursor=None, per_page=20, fields=LEDGER_ORDERING):
+    """
+    Return a KeysetPage of `queryset` in descending `fields` order, starting
+    after `cursor`. Raises InvalidCursor for a malformed token.
+    """
+    backwards = False
+    if cursor:
+        values, backwards = decode_cursor(cursor, queryset.model, fields)
+        if backwards:
+            # Previous page: the rows just above the cursor, read upwards
+            queryset = queryset.filter(_beyond(fields, values, 'gt'))
+        else:
+            queryset = queryset.filter(_beyond(fields, values, 'lt'))
+
+    if backwards:
+        queryset = queryset.order_by(*fields)
+    else:
+        queryset = queryset.order_by(*[f'-{field}' for field in fields])
+
+    rows = list(queryset[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage(rows)
+
+    has_next = True if backwards else has_more
+    has_previous = has_more if backwards else bool(cursor)
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], fields) if has_next else None,
+        previous_cursor=encode_cursor(rows[0], fields, reverse=True) if has_previous else None,
+    )
+
+
+def keyset_page_or_first(queryset, cursor=None, per_page=20, fields=LEDGER_ORDERING):
+    """keyset_page() for HTML views: a bad cursor shows the first page."""
+    try:
+        return keyset_page(queryset, cursor, per_page, fields)
+    except InvalidCursor:
+        return keyset_page(queryset, None, per_page, fields)
+
+
+class LedgerCursorPagination(pagination.BasePagination):
+    """
+    Keyset pagination for ledger endpoints. Requests that ask for a `page`
+    or an explicit `ordering` keep the page-number behaviour.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    fields = LEDGER_ORDERING
+    fallback_class = pagination.PageNumberPagination
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE or 10
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+        params = request.query_params
+        if 'page' in params or 'ordering' in params:
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        try:
+            self.page = keyset_page(
+                queryset, params.get(self.cursor_query_param), self.get_page_size(request), self.fields
+            )
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response({
+            'next': self._link(self.page.next_cursor),
+            'previous': self._link(self.page.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,246 @@
+"""
+Monthly range partitioning of the ItemTransaction ledger (PostgreSQL).
+
+The ledger is append-only and its hot queries (the transaction report,
+the item ledger, the dashboard) all read recent dates. Partitioned by
+month on `date`, PostgreSQL prunes the months a query cannot touch, and
+old months can be detached into standalone tables and moved to cheaper
+storage or dropped.
+
+The project keeps no migrations, so the table is created as a regular one
+and converted in place by `manage.py ledger_partitions convert`. After
+that, `migrate` (through the post_migrate receiver below) and
+`manage.py ledger_partitions create` add partitions ahead of time; a
+DEFAULT partition catches any date that has none, so posting never fails
+for lack of a partition; rows it caught are moved into their month's
+partition when that is created. The ORM needs no changes: the id keeps its own
+sequence and the primary key becomes (id, date).
+"""
+import datetime
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+
+from inventory.models import ItemTransaction
+
+LEDGER_TABLE = ItemTransaction._meta.db_table
+MONTHS_AHEAD = 3
+
+
+class PartitioningError(Exception):
+    """Raised when the ledger cannot be (re)partitioned as asked."""
+
+
+def add_months(day, months):
+    """First day of the month `months` after the month of `day`."""
+    years, month = divmod(day.month - 1 + months, 12)
+    return datetime.date(day.year + years, month + 1, 1)
+
+
+def parse_month(value):
+    """Parse YYYY-MM into the first day of that month."""
+    try:
+        return datetime.datetime.strptime(value.strip(), '%Y-%m').date()
+    except (AttributeError, ValueError):
+        raise PartitioningError(f"Invalid month: {value!r}, expected YYYY-MM.")
+
+
+def partition_name(month):
+    return f'{LEDGER_TABLE}_p{month:%Y_%m}'
+
+
+def default_partition_name():
+    return f'{LEDGER_TABLE}_default'
+
+
+def _connection(using):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        raise PartitioningError('Ledger partitioning needs PostgreSQL.')
+    return connection
+
+
+def is_partitioned(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [LEDGER_TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions(using=DEFAULT_DB_ALIAS):
+    """(name, bound) of every partition, oldest first."""
+    connection = _connection(using)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+            'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname',
+            [LEDGER_TABLE]
+        )
+        return cursor.fetchall()
+
+
+def _bounds(month):
+    return f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+
+
+def _default_has_rows(cursor, quote, month):
+    cursor.execute('SELECT to_regclass(%s)', [default_partition_name()])
+    if cursor.fetchone()[0] is None:
+        return False
+    cursor.execute(
+        f'SELECT 1 FROM {quote(default_partition_name())} WHERE date >= %s AND date < %s LIMIT 1',
+        [month, add_months(month, 1)]
+    )
+    return cursor.fetchone() is not None
+
+
+def _create_partition(cursor, quote, parent, month):
+    """
+    Create the partition for `month`. PostgreSQL refuses to while the
+    DEFAULT partition holds rows of that month, so those rows are moved:
+    DEFAULT is detached, the partition created, the month's rows routed
+    into it through the parent and DEFAULT attached again. This locks the
+    ledger for the duration of the move.
+    """
+    name = partition_name(month)
+    if not _default_has_rows(cursor, quote, month):
+        cursor.execute(f'CREATE TABLE {quote(name)} PARTITION OF {quote(parent)} FOR VALUES {_bounds(month)}')
+        return
+    default = quote(default_partition_name())
+    in_month = 'WHERE date >= %s AND date < %s'
+    params = [month, add_months(month, 1)]
+    cursor.execute(f'ALTER TABLE {quote(parent)} DETACH PARTITION {default}')
+    cursor.execute(f'CREATE TABLE {quote(name)} PARTITION OF {quote(parent)} FOR VALUES {_bounds(month)}')
+    cursor.execute(f'INSERT INTO {quote(parent)} SELECT * FROM {default} {in_month}', params)
+    cursor.execute(f'DELETE FROM {default} {in_month}', params)
+    cursor.execute(f'ALTER TABLE {quote(parent)} ATTACH PARTITION {default} DEFAULT')
+
+
+def _create_partitions(cursor, quote, parent, first_month, last_month):
+    created = []
+    month = first_month
+    while month <= last_month:
+        name = partition_name(month)
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is None:
+            _create_partition(cursor, quote, parent, month)
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def create_partitions(first_month, last_month, using=DEFAULT_DB_ALIAS):
+    """Create the missing monthly partitions from `first_month` to `last_month`. Returns their names."""
+    connection = _connection(using)
+    if not is_partitioned(using):
+        raise PartitioningError(f'{LEDGER_TABLE} is not partitioned; run `ledger_partitions convert` first.')
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        return _create_partitions(
+            cursor, connection.ops.quote_name, LEDGER_TABLE, first_month.replace(day=1), last_month.replace(day=1)
+        )
+
+
+def ensure_partitions(months_ahead=MONTHS_AHEAD, today=None, using=DEFAULT_DB_ALIAS):
+    """Partitions for this month and the next `months_ahead`, if the ledger is partitioned."""
+    if not is_partitioned(using):
+        return []
+    this_month = (today or datetime.date.today()).replace(day=1)
+    return create_partitions(this_month, add_months(this_month, months_ahead), using=using)
+
+
+def create_ledger_partitions(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver: keep partitions created ahead of time."""
+    ensure_partitions(using=using)
+
+
+def detach_partitions(before, using=DEFAULT_DB_ALIAS):
+    """
+    Detach the monthly partitions of months before `before`. They stay as
+    standalone tables (same names) to be archived, moved or dropped.
+    Returns their names.
+    """
+    connection = _connection(using)
+    quote = connection.ops.quote_name
+    before = before.replace(day=1)
+    detached = []
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for name, _ in list_partitions(using):
+            if name == default_partition_name() or name >= partition_name(before):
+                continue
+            cursor.execute(f'ALTER TABLE {quote(LEDGER_TABLE)} DETACH PARTITION {quote(name)}')
+            detached.append(name)
+    return detached
+
+
+def attach_partition(month, using=DEFAULT_DB_ALIAS):
+    """Attach a previously detached monthly partition back to the ledger."""
+    connection = _connection(using)
+    quote = connection.ops.quote_name
+    name = partition_name(month)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is None:
+            raise PartitioningError(f'There is no table {name} to attach.')
+        cursor.execute(f'ALTER TABLE {quote(LEDGER_TABLE)} ATTACH PARTITION {quote(name)} FOR VALUES {_bounds(month)}')
+    return name
+
+
+def convert_ledger(months_ahead=MONTHS_AHEAD, today=None, using=DEFAULT_DB_ALIAS):
+    """
+    Rebuild the ledger as a table partitioned by month, with partitions
+    for every month that has rows and `months_ahead` months to come. The
+    rows are copied under an exclusive lock, so run it in a maintenance
+    window. Returns the names of the partitions created.
+    """
+    connection = _connection(using)
+    if is_partitioned(using):
+        raise PartitioningError(f'{LEDGER_TABLE} is already partitioned.')
+    quote = connection.ops.quote_name
+    table = quote(LEDGER_TABLE)
+    staging = f'{LEDGER_TABLE}_partitioned'
+    sequence = f'{LEDGER_TABLE}_id_seq'
+    this_month = (today or datetime.date.today()).replace(day=1)
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT MIN(date), MAX(date), COALESCE(MAX(id), 0) FROM {table}')
+        first_date, last_date, max_id = cursor.fetchone()
+
+        # Foreign keys and indexes are recreated on the new table from their
+        # current definitions; the primary key has to include the date
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [LEDGER_TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            'SELECT pg_get_indexdef(indexrelid) FROM pg_index '
+            'WHERE indrelid = to_regclass(%s) AND NOT indisprimary',
+            [LEDGER_TABLE]
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f'CREATE TABLE {quote(staging)} (LIKE {table}) PARTITION BY RANGE (date)')
+        cursor.execute(f'CREATE TABLE {quote(default_partition_name())} PARTITION OF {quote(staging)} DEFAULT')
+        first_month = first_date.replace(day=1) if first_date else this_month
+        last_month = max(last_date.replace(day=1) if last_date else this_month, add_months(this_month, months_ahead))
+        created = _create_partitions(cursor, quote, staging, first_month, last_month)
+
+        cursor.execute(f'INSERT INTO {quote(staging)} SELECT * FROM {table}')
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {quote(staging)} RENAME TO {table}')
+
+        cursor.execute(f'CREATE SEQUENCE {quote(sequence)} OWNED BY {table}.id')
+        cursor.execute('SELECT setval(%s, %s, false)', [sequence, max_id + 1])
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, date)')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {quote(name)} {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+
+    return created
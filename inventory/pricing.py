@@ -0,0 +1,23 @@
+"""
+Item costing.
+
+Items are valued at a moving weighted-average price: each receipt blends
+its unit price into the price of the stock already on hand. The posting
+service applies the rule as it posts, and the daily movement rollup
+replays it when it is rebuilt from the ledger.
+"""
+from decimal import Decimal
+
+PRICE_QUANTUM = Decimal('0.01')
+
+
+def weighted_average_price(balance, price, quantity_in, unit_price):
+    """Price of the stock after receiving `quantity_in` at `unit_price` onto `balance` at `price`."""
+    if not quantity_in:
+        return price
+    if balance <= 0:
+        # If current balance is 0, just use the new price
+        return unit_price
+    # Weighted average price
+    total_value = (balance * price) + (quantity_in * unit_price)
+    return (total_value / (balance + quantity_in)).quantize(PRICE_QUANTUM)
@@ -0,0 +1,183 @@
+"""
+Ledger reconciliation.
+
+Two invariants should always hold for every item:
+
+- each ledger row's balance_after follows from the previous row of the
+  same item in posting order: previous balance_after + quantity_in -
+  quantity_out. Posting order is id order, except that an 'opening' row
+  written by archival comes first, since it stands for the archived rows
+  before the ones it was inserted after;
+- Item.current_balance equals the balance the item's first ledger row
+  started from plus the sum of quantity_in - quantity_out over its rows.
+
+Items can be created with a balance and no ledger row, so each chain
+starts from what its first row implies (balance_after - quantity_in +
+quantity_out), not from 0. Items without ledger rows have nothing to
+check their balance against and are left alone.
+
+check_range() finds the rows and items that break them for a range of
+item ids, with a LAG() window over the ledger so that each item's rows
+are read once, in one streamed query. reconcile() splits the items into
+ranges and runs them in a process pool; `manage.py reconcile_ledger`
+reports the results and can repair them.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections, transaction
+from django.db.models import Case, ExpressionWrapper, F, IntegerField, Max, Min, OuterRef, Subquery, Sum, Value, When, Window
+from django.db.models.functions import Lag
+
+from inventory import dashboard
+from inventory.models import Item, ItemTransaction
+from inventory.services import lock_items
+from reports import cache as report_cache
+
+RANGE_SIZE = 5000
+# Discrepancies listed per range; all of them are counted
+REPORT_LIMIT = 100
+STREAM_CHUNK_SIZE = 5000
+REPAIR_BATCH_SIZE = 1000
+
+
+def item_ranges(range_size=RANGE_SIZE):
+    """(first_id, last_id) ranges covering every item."""
+    bounds = Item.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return []
+    return [
+        (first_id, min(first_id + range_size - 1, bounds['last']))
+        for first_id in range(bounds['first'], bounds['last'] + 1, range_size)
+    ]
+
+
+def chain_order():
+    """Posting order within an item's ledger: its opening row, then by id."""
+    return [Case(When(transaction_type='opening', then=Value(0)), default=Value(1)).asc(), F('id').asc()]
+
+
+def _row_opening():
+    """The balance a ledger row started from."""
+    return F('balance_after') - F('quantity_in') + F('quantity_out')
+
+
+def chain_start(item):
+    """The balance an item's ledger starts from, for an OuterRef or an item id."""
+    return ItemTransaction.objects.filter(item=item).annotate(
+        start=_row_opening()
+    ).order_by(*chain_order()).values('start')[:1]
+
+
+def chain_breaks(first_id, last_id):
+    """Ledger rows whose balance_after does not follow from the row before."""
+    return ItemTransaction.objects.filter(item_id__gte=first_id, item_id__lte=last_id).annotate(
+        previous_balance=Window(
+            Lag('balance_after', default=_row_opening()), partition_by=[F('item_id')], order_by=chain_order()
+        ),
+        opening_balance=_row_opening(),
+    ).exclude(previous_balance=F('opening_balance')).order_by('item_id', 'id').values_list(
+        'id', 'item_id', 'previous_balance', 'opening_balance'
+    )
+
+
+def balance_drift(first_id, last_id):
+    """Items with ledger rows whose current_balance is not where their ledger ends."""
+    ledger = ItemTransaction.objects.filter(item=OuterRef('pk')).values('item').annotate(
+        total=Sum(F('quantity_in') - F('quantity_out'), output_field=IntegerField())
+    ).values('total')
+    return Item.objects.filter(id__gte=first_id, id__lte=last_id).annotate(
+        ledger_balance=ExpressionWrapper(
+            Subquery(chain_start(OuterRef('pk'))) + Subquery(ledger), output_field=IntegerField()
+        )
+    ).filter(ledger_balance__isnull=False).exclude(current_balance=F('ledger_balance')).order_by('id').values_list(
+        'id', 'code', 'current_balance', 'ledger_balance'
+    )
+
+
+@transaction.atomic
+def repair_item(item_id):
+    """
+    Recompute an item's balance_after chain from its quantities, starting
+    from the balance its first row started from, and set its
+    current_balance to where the chain ends, with the item locked. Returns
+    False, changing nothing, if the ledger would go below zero. An item
+    without ledger rows is left as it is.
+    """
+    item = lock_items([item_id])[item_id]
+    start = chain_start(item_id).first()
+    if start is None:
+        return True
+    rows = ItemTransaction.objects.filter(item_id=item_id).annotate(
+        running_balance=Window(
+            Sum(F('quantity_in') - F('quantity_out')), order_by=chain_order(), output_field=IntegerField()
+        )
+    ).order_by(*chain_order()).only('id', 'balance_after')
+
+    changed = []
+    balance = start['start']
+    for row in rows.iterator(chunk_size=STREAM_CHUNK_SIZE):
+        balance = start['start'] + row.running_balance
+        if balance < 0:
+            transaction.set_rollback(True)
+            return False
+        if row.balance_after != balance:
+            row.balance_after = balance
+            changed.append(row)
+        if len(changed) == REPAIR_BATCH_SIZE:
+            ItemTransaction.objects.bulk_update(changed, ['balance_after'])
+            changed = []
+    ItemTransaction.objects.bulk_update(changed, ['balance_after'])
+
+    if item.current_balance != balance:
+        Item.objects.filter(id=item_id).update(current_balance=balance)
+        dashboard.invalidate_stock()
+        report_cache.bump_version(report_cache.LEDGER)
+    return True
+
+
+def check_range(first_id, last_id, repair=False):
+    """
+    Check, and optionally repair, the items with ids in [first_id, last_id].
+    Returns the counts and the first REPORT_LIMIT discrepancies of each kind.
+    """
+    result = {'range': (first_id, last_id), 'chain_count': 0, 'chain': [],
+              'drift_count': 0, 'drift': [], 'repaired': [], 'unrepairable': []}
+    broken = set()
+
+    for txn_id, item_id, previous, opening in chain_breaks(first_id, last_id).iterator(chunk_size=STREAM_CHUNK_SIZE):
+        result['chain_count'] += 1
+        if len(result['chain']) < REPORT_LIMIT:
+            result['chain'].append((txn_id, item_id, previous, opening))
+        broken.add(item_id)
+
+    for item_id, code, current, ledger in balance_drift(first_id, last_id).iterator(chunk_size=STREAM_CHUNK_SIZE):
+        result['drift_count'] += 1
+        if len(result['drift']) < REPORT_LIMIT:
+            result['drift'].append((item_id, code, current, ledger))
+        broken.add(item_id)
+
+    if repair:
+        for item_id in sorted(broken):
+            result['repaired' if repair_item(item_id) else 'unrepairable'].append(item_id)
+    return result
+
+
+def _check_range(args):
+    return check_range(*args)
+
+
+def reconcile(repair=False, workers=1, range_size=RANGE_SIZE):
+    """
+    Run check_range over every item range, in `workers` processes. Yields
+    the results in order. Workers are forked from the configured Django
+    process; they open their own database connections, so the parent's
+    are closed first rather than shared.
+    """
+    tasks = [(first_id, last_id, repair) for first_id, last_id in item_ranges(range_size)]
+    if workers <= 1 or len(tasks) <= 1:
+        yield from map(_check_range, tasks)
+        return
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        yield from pool.map(_check_range, tasks)
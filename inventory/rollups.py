@@ -0,0 +1,153 @@
+"""
+Per-item daily movement rollup.
+
+ItemDailyMovement keeps quantity and value in/out, the closing balance and
+price and the number of ledger rows per item per day. post_movements() calls
+record_movements() with the ledger rows it has just inserted, inside the
+same transaction and while the items are locked, so the rollup never
+disagrees with the ledger. rebuild_movements() (`manage.py
+rebuild_daily_movements`) regenerates it from the ledger, except for the
+days whose ledger rows have been archived (see inventory.archive).
+"""
+from django.db import connection, transaction
+from django.db.models import F, Max, OuterRef, Subquery
+
+from inventory.models import Item, ItemDailyMovement, ItemTransaction, LedgerArchive
+from inventory.pricing import weighted_average_price
+
+REBUILD_BATCH_SIZE = 1000
+# Rows per upsert statement; 10 parameters each stays under SQLite's limit of 999
+UPSERT_BATCH_SIZE = 90
+
+TOTAL_FIELDS = ('quantity_in', 'quantity_out', 'value_in', 'value_out', 'transaction_count')
+CLOSING_FIELDS = ('closing_balance', 'closing_price')
+
+
+def _fold(days, txn, price):
+    """Add one ledger row, leaving the item at `price`, to its day in `days`."""
+    key = (txn.item_id, txn.date)
+    day = days.get(key)
+    if day is None:
+        day = days[key] = ItemDailyMovement(item_id=txn.item_id, date=txn.date)
+    day.quantity_in += txn.quantity_in
+    day.quantity_out += txn.quantity_out
+    if txn.quantity_in:
+        day.value_in += txn.total_price
+    else:
+        day.value_out += txn.total_price
+    day.closing_balance = txn.balance_after
+    day.closing_price = price
+    day.transaction_count += 1
+
+
+def _day_totals(transactions, prices):
+    """Fold ledger rows, in posting order, into ItemDailyMovement objects closing at `prices`."""
+    days = {}
+    for txn in transactions:
+        _fold(days, txn, prices[txn.item_id])
+    return list(days.values())
+
+
+def _upsert(days):
+    """INSERT ... ON CONFLICT DO UPDATE adding to the existing totals."""
+    opts = ItemDailyMovement._meta
+    quote = connection.ops.quote_name
+    table = quote(opts.db_table)
+    fields = [opts.get_field(name) for name in ('item', 'date', *TOTAL_FIELDS, *CLOSING_FIELDS)]
+    columns = [quote(field.column) for field in fields]
+
+    params = []
+    for day in days:
+        params.extend(field.get_db_prep_save(getattr(day, field.attname), connection) for field in fields)
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(days))
+    updates = [f"{quote(name)} = {table}.{quote(name)} + EXCLUDED.{quote(name)}" for name in TOTAL_FIELDS]
+    updates.extend(f"{quote(name)} = EXCLUDED.{quote(name)}" for name in CLOSING_FIELDS)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders} "
+            f"ON CONFLICT ({quote('item_id')}, {quote('date')}) DO UPDATE SET {', '.join(updates)}",
+            params
+        )
+
+
+def record_movements(transactions, prices):
+    """
+    Add freshly posted ledger rows to the rollup; `prices` maps each item
+    id to its price after the posting. Must run in the posting transaction,
+    with the items locked.
+    """
+    days = _day_totals(transactions, prices)
+    if not days:
+        return
+    if connection.vendor in ('postgresql', 'sqlite'):
+        for start in range(0, len(days), UPSERT_BATCH_SIZE):
+            _upsert(days[start:start + UPSERT_BATCH_SIZE])
+        return
+
+    # Other backends: the item locks make the read-modify-write safe
+    for day in days:
+        updated = ItemDailyMovement.objects.filter(item_id=day.item_id, date=day.date).update(
+            closing_balance=day.closing_balance,
+            closing_price=day.closing_price,
+            **{name: F(name) + getattr(day, name) for name in TOTAL_FIELDS}
+        )
+        if not updated:
+            day.save()
+
+
+@transaction.atomic
+def rebuild_movements(date_from=None):
+    """
+    Regenerate the rollup from the ledger, for every day or from `date_from`
+    on. Closing prices are replayed with the weighted-average rule, starting
+    from each item's last closing price before `date_from`. Returns the
+    number of rollup rows written.
+    """
+    # Days before the archive cut-off have no ledger rows left to rebuild from
+    archived = LedgerArchive.objects.aggregate(cutoff=Max('cutoff'))['cutoff']
+    if archived and (date_from is None or date_from < archived):
+        date_from = archived
+
+    rollups = ItemDailyMovement.objects.all()
+    ledger = ItemTransaction.objects.all()
+    prices = {}
+    if date_from:
+        rollups = rollups.filter(date__gte=date_from)
+        ledger = ledger.filter(date__gte=date_from)
+        prices = dict(
+            Item.objects.annotate(
+                price=Subquery(
+                    ItemDailyMovement.objects.filter(item=OuterRef('pk'), date__lt=date_from)
+                    .order_by('-date').values('closing_price')[:1]
+                )
+            ).filter(price__isnull=False).values_list('id', 'price')
+        )
+    rollups.delete()
+
+    # One item at a time, in posting order, so each day's closing price can
+    # be replayed; days are written once their item is complete
+    ledger = ledger.only(
+        'item_id', 'date', 'quantity_in', 'quantity_out', 'balance_after', 'unit_price', 'total_price'
+    ).order_by('item_id', 'id')
+
+    total = 0
+    days = {}
+    item_id = price = None
+    for txn in ledger.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        if txn.item_id != item_id:
+            if len(days) >= REBUILD_BATCH_SIZE:
+                total += _write_days(days)
+                days = {}
+            item_id = txn.item_id
+            price = prices.get(item_id, 0)
+        balance = txn.balance_after - txn.quantity_in + txn.quantity_out
+        price = weighted_average_price(balance, price, txn.quantity_in, txn.unit_price)
+        _fold(days, txn, price)
+    total += _write_days(days)
+    return total
+
+
+def _write_days(days):
+    ItemDailyMovement.objects.bulk_create(days.values(), batch_size=REBUILD_BATCH_SIZE)
+    return len(days)
@@ -0,0 +1,109 @@
+"""
+Item search.
+
+All free-text item search (the item list, the inventory report, the items
+and transactions API) goes through a search backend chosen by the
+SEARCH_BACKEND setting. By default PostgreSQL uses TrigramSearchBackend,
+whose substring matches are served by the pg_trgm GIN indexes on Item and
+can be ranked by similarity. Other databases (SQLite test runs) use the
+portable SearchBackend. Both backends match the same rows.
+
+The typeahead behind the document forms' item pickers is a prefix lookup
+served by the text_pattern_ops indexes.
+"""
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+TYPEAHEAD_LIMIT = 20
+TYPEAHEAD_MAX_LIMIT = 50
+
+ITEM_SEARCH_FIELDS = ('code', 'description')
+
+
+class SearchBackend:
+    """Every word of the term must appear (icontains) in one of the fields."""
+
+    def filter(self, queryset, fields, term):
+        for word in term.split():
+            queryset = queryset.filter(reduce(or_, [Q(**{f'{field}__icontains': word}) for field in fields]))
+        return queryset
+
+    def rank(self, queryset, fields, term):
+        """Order matches by relevance; the portable backend keeps the given order."""
+        return queryset
+
+
+class TrigramSearchBackend(SearchBackend):
+    """PostgreSQL backend: pg_trgm indexed matching, ranked by trigram similarity."""
+
+    def rank(self, queryset, fields, term):
+        similarities = [TrigramSimilarity(field, term) for field in fields]
+        rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        return queryset.annotate(search_rank=rank).order_by('-search_rank', 'pk')
+
+
+def get_backend(using=DEFAULT_DB_ALIAS):
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connections[using].vendor == 'postgresql':
+        return TrigramSearchBackend()
+    return SearchBackend()
+
+
+def apply_search(queryset, term, fields=ITEM_SEARCH_FIELDS, rank=False):
+    """Filter `queryset` to the rows matching `term`, best matches first if `rank`."""
+    term = (term or '').strip()
+    if not term:
+        return queryset
+    backend = get_backend(queryset.db)
+    queryset = backend.filter(queryset, fields, term)
+    if rank:
+        queryset = backend.rank(queryset, fields, term)
+    return queryset
+
+
+class BackendSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that runs through the search backend. Views that set
+    `search_rank = True` get relevance order unless ?ordering= is given.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        fields = self.get_search_fields(view, request)
+        terms = self.get_search_terms(request)
+        if not fields or not terms:
+            return queryset
+        rank = getattr(view, 'search_rank', False) and not request.query_params.get('ordering')
+        return apply_search(queryset, ' '.join(terms), fields, rank=rank)
+
+
+def clamp_limit(value, default=TYPEAHEAD_LIMIT, maximum=TYPEAHEAD_MAX_LIMIT):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
+
+
+def typeahead(queryset, term, limit=TYPEAHEAD_LIMIT):
+    """
+    Items of `queryset` whose code or description starts with `term`
+    (case-insensitive), code matches first, at most `limit` of them.
+    """
+    term = (term or '').strip()
+    if not term:
+        return queryset.none()
+    return queryset.filter(
+        Q(code__istartswith=term) | Q(description__istartswith=term)
+    ).alias(
+        code_match=Case(When(code__istartswith=term, then=Value(0)), default=Value(1))
+    ).order_by('code_match', 'code')[:limit]
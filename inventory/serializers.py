@@ -1,26 +1,74 @@
 from rest_framework import serializers
-from inventory.models import Category, UnitOfMeasure, Item, ItemTransaction, Supplier
+from inventory.fieldsets import DynamicFieldsMixin
+from inventory.models import Category, UnitOfMeasure, Item, ItemTransaction, Supplier, DocumentIndex
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
-class UnitOfMeasureSerializer(serializers.ModelSerializer):
+class UnitOfMeasureSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = UnitOfMeasure
         fields = '__all__'
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     category_name = serializers.ReadOnlyField(source='category.name')
     unit_of_measure_name = serializers.ReadOnlyField(source='unit_of_measure.abbreviation')
     is_low_stock = serializers.ReadOnlyField()
+    available_quantity = serializers.ReadOnlyField()
     
     class Meta:
         model = Item
         fields = '__all__'
+        # Changed only by posted movements, adjustments and reservations
+        read_only_fields = ['current_balance', 'current_price', 'reserved_qty']
+    
+    def update(self, instance, validated_data):
+        # Write only the submitted fields, so the balance read with the
+        # instance cannot overwrite a movement posted in the meantime
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+class StockAdjustmentSerializer(serializers.Serializer):
+    """
+    A stock adjustment posted through the ledger: opening stock for a new
+    item, or a correction after a count. A positive quantity adds stock,
+    a negative one removes it; the price defaults to the item's own.
+    """
+    quantity = serializers.IntegerField()
+    unit_price = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=0, required=False)
+    date = serializers.DateField(required=False)
+    
+    def validate_quantity(self, value):
+        if not value:
+            raise serializers.ValidationError('The quantity cannot be zero.')
+        return value
+
+class ItemAvailabilitySerializer(serializers.Serializer):
+    """What a document line needs to know about an item, read from values() rows."""
+    id = serializers.IntegerField()
+    code = serializers.CharField()
+    description = serializers.CharField()
+    unit_of_measure_name = serializers.CharField(allow_null=True)
+    current_price = serializers.DecimalField(max_digits=15, decimal_places=2)
+    current_balance = serializers.IntegerField()
+    min_stock_level = serializers.IntegerField()
+    available_quantity = serializers.IntegerField()
 
-class ItemTransactionSerializer(serializers.ModelSerializer):
+class ItemBalanceAsOfSerializer(serializers.Serializer):
+    """An item's stock and value at the end of a past day, read from values() rows."""
+    id = serializers.IntegerField()
+    code = serializers.CharField()
+    description = serializers.CharField()
+    unit_of_measure_name = serializers.CharField(allow_null=True)
+    balance = serializers.IntegerField()
+    unit_price = serializers.DecimalField(max_digits=15, decimal_places=2)
+    value = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+class ItemTransactionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     item_code = serializers.ReadOnlyField(source='item.code')
     item_description = serializers.ReadOnlyField(source='item.description')
     created_by_name = serializers.ReadOnlyField(source='created_by.get_full_name')
@@ -29,7 +77,47 @@ class ItemTransactionSerializer(serializers.ModelSerializer):
         model = ItemTransaction
         fields = '__all__'
 
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = '__all__'
+
+class DocumentIndexSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    document_type_display = serializers.ReadOnlyField(source='get_document_type_display')
+    
+    class Meta:
+        model = DocumentIndex
+        fields = ['document_type', 'document_type_display', 'document_id', 'number', 'date', 'department', 'supplier', 'status']
+
+class DocumentLineListSerializer(serializers.ListSerializer):
+    def validate(self, lines):
+        if not lines:
+            raise serializers.ValidationError('At least one line is required.')
+        item_ids = [line['item_id'] for line in lines]
+        duplicates = sorted({item_id for item_id in item_ids if item_ids.count(item_id) > 1})
+        if duplicates:
+            raise serializers.ValidationError(f"Each item can only appear on one line; repeated: {duplicates}.")
+        missing = set(item_ids) - set(Item.objects.filter(id__in=item_ids).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(f"Items do not exist: {sorted(missing)}.")
+        return lines
+
+class DocumentLineSerializer(serializers.Serializer):
+    """
+    A GRN or SIV line as posted with its document, checked before the
+    document-level posting service bulk-inserts the lines. Items are
+    checked in one query for all lines.
+    """
+    item_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+    unit_price = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=0)
+    
+    class Meta:
+        list_serializer_class = DocumentLineListSerializer
+    
+    def to_internal_value(self, data):
+        # Lines may name the item as `item` like the line endpoints do
+        if isinstance(data, dict) and 'item_id' not in data and 'item' in data:
+            data = {**data, 'item_id': data['item']}
+        return super().to_internal_value(data)
+
@@ -0,0 +1,423 @@
+"""
+Stock posting service.
+
+Every change to an item's balance or price goes through post_movements so
+the Item rows, the ItemTransaction ledger and the daily movement rollup
+are written together, inside one database transaction, with the affected
+Item rows locked.
+
+Documents are dated by their users, so a posting can land on or before a
+balance snapshot; the snapshots from its date on are adjusted in the same
+transaction, so as-of balances keep adding up.
+
+Approved store requisitions reserve their quantities (Item.reserved_qty,
+SRItem.reserved_qty) under the same locks, so available-to-promise stock
+(on hand minus reserved) is never promised twice: approval fails when it
+is short, and an issue may take its own requisition's reservation plus
+what is still available.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+
+from inventory import dashboard, rollups
+from inventory.models import Item, ItemBalanceSnapshot, ItemTransaction
+from inventory.pricing import weighted_average_price
+from reports import cache as report_cache
+from store_requisition.models import SRItem, StoreRequisition
+
+
+class InsufficientStockError(Exception):
+    """Raised when a posting would take an item's balance below zero."""
+
+
+class RequisitionNotIssuableError(Exception):
+    """Raised when an issue is posted against a requisition that is no longer open for issue."""
+
+
+def _to_decimal(value):
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def lock_items(item_ids):
+    """
+    Lock the given items with SELECT ... FOR UPDATE and return them by id.
+    Rows are always locked in primary key order so that two postings that
+    touch overlapping items cannot deadlock each other.
+    """
+    items = Item.objects.select_for_update().filter(id__in=sorted(set(item_ids))).order_by('id')
+    return {item.id: item for item in items}
+
+
+def lock_requisition(sr_id):
+    """
+    Lock a store requisition with SELECT ... FOR UPDATE and return it.
+    Approval, rejection, closing and issuing take this lock before reading
+    the requisition's status or lines, and before locking any items, so
+    they run one after the other on the same requisition.
+    """
+    return StoreRequisition.objects.select_for_update().get(pk=sr_id)
+
+
+def _adjust_snapshots(transactions, date):
+    """
+    Fold ledger rows posted on `date` into the balance snapshots taken on
+    or after it, with the items locked. An item missing from a snapshot
+    had nothing in stock that day, as annotate_as_of assumes. Raises
+    InsufficientStockError if a snapshot would go below zero.
+    """
+    dates = list(ItemBalanceSnapshot.objects.filter(date__gte=date).values_list('date', flat=True).distinct())
+    if not dates:
+        return
+    existing = {
+        (snapshot.item_id, snapshot.date): snapshot
+        for snapshot in ItemBalanceSnapshot.objects.filter(
+            item_id__in={txn.item_id for txn in transactions}, date__gte=date
+        )
+    }
+    missing = {}
+    for snapshot_date in sorted(dates):
+        for txn in transactions:
+            key = (txn.item_id, snapshot_date)
+            snapshot = existing.get(key) or missing.get(key)
+            if snapshot is None:
+                snapshot = missing[key] = ItemBalanceSnapshot(item_id=txn.item_id, date=snapshot_date)
+            snapshot.unit_price = weighted_average_price(
+                snapshot.balance, snapshot.unit_price, txn.quantity_in, txn.unit_price
+            )
+            snapshot.balance += txn.quantity_in - txn.quantity_out
+            if snapshot.balance < 0:
+                raise InsufficientStockError(
+                    f"Insufficient stock for item {txn.item_id} on {snapshot_date}: "
+                    f"{snapshot.balance + txn.quantity_out} in stock, {txn.quantity_out} requested."
+                )
+            snapshot.value = snapshot.balance * snapshot.unit_price
+    ItemBalanceSnapshot.objects.bulk_update(existing.values(), ['balance', 'unit_price', 'value'])
+    ItemBalanceSnapshot.objects.bulk_create(missing.values())
+
+
+@transaction.atomic
+def post_movements(lines, transaction_type, reference_type=None, reference_id=None,
+                   date=None, created_by=None):
+    """
+    Post stock movements for one document.
+
+    `lines` is an iterable of dicts with `item_id`, `quantity_in`,
+    `quantity_out`, `unit_price` and optionally `total_price`. Balances and
+    weighted-average prices are computed from the locked rows, the ledger
+    rows are inserted, and the items are updated with database-side deltas.
+    Returns the created ItemTransaction objects.
+    """
+    lines = list(lines)
+    if not lines:
+        return []
+
+    date = date or timezone.now().date()
+    items = lock_items(int(line['item_id']) for line in lines)
+
+    # Running balance/price per item, starting from the locked values
+    state = {item_id: (item.current_balance, item.current_price) for item_id, item in items.items()}
+    deltas = {item_id: 0 for item_id in items}
+
+    transactions = []
+    for line in lines:
+        item_id = int(line['item_id'])
+        if item_id not in items:
+            raise Item.DoesNotExist(f"Item {item_id} does not exist.")
+
+        quantity_in = int(line.get('quantity_in') or 0)
+        quantity_out = int(line.get('quantity_out') or 0)
+        unit_price = _to_decimal(line['unit_price'])
+        balance, price = state[item_id]
+
+        if quantity_out > balance + quantity_in:
+            raise InsufficientStockError(
+                f"Insufficient stock for {items[item_id].code}: "
+                f"{balance} available, {quantity_out} requested."
+            )
+
+        price = weighted_average_price(balance, price, quantity_in, unit_price)
+        balance = balance + quantity_in - quantity_out
+        state[item_id] = (balance, price)
+        deltas[item_id] += quantity_in - quantity_out
+
+        total_price = line.get('total_price')
+        if total_price is None:
+            total_price = unit_price * (quantity_in or quantity_out)
+
+        transactions.append(ItemTransaction(
+            item_id=item_id,
+            transaction_type=transaction_type,
+            reference_id=reference_id,
+            reference_type=reference_type,
+            quantity_in=quantity_in,
+            quantity_out=quantity_out,
+            balance_after=balance,
+            unit_price=unit_price,
+            total_price=_to_decimal(total_price),
+            date=date,
+            created_by=created_by,
+        ))
+
+    ItemTransaction.objects.bulk_create(transactions)
+    _adjust_snapshots(transactions, date)
+    rollups.record_movements(transactions, {item_id: price for item_id, (_, price) in state.items()})
+
+    # Apply the quantity deltas in the database; the rows are locked so the
+    # price computed above is based on the committed balance.
+    now = timezone.now()
+    changed = []
+    for item_id, item in items.items():
+        item.current_balance = F('current_balance') + deltas[item_id]
+        item.current_price = state[item_id][1]
+        item.updated_at = now
+        changed.append(item)
+    Item.objects.bulk_update(changed, ['current_balance', 'current_price', 'updated_at'])
+    dashboard.invalidate_stock()
+    report_cache.bump_version(report_cache.LEDGER)
+
+    return transactions
+
+
+def post_grn_items(grn, grn_items):
+    """Post the receipt of GRN lines into stock."""
+    return post_movements(
+        [
+            {
+                'item_id': grn_item.item_id,
+                'quantity_in': grn_item.quantity,
+                'unit_price': grn_item.unit_price,
+                'total_price': grn_item.total_price,
+            }
+            for grn_item in grn_items
+        ],
+        transaction_type='purchase',
+        reference_type='GRN',
+        reference_id=grn.id,
+        date=grn.date,
+        created_by=grn.received_by,
+    )
+
+
+def _adjust_reservations(items, changes):
+    """Add the per-item `changes` to Item.reserved_qty of the locked `items`."""
+    changed = []
+    for item_id, change in changes.items():
+        if change:
+            item = items[item_id]
+            item.reserved_qty = F('reserved_qty') + change
+            changed.append(item)
+    Item.objects.bulk_update(changed, ['reserved_qty'])
+
+
+@transaction.atomic
+def reserve_sr_items(sr_items):
+    """
+    Reserve the approved quantity of each store requisition line. Raises
+    InsufficientStockError, reserving nothing, if an item's available to
+    promise stock cannot cover its lines.
+    """
+    sr_items = list(sr_items)
+    items = lock_items(sr_item.item_id for sr_item in sr_items)
+    changes = defaultdict(int)
+    for sr_item in sr_items:
+        changes[sr_item.item_id] += sr_item.approved_quantity - sr_item.reserved_qty
+
+    for item_id, change in changes.items():
+        item = items[item_id]
+        if change > item.available_quantity:
+            raise InsufficientStockError(
+                f"Insufficient stock for {item.code}: "
+                f"{item.available_quantity} available to promise, {change} requested."
+            )
+
+    for sr_item in sr_items:
+        sr_item.reserved_qty = sr_item.approved_quantity
+    SRItem.objects.bulk_update(sr_items, ['reserved_qty'])
+    _adjust_reservations(items, changes)
+    return sr_items
+
+
+@transaction.atomic
+def release_sr_items(sr_items):
+    """Release whatever the store requisition lines still hold reserved."""
+    sr_items = [sr_item for sr_item in sr_items if sr_item.reserved_qty]
+    if not sr_items:
+        return
+    items = lock_items(sr_item.item_id for sr_item in sr_items)
+    changes = defaultdict(int)
+    for sr_item in sr_items:
+        changes[sr_item.item_id] -= sr_item.reserved_qty
+        sr_item.reserved_qty = 0
+    SRItem.objects.bulk_update(sr_items, ['reserved_qty'])
+    _adjust_reservations(items, changes)
+
+
+def _apply_to_requisition(siv, siv_items, items):
+    """
+    Add the SIV lines to their requisition lines' issued_qty and take them
+    out of the requisition's reservations first. Any quantity beyond the
+    reservation must come from available-to-promise stock, so other
+    requisitions' reservations are left alone.
+    """
+    sr_items = {
+        sr_item.item_id: sr_item
+        for sr_item in SRItem.objects.filter(sr_id=siv.sr_id, item_id__in=items).only(
+            'id', 'item_id', 'reserved_qty', 'issued_qty'
+        )
+    }
+    changes = defaultdict(int)
+    unreserved_taken = defaultdict(int)
+    for siv_item in siv_items:
+        if siv_item.item_id not in items:
+            raise Item.DoesNotExist(f"Item {siv_item.item_id} does not exist.")
+        item = items[siv_item.item_id]
+        sr_item = sr_items.get(siv_item.item_id)
+        own = min(sr_item.reserved_qty, siv_item.quantity) if sr_item else 0
+        unreserved_taken[item.id] += siv_item.quantity - own
+        if unreserved_taken[item.id] > item.available_quantity:
+            raise InsufficientStockError(
+                f"Insufficient stock for {item.code}: {item.available_quantity} available to promise, "
+                f"{unreserved_taken[item.id]} requested beyond the reservation."
+            )
+        if sr_item:
+            sr_item.reserved_qty -= own
+            sr_item.issued_qty = F('issued_qty') + siv_item.quantity
+            changes[item.id] -= own
+    SRItem.objects.bulk_update(sr_items.values(), ['reserved_qty', 'issued_qty'])
+    _adjust_reservations(items, changes)
+
+
+def update_sr_status(sr):
+    """
+    Derive a requisition's issue status from its lines' issued_qty with one
+    aggregate: 'issued' once every line has its approved quantity issued,
+    'partially_issued' once anything has been.
+    """
+    # Same fallback as SRItem.approved_quantity
+    approved = Coalesce(NullIf('approved_qty', 0), NullIf('checked_qty', 0), 'requested_qty')
+    lines = sr.items.aggregate(
+        total=Count('id'),
+        issued=Count('id', filter=Q(issued_qty__gte=approved)),
+        started=Count('id', filter=Q(issued_qty__gt=0)),
+    )
+    if lines['total'] and lines['issued'] == lines['total']:
+        status = 'issued'
+    elif lines['started']:
+        status = 'partially_issued'
+    else:
+        return sr.status
+    if sr.status != status:
+        sr.status = status
+        sr.save(update_fields=['status', 'updated_at'])
+    return status
+
+
+@transaction.atomic
+def post_siv_items(siv, siv_items):
+    """
+    Post the issue of SIV lines out of stock, record them against their
+    requisition's lines and reservations, and update its status.
+    """
+    siv_items = list(siv_items)
+    # The requisition is locked before the items, as approval, rejection and
+    # closing do, so they and concurrent issues against it run one after
+    # the other; its status may have changed since the issue was validated
+    sr = lock_requisition(siv.sr_id)
+    if sr.status not in StoreRequisition.ISSUABLE_STATUSES:
+        raise RequisitionNotIssuableError(
+            f"Store Requisition {sr.requisition_no} is {sr.get_status_display().lower()}; "
+            f"only approved or partially issued requisitions can be issued."
+        )
+    items = lock_items(siv_item.item_id for siv_item in siv_items)
+    _apply_to_requisition(siv, siv_items, items)
+    transactions = post_movements(
+        [
+            {
+                'item_id': siv_item.item_id,
+                'quantity_out': siv_item.quantity,
+                'unit_price': siv_item.unit_price,
+                'total_price': siv_item.total_price,
+            }
+            for siv_item in siv_items
+        ],
+        transaction_type='issue',
+        reference_type='SIV',
+        reference_id=siv.id,
+        date=siv.date,
+        created_by=siv.prepared_by,
+    )
+    update_sr_status(sr)
+    return transactions
+
+
+def _create_lines(parent, items_data):
+    """
+    Bulk insert the lines of a document through its `items` relation.
+    bulk_create bypasses the per-line post_save posting signals, so the
+    caller is responsible for posting the returned lines.
+    """
+    model = parent.items.model
+    parent_field = parent.items.field.name
+    lines = []
+    for item_data in items_data:
+        quantity = int(item_data['quantity'])
+        unit_price = _to_decimal(item_data['unit_price'])
+        lines.append(model(**{
+            parent_field: parent,
+            'item_id': int(item_data.get('item_id') or item_data['item']),
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': unit_price * quantity,
+        }))
+    return model.objects.bulk_create(lines)
+
+
+@transaction.atomic
+def receive_grn_items(grn, items_data):
+    """
+    Document-level posting for a GRN: creates all lines and posts them to
+    stock in a constant number of statements regardless of line count.
+    """
+    grn_items = _create_lines(grn, items_data)
+    post_grn_items(grn, grn_items)
+    return grn_items
+
+
+@transaction.atomic
+def issue_siv_items(siv, items_data):
+    """
+    Document-level posting for a SIV: creates all lines and posts them out
+    of stock in a constant number of statements regardless of line count.
+    """
+    siv_items = _create_lines(siv, items_data)
+    post_siv_items(siv, siv_items)
+    return siv_items
+
+
+def post_adjustment(item, quantity, unit_price=None, date=None, created_by=None, reference_id=None):
+    """
+    Post a stock adjustment. A positive quantity adds stock, a negative one
+    removes it. Defaults to the item's current price.
+    """
+    if unit_price is None:
+        unit_price = item.current_price
+    return post_movements(
+        [{
+            'item_id': item.id,
+            'quantity_in': max(quantity, 0),
+            'quantity_out': max(-quantity, 0),
+            'unit_price': unit_price,
+        }],
+        transaction_type='adjustment',
+        reference_type='ADJ',
+        reference_id=reference_id,
+        date=date,
+        created_by=created_by,
+    )
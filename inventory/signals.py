@@ -1,8 +1,12 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from inventory.models import Item, ItemTransaction
-from store_requisition.models import SIVItem, StoreIssue
-from goods_receiving.models import GRNItem
+from inventory import dashboard, documents, services
+from inventory.models import Item, Supplier
+from users.models import Department
+from store_requisition.models import SIVItem, SRItem, StoreIssue, StoreRequisition
+from purchase_requisition.models import PRItem, PurchaseRequisition
+from reports import cache as report_cache
+from goods_receiving.models import GRNItem, GoodsReceivingNote
 
 @receiver(post_save, sender=GRNItem)
 def update_inventory_on_grn_save(sender, instance, created, **kwargs):
@@ -10,35 +14,7 @@ def update_inventory_on_grn_save(sender, instance, created, **kwargs):
     Signal to update inventory when a GRN item is saved
     """
     if created:  # Only run this for new items
-        # Create an item transaction record
-        transaction = ItemTransaction(
-            item=instance.item,
-            transaction_type='purchase',
-            reference_id=instance.grn.id,
-            reference_type='GRN',
-            quantity_in=instance.quantity,
-            quantity_out=0,
-            balance_after=instance.item.current_balance + instance.quantity,
-            unit_price=instance.unit_price,
-            total_price=instance.total_price,
-            date=instance.grn.date,
-            created_by=instance.grn.received_by
-        )
-        transaction.save()
-        
-        # Update item balance and price (weighted average)
-        item = instance.item
-        if item.current_balance == 0:
-            # If current balance is 0, just use the new price
-            item.current_price = instance.unit_price
-        else:
-            # Calculate weighted average price
-            total_value = (item.current_balance * item.current_price) + (instance.quantity * instance.unit_price)
-            total_quantity = item.current_balance + instance.quantity
-            item.current_price = total_value / total_quantity
-        
-        item.current_balance += instance.quantity
-        item.save()
+        services.post_grn_items(instance.grn, [instance])
 
 @receiver(post_save, sender=SIVItem)
 def update_inventory_on_siv_save(sender, instance, created, **kwargs):
@@ -46,56 +22,94 @@ def update_inventory_on_siv_save(sender, instance, created, **kwargs):
     Signal to update inventory when a SIV item is saved
     """
     if created:  # Only run this for new items
-        # Create an item transaction record
-        transaction = ItemTransaction(
-            item=instance.item,
-            transaction_type='issue',
-            reference_id=instance.siv.id,
-            reference_type='SIV',
-            quantity_in=0,
-            quantity_out=instance.quantity,
-            balance_after=instance.item.current_balance - instance.quantity,
-            unit_price=instance.unit_price,
-            total_price=instance.total_price,
-            date=instance.siv.date,
-            created_by=instance.siv.prepared_by
-        )
-        transaction.save()
-        
-        # Update item balance
-        item = instance.item
-        item.current_balance -= instance.quantity
-        item.save()
+        services.post_siv_items(instance.siv, [instance])
 
+@receiver(pre_delete, sender=SRItem)
+def release_reservation_on_delete(sender, instance, **kwargs):
+    """
+    Signal to release a requisition line's reservation when it is deleted
+    """
+    if instance.reserved_qty:
+        services.release_sr_items([instance])
+
+@receiver(post_save, sender=StoreRequisition)
 @receiver(post_save, sender=StoreIssue)
-def update_store_requisition_status(sender, instance, created, **kwargs):
-    """
-    Signal to update store requisition status when a store issue is created
-    """
-    if created:
-        # Get the store requisition
-        sr = instance.sr
-        
-        # Check if all items in the SR have been issued
-        sr_items = sr.items.all()
-        siv_items = instance.items.all()
-        
-        # If all items have been issued with the full quantity, mark as 'issued'
-        # Otherwise, mark as 'partially_issued'
-        all_issued = True
-        
-        for sr_item in sr_items:
-            approved_qty = sr_item.approved_qty or sr_item.checked_qty or sr_item.requested_qty
-            issued_qty = 0
-            
-            # Sum up all issued quantities for this item
-            for siv_item in siv_items:
-                if siv_item.item == sr_item.item:
-                    issued_qty += siv_item.quantity
-            
-            if issued_qty < approved_qty:
-                all_issued = False
-                break
-        
-        sr.status = 'issued' if all_issued else 'partially_issued'
-        sr.save()
+@receiver(post_save, sender=PurchaseRequisition)
+@receiver(post_save, sender=GoodsReceivingNote)
+def index_document_on_save(sender, instance, **kwargs):
+    """
+    Signal to keep the document search index current when a document is saved
+    """
+    documents.index_documents([instance])
+
+@receiver(post_delete, sender=StoreRequisition)
+@receiver(post_delete, sender=StoreIssue)
+@receiver(post_delete, sender=PurchaseRequisition)
+@receiver(post_delete, sender=GoodsReceivingNote)
+def unindex_document_on_delete(sender, instance, **kwargs):
+    """
+    Signal to remove a deleted document from the search index
+    """
+    documents.unindex_document(instance)
+
+@receiver(post_save, sender=Department)
+def update_document_index_on_department_save(sender, instance, created, **kwargs):
+    """
+    Signal to carry a renamed department into the search index
+    """
+    if not created:
+        documents.rename_department(instance)
+
+@receiver(post_save, sender=Supplier)
+def update_document_index_on_supplier_save(sender, instance, created, **kwargs):
+    """
+    Signal to carry a renamed supplier into the search index
+    """
+    if not created:
+        documents.rename_supplier(instance)
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidate_dashboard_stock(sender, instance, **kwargs):
+    """
+    Signal to drop the cached dashboard stock figures when an item changes
+    """
+    dashboard.invalidate_stock()
+
+@receiver(post_save, sender=StoreRequisition)
+@receiver(post_delete, sender=StoreRequisition)
+def invalidate_dashboard_requisitions(sender, instance, **kwargs):
+    """
+    Signal to drop the cached dashboard requisition figures when a requisition changes
+    """
+    dashboard.invalidate_requisitions(instance.requested_by_id)
+
+@receiver(post_save, sender=GoodsReceivingNote)
+@receiver(post_delete, sender=GoodsReceivingNote)
+def invalidate_dashboard_receiving(sender, instance, **kwargs):
+    """
+    Signal to drop the cached recent GRNs when a GRN changes
+    """
+    dashboard.invalidate_receiving()
+
+REPORT_SCOPES = {
+    Item: report_cache.LEDGER,
+    StoreRequisition: report_cache.REQUISITIONS,
+    PurchaseRequisition: report_cache.PURCHASES,
+    PRItem: report_cache.PURCHASES,
+}
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=StoreRequisition)
+@receiver(post_delete, sender=StoreRequisition)
+@receiver(post_save, sender=PurchaseRequisition)
+@receiver(post_delete, sender=PurchaseRequisition)
+@receiver(post_save, sender=PRItem)
+@receiver(post_delete, sender=PRItem)
+def bump_report_version(sender, instance, **kwargs):
+    """
+    Signal to retire the cached report results that read the changed model
+    """
+    report_cache.bump_version(REPORT_SCOPES[sender])
+
@@ -0,0 +1,102 @@
+"""
+Point-in-time stock balances.
+
+ItemBalanceSnapshot holds each item's balance and price at the end of a
+day, taken periodically by `manage.py take_balance_snapshots` (for example
+every night or at each month end). annotate_as_of() answers "what was the
+stock and its value on date D" from the latest snapshot on or before D
+plus the daily movement rollup rows after it, so the ledger is never
+replayed and the whole query stays in the database, where it can be
+filtered, aggregated and paginated like any other Item queryset.
+Postings dated on or before a snapshot adjust it as they are posted (see
+inventory.services.post_movements).
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import (
+    DecimalField, ExpressionWrapper, F, IntegerField, Max, OuterRef, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from inventory.models import Item, ItemBalanceSnapshot, ItemDailyMovement
+
+SNAPSHOT_BATCH_SIZE = 1000
+
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD string; None if it is empty or invalid."""
+    try:
+        return datetime.date.fromisoformat((value or '').strip())
+    except ValueError:
+        return None
+
+
+def latest_snapshot_date(as_of):
+    return ItemBalanceSnapshot.objects.filter(date__lte=as_of).aggregate(date=Max('date'))['date']
+
+
+def annotate_as_of(items, as_of):
+    """
+    Annotate `items` with as_of_balance, as_of_price and as_of_value at the
+    end of `as_of`: the latest snapshot on or before it, plus the movements
+    after the snapshot up to and including `as_of`. Items without a
+    snapshot start from nothing in stock.
+    """
+    snapshot_date = latest_snapshot_date(as_of)
+    movements = ItemDailyMovement.objects.filter(item=OuterRef('pk'), date__lte=as_of)
+    if snapshot_date:
+        movements = movements.filter(date__gt=snapshot_date)
+        snapshot = ItemBalanceSnapshot.objects.filter(item=OuterRef('pk'), date=snapshot_date)
+        opening_balance = Subquery(snapshot.values('balance'))
+        opening_price = Subquery(snapshot.values('unit_price'))
+    else:
+        opening_balance = Value(0)
+        opening_price = Value(0, output_field=MONEY)
+
+    delta = movements.values('item').annotate(
+        delta=Sum(F('quantity_in') - F('quantity_out'), output_field=IntegerField())
+    ).values('delta')
+    closing_price = movements.order_by('-date').values('closing_price')[:1]
+
+    return items.annotate(
+        as_of_balance=ExpressionWrapper(
+            Coalesce(opening_balance, 0) + Coalesce(Subquery(delta), 0),
+            output_field=IntegerField()
+        ),
+        as_of_price=Coalesce(Subquery(closing_price), opening_price, Value(0), output_field=MONEY),
+    ).annotate(
+        as_of_value=ExpressionWrapper(F('as_of_balance') * F('as_of_price'), output_field=MONEY)
+    )
+
+
+@transaction.atomic
+def take_snapshots(date=None):
+    """
+    Store every item's balance and price at the end of `date` (default:
+    yesterday), replacing any snapshot already taken for that day. Only
+    closed days can be snapshotted, since later postings on the same day
+    would not be seen. Returns the number of snapshots written.
+    """
+    today = timezone.now().date()
+    date = date or today - datetime.timedelta(days=1)
+    if date >= today:
+        raise ValueError(f"Cannot snapshot {date}: only days before {today} are closed.")
+    ItemBalanceSnapshot.objects.filter(date=date).delete()
+
+    rows = annotate_as_of(Item.objects.order_by('id'), date).values_list(
+        'id', 'as_of_balance', 'as_of_price', 'as_of_value'
+    )
+    total = 0
+    batch = []
+    for item_id, balance, price, value in rows.iterator(chunk_size=SNAPSHOT_BATCH_SIZE):
+        batch.append(ItemBalanceSnapshot(item_id=item_id, date=date, balance=balance, unit_price=price, value=value))
+        if len(batch) == SNAPSHOT_BATCH_SIZE:
+            ItemBalanceSnapshot.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    ItemBalanceSnapshot.objects.bulk_create(batch)
+    return total + len(batch)
@@ -1,3 +1,933 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import threading
+import unittest
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.core.cache import caches
+from django.db import connection
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from inventory import archive, dashboard, numbering, partitions, reconcile, rollups, search, services, snapshots
+from inventory.pagination import keyset_page, InvalidCursor
+from inventory.models import (
+    Category, UnitOfMeasure, Item, ItemTransaction, ItemDailyMovement, ItemBalanceSnapshot,
+    ArchivedItemTransaction, LedgerArchive, DocumentSequence, DocumentIndex, Supplier
+)
+from store_requisition.models import StoreRequisition, StoreIssue
+from purchase_requisition.models import PurchaseRequisition
+from goods_receiving.models import GoodsReceivingNote
+from users.models import Department
+
+User = get_user_model()
+
+
+class StockPostingServiceTests(TestCase):
+    """Test cases for the stock posting service"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Test Category")
+        self.uom = UnitOfMeasure.objects.create(name="Each", abbreviation="EA")
+        self.item = Item.objects.create(
+            code="ITEM001",
+            description="Test Item",
+            category=self.category,
+            unit_of_measure=self.uom,
+            current_balance=10,
+            current_price=Decimal('2.00')
+        )
+
+    def test_receipt_updates_balance_price_and_ledger(self):
+        """Test that a receipt posts a ledger row and a weighted average price"""
+        services.post_movements(
+            [{'item_id': self.item.id, 'quantity_in': 5, 'unit_price': '3.00'}],
+            transaction_type='purchase',
+            reference_type='GRN',
+            reference_id=1
+        )
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_balance, 15)
+        self.assertEqual(self.item.current_price, Decimal('2.33'))
+
+        transaction = ItemTransaction.objects.get(item=self.item)
+        self.assertEqual(transaction.quantity_in, 5)
+        self.assertEqual(transaction.balance_after, 15)
+        self.assertEqual(transaction.total_price, Decimal('15.00'))
+
+    def test_repeated_item_in_one_document(self):
+        """Test that balance_after follows each line of the same document"""
+        services.post_movements(
+            [
+                {'item_id': self.item.id, 'quantity_out': 3, 'unit_price': '2.00'},
+                {'item_id': self.item.id, 'quantity_out': 4, 'unit_price': '2.00'},
+            ],
+            transaction_type='issue'
+        )
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_balance, 3)
+        self.assertEqual(
+            list(ItemTransaction.objects.order_by('id').values_list('balance_after', flat=True)),
+            [7, 3]
+        )
+
+    def test_issue_beyond_balance_is_rejected(self):
+        """Test that an issue larger than the balance rolls back entirely"""
+        with self.assertRaises(services.InsufficientStockError):
+            services.post_movements(
+                [{'item_id': self.item.id, 'quantity_out': 11, 'unit_price': '2.00'}],
+                transaction_type='issue'
+            )
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_balance, 10)
+        self.assertFalse(ItemTransaction.objects.exists())
+
+    def test_adjustment(self):
+        """Test negative and positive stock adjustments"""
+        services.post_adjustment(self.item, -4)
+        services.post_adjustment(self.item, 1)
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_balance, 7)
+        self.assertEqual(
+            ItemTransaction.objects.filter(transaction_type='adjustment').count(), 2
+        )
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class StockPostingConcurrencyTests(TransactionTestCase):
+    """Stress test concurrent postings against the same items"""
+
+    workers = 8
+    postings_per_worker = 25
+
+    def setUp(self):
+        self.items = [
+            Item.objects.create(code=f"ITEM{n:03d}", description=f"Item {n}", current_balance=1000)
+            for n in range(3)
+        ]
+
+    def _worker(self, errors):
+        try:
+            for n in range(self.postings_per_worker):
+                # Touch the items in a different order on each posting
+                ordered = self.items if n % 2 else list(reversed(self.items))
+                services.post_movements(
+                    [{'item_id': item.id, 'quantity_out': 1, 'unit_price': '1.00'} for item in ordered],
+                    transaction_type='issue'
+                )
+        except Exception as e:  # pragma: no cover - reported by the main thread
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_no_lost_updates(self):
+        """Test that concurrent issues neither lose updates nor corrupt the ledger"""
+        errors = []
+        threads = [threading.Thread(target=self._worker, args=(errors,)) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+        issued = self.workers * self.postings_per_worker
+        for item in self.items:
+            item.refresh_from_db()
+            self.assertEqual(item.current_balance, 1000 - issued)
+
+            balances = sorted(
+                ItemTransaction.objects.filter(item=item).values_list('balance_after', flat=True)
+            )
+            self.assertEqual(balances, list(range(1000 - issued, 1000)))
+
+
+class DocumentNumberingTests(TestCase):
+    """Test cases for the document number allocator"""
+
+    def setUp(self):
+        self.department = Department.objects.create(name="IT Department")
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.prefix = f"SR-{timezone.now().date().strftime('%Y%m')}-"
+        numbering.allocator.clear()
+
+    def _create_requisition(self):
+        return StoreRequisition.objects.create(
+            department=self.department,
+            requested_by=self.user,
+            requested_date=timezone.now().date()
+        )
+
+    def test_sequential_numbers(self):
+        """Test that numbers are consecutive within a month"""
+        first = self._create_requisition()
+        second = self._create_requisition()
+
+        self.assertEqual(first.requisition_no, f"{self.prefix}0001")
+        self.assertEqual(second.requisition_no, f"{self.prefix}0002")
+        self.assertEqual(DocumentSequence.objects.get(prefix=self.prefix).last_number, 2)
+
+    def test_counter_is_seeded_from_existing_numbers(self):
+        """Test that a new counter continues after numbers already issued"""
+        StoreRequisition.objects.create(
+            requisition_no=f"{self.prefix}0041",
+            department=self.department,
+            requested_by=self.user,
+            requested_date=timezone.now().date()
+        )
+
+        requisition = self._create_requisition()
+        self.assertEqual(requisition.requisition_no, f"{self.prefix}0042")
+
+    def test_block_allocation(self):
+        """Test that a block is reserved once and then served locally"""
+        allocator = numbering.NumberAllocator(block_size=10)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = allocator.next("TEST-")
+        second = allocator.next("TEST-")
+
+        self.assertEqual((first, second), (1, 2))
+        self.assertEqual(DocumentSequence.objects.get(prefix="TEST-").last_number, 10)
+        self.assertEqual(numbering.allocate("TEST-"), 11)
+
+
+class KeysetPaginationTests(TestCase):
+    """Test cases for keyset pagination over the ledger"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.item = Item.objects.create(code="ITEM001", description="Test Item", current_balance=100)
+        # Several rows per day so the created_at/id tie-breakers matter
+        for n in range(25):
+            services.post_adjustment(self.item, -1, date=timezone.now().date() - timezone.timedelta(days=n // 4))
+        self.expected = list(
+            ItemTransaction.objects.order_by('-date', '-created_at', '-id').values_list('id', flat=True)
+        )
+
+    def test_walk_forward_and_back(self):
+        """Test every row is seen once going forward and pages repeat going back"""
+        pages = [keyset_page(ItemTransaction.objects.all(), per_page=10)]
+        while pages[-1].has_next():
+            pages.append(keyset_page(ItemTransaction.objects.all(), pages[-1].next_cursor, per_page=10))
+
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([t.id for page in pages for t in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        previous = keyset_page(ItemTransaction.objects.all(), pages[2].previous_cursor, per_page=10)
+        self.assertEqual([t.id for t in previous], [t.id for t in pages[1]])
+        self.assertTrue(previous.has_next())
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        with self.assertRaises(InvalidCursor):
+            keyset_page(ItemTransaction.objects.all(), 'not-a-cursor')
+
+    def test_api_cursor_links(self):
+        """Test the ledger API returns cursor links and keeps page mode on request"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/item-transactions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+        self.assertEqual([row['id'] for row in response.data['results']], self.expected[:10])
+
+        response = client.get(response.data['next'])
+        self.assertEqual([row['id'] for row in response.data['results']], self.expected[10:20])
+
+        response = client.get('/api/item-transactions/', {'page': 2})
+        self.assertEqual(response.data['count'], 25)
+
+        response = client.get('/api/item-transactions/', {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CheckIndexesCommandTests(TestCase):
+    """Test cases for the check_indexes management command"""
+
+    def test_ledger_queries_use_indexes(self):
+        """Test that the ledger access paths are served by the declared indexes"""
+        out = StringIO()
+        call_command('check_indexes', stdout=out)
+        output = out.getvalue()
+
+        self.assertIn('OK       item ledger', output)
+        self.assertIn('OK       transaction report', output)
+        self.assertIn('OK       dashboard low stock', output)
+
+
+class InventoryAPIQueryTests(TestCase):
+    """Lock in the query budget of the inventory endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        category = Category.objects.create(name="Test Category")
+        uom = UnitOfMeasure.objects.create(name="Each", abbreviation="EA")
+        for n in range(5):
+            item = Item.objects.create(
+                code=f"ITEM{n:03d}",
+                description=f"Item {n}",
+                category=category,
+                unit_of_measure=uom,
+                current_balance=10
+            )
+            services.post_adjustment(item, -1, created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_item_list(self):
+        """Test listing items joins category and unit of measure"""
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/items/')
+        self.assertEqual(response.data['results'][0]['unit_of_measure_name'], "EA")
+
+    def test_item_update_leaves_balance_alone(self):
+        """Test that editing an item cannot write its balance or price"""
+        item = Item.objects.get(code="ITEM000")
+        response = self.client.patch(
+            f'/api/items/{item.pk}/',
+            {'description': "Renamed", 'current_balance': 100, 'current_price': '9.99'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        item.refresh_from_db()
+        self.assertEqual((item.description, item.current_balance, item.current_price), ("Renamed", 9, Decimal('0.00')))
+
+        # Only the submitted fields are written back
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(f'/api/items/{item.pk}/', {'min_stock_level': 3}, format='json')
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('current_balance', updates[0])
+
+    def test_adjust_posts_through_the_ledger(self):
+        """Test that opening stock and count corrections are posted as adjustments"""
+        item = Item.objects.create(code="NEW001", description="New Item")
+
+        response = self.client.post(f'/api/items/{item.pk}/adjust/', {'quantity': 12, 'unit_price': '3.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['current_balance'], response.data['current_price']), (12, '3.00'))
+
+        response = self.client.post(f'/api/items/{item.pk}/adjust/', {'quantity': -2}, format='json')
+        self.assertEqual(response.data['current_balance'], 10)
+        self.assertEqual(
+            list(ItemTransaction.objects.filter(item=item).order_by('id').values_list('transaction_type', 'balance_after')),
+            [('adjustment', 12), ('adjustment', 10)]
+        )
+
+        for data in [{'quantity': 0}, {'quantity': -11}, {'quantity': 1, 'unit_price': '-1.00'}]:
+            self.assertEqual(self.client.post(f'/api/items/{item.pk}/adjust/', data, format='json').status_code, 400, data)
+        self.assertEqual(Item.objects.get(pk=item.pk).current_balance, 10)
+
+    def test_transaction_list(self):
+        """Test listing ledger rows joins item and user"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/item-transactions/')
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_batch_availability(self):
+        """Test that many items are looked up in a single query"""
+        ids = list(Item.objects.order_by('id').values_list('id', flat=True))
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/items/availability/', {'ids': ','.join(map(str, ids + [0]))})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data], ids)
+        self.assertEqual(response.data[0]['unit_of_measure_name'], "EA")
+        self.assertEqual(response.data[0]['current_balance'], 9)
+        self.assertEqual(response.data[0]['available_quantity'], 9)
+
+    def test_batch_availability_rejects_bad_ids(self):
+        """Test that malformed or oversized id lists are rejected"""
+        response = self.client.get('/api/items/availability/', {'ids': '1,abc'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/api/items/availability/', {'ids': ','.join(str(n) for n in range(1, 202))})
+        self.assertEqual(response.status_code, 400)
+
+    def test_typeahead(self):
+        """Test that the typeahead matches code and description prefixes, codes first"""
+        Item.objects.create(code="PEN001", description="Ballpoint Pen", current_balance=5)
+        Item.objects.create(code="XYZ001", description="Pencil", current_balance=0)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/items/typeahead/', {'q': 'pen'})
+        self.assertEqual([row['code'] for row in response.data], ["PEN001", "XYZ001"])
+        self.assertEqual(response.data[0]['available_quantity'], 5)
+
+        response = self.client.get('/api/items/typeahead/', {'q': 'pen', 'in_stock': 1})
+        self.assertEqual([row['code'] for row in response.data], ["PEN001"])
+
+        response = self.client.get('/api/items/typeahead/', {'q': 'item', 'limit': 2})
+        self.assertEqual([row['code'] for row in response.data], ["ITEM000", "ITEM001"])
+
+        response = self.client.get('/api/items/typeahead/', {'q': ' '})
+        self.assertEqual(response.data, [])
+
+
+class ItemSearchTests(TestCase):
+    """Test cases for the item search backend"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.pen = Item.objects.create(code="PEN001", description="Blue Ballpoint Pen", current_balance=5)
+        self.pencil = Item.objects.create(code="PCL001", description="HB Pencil", current_balance=5)
+        Item.objects.create(code="PAP001", description="A4 Paper")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_every_word_must_match(self):
+        """Test that each search word must appear in the code or description"""
+        self.assertEqual(set(search.apply_search(Item.objects.all(), "pen")), {self.pen, self.pencil})
+        self.assertEqual(list(search.apply_search(Item.objects.all(), "blue pen")), [self.pen])
+        self.assertEqual(list(search.apply_search(Item.objects.all(), "pcl hb")), [self.pencil])
+        self.assertEqual(search.apply_search(Item.objects.all(), "  ").count(), 3)
+
+    def test_backend_setting(self):
+        """Test that SEARCH_BACKEND selects the backend"""
+        with self.settings(SEARCH_BACKEND='inventory.search.TrigramSearchBackend'):
+            self.assertIsInstance(search.get_backend(), search.TrigramSearchBackend)
+        self.assertIsInstance(search.get_backend(), search.SearchBackend)
+
+    def test_api_search(self):
+        """Test that the items and transactions endpoints search through the backend"""
+        response = self.client.get('/api/items/', {'search': 'ballpoint pen'})
+        self.assertEqual([row['code'] for row in response.data['results']], ["PEN001"])
+
+        services.post_adjustment(self.pencil, 1, created_by=self.user)
+        response = self.client.get('/api/item-transactions/', {'search': 'pencil'})
+        self.assertEqual([row['item_code'] for row in response.data['results']], ["PCL001"])
+
+
+class DocumentSearchTests(TestCase):
+    """Test cases for the global document search index"""
+
+    def setUp(self):
+        self.department = Department.objects.create(name="IT Department")
+        self.user = User.objects.create_user(username="manager", password="password123", department=self.department)
+        self.supplier = Supplier.objects.create(name="Acme Supplies")
+        self.sr = StoreRequisition.objects.create(
+            department=self.department,
+            requested_by=self.user,
+            requested_date=timezone.now().date()
+        )
+        self.siv = StoreIssue.objects.create(
+            sr=self.sr,
+            date=timezone.now().date(),
+            prepared_by=self.user,
+            received_by="Jane Doe"
+        )
+        self.pr = PurchaseRequisition.objects.create(requested_by=self.user, date=timezone.now().date())
+        self.grn = GoodsReceivingNote.objects.create(
+            supplier=self.supplier,
+            date=timezone.now().date(),
+            received_by=self.user
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_documents_are_indexed_on_save(self):
+        """Test that saving a document creates and refreshes its index row"""
+        self.assertEqual(DocumentIndex.objects.count(), 4)
+        self.sr.refresh_from_db()
+        entry = DocumentIndex.objects.get(document_type='SR', document_id=self.sr.id)
+        self.assertEqual((entry.number, entry.department, entry.status), (self.sr.requisition_no, "IT Department", self.sr.status))
+
+        self.sr.status = 'approved'
+        self.sr.save()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'approved')
+
+        self.assertEqual(DocumentIndex.objects.get(document_type='SIV').department, "IT Department")
+        self.assertEqual(DocumentIndex.objects.get(document_type='PR').department, "IT Department")
+        self.assertEqual(DocumentIndex.objects.get(document_type='GRN').supplier, "Acme Supplies")
+
+    def test_renames_and_deletes(self):
+        """Test that renamed departments and suppliers and deleted documents are reflected"""
+        self.department.name = "Information Technology"
+        self.department.save()
+        self.supplier.name = "Acme Ltd"
+        self.supplier.save()
+        self.assertEqual(
+            set(DocumentIndex.objects.exclude(department='').values_list('department', flat=True)),
+            {"Information Technology"}
+        )
+        self.assertEqual(DocumentIndex.objects.get(document_type='GRN').supplier, "Acme Ltd")
+
+        self.grn.delete()
+        self.assertFalse(DocumentIndex.objects.filter(document_type='GRN').exists())
+
+    def test_search_ranks_number_matches_first(self):
+        """Test that one query finds documents of every type, exact numbers first"""
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/documents/', {'q': self.grn.grn_no})
+        self.assertEqual(response.data['results'][0]['number'], self.grn.grn_no)
+
+        response = self.client.get('/api/documents/', {'q': 'it department'})
+        self.assertEqual({row['document_type'] for row in response.data['results']}, {'SR', 'SIV', 'PR'})
+
+        response = self.client.get('/api/documents/', {'q': 'acme', 'type': 'SR'})
+        self.assertEqual(response.data['count'], 0)
+
+        response = self.client.get('/api/documents/', {'q': 'acme', 'type': 'XX'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command restores a cleared index"""
+        DocumentIndex.objects.all().delete()
+        DocumentIndex.objects.create(document_type='SR', document_id=999, number="SR-STALE")
+        out = StringIO()
+        call_command('rebuild_document_index', stdout=out)
+
+        self.assertIn('Indexed 4 documents', out.getvalue())
+        self.assertFalse(DocumentIndex.objects.filter(document_id=999).exists())
+
+
+class DailyMovementRollupTests(TestCase):
+    """Test cases for the per-item daily movement rollup"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.item = Item.objects.create(code="PEN001", description="Ballpoint Pen", current_price=Decimal('2.00'))
+        self.day = timezone.now().date()
+
+    def _rollup(self):
+        return list(ItemDailyMovement.objects.order_by('date').values(
+            'date', 'quantity_in', 'quantity_out', 'value_in', 'value_out',
+            'closing_balance', 'closing_price', 'transaction_count'
+        ))
+
+    def test_postings_accumulate_per_day(self):
+        """Test that postings on the same day add to one rollup row"""
+        services.post_adjustment(self.item, 10, date=self.day, created_by=self.user)
+        services.post_movements(
+            [
+                {'item_id': self.item.id, 'quantity_out': 3, 'unit_price': '2.00'},
+                {'item_id': self.item.id, 'quantity_out': 2, 'unit_price': '2.00'},
+            ],
+            transaction_type='issue',
+            date=self.day
+        )
+
+        self.assertEqual(self._rollup(), [{
+            'date': self.day,
+            'quantity_in': 10,
+            'quantity_out': 5,
+            'value_in': Decimal('20.00'),
+            'value_out': Decimal('10.00'),
+            'closing_balance': 5,
+            'closing_price': Decimal('2.00'),
+            'transaction_count': 3,
+        }])
+
+    def test_rebuild_matches_incremental(self):
+        """Test that the rebuild command reproduces the incrementally kept rollup"""
+        yesterday = self.day - timezone.timedelta(days=1)
+        services.post_adjustment(self.item, 10, date=yesterday, created_by=self.user)
+        services.post_adjustment(self.item, -4, date=self.day, created_by=self.user)
+        services.post_adjustment(self.item, 1, unit_price=Decimal('8.00'), date=self.day, created_by=self.user)
+        incremental = self._rollup()
+
+        ItemDailyMovement.objects.filter(date=self.day).update(quantity_in=99, closing_price=0)
+        out = StringIO()
+        call_command('rebuild_daily_movements', '--since', self.day.isoformat(), stdout=out)
+
+        self.assertIn('Wrote 1 daily movement rows', out.getvalue())
+        self.assertEqual(self._rollup(), incremental)
+        self.assertEqual(incremental[-1]['closing_balance'], 7)
+        self.assertEqual(incremental[-1]['closing_price'], Decimal('2.86'))
+
+
+class BalanceSnapshotTests(TestCase):
+    """Test cases for point-in-time balances from snapshots and the rollup"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.item = Item.objects.create(code="PEN001", description="Ballpoint Pen")
+        self.days = [timezone.datetime(2025, 3, day).date() for day in (1, 15, 31)]
+        self._receive(10, '2.00', self.days[0])
+        self._receive(10, '4.00', self.days[1])
+        services.post_adjustment(self.item, -5, date=self.days[2], created_by=self.user)
+        self._receive(5, '9.00', timezone.datetime(2025, 4, 10).date())
+
+    def _receive(self, quantity, unit_price, day):
+        services.post_movements(
+            [{'item_id': self.item.id, 'quantity_in': quantity, 'unit_price': unit_price}],
+            transaction_type='purchase',
+            date=day,
+            created_by=self.user
+        )
+
+    def _as_of(self, day):
+        return snapshots.annotate_as_of(Item.objects.all(), day).values_list(
+            'as_of_balance', 'as_of_price', 'as_of_value'
+        ).get()
+
+    def test_as_of_without_snapshots(self):
+        """Test that balances are summed from the rollup when there is no snapshot"""
+        self.assertEqual(self._as_of(self.days[0] - timezone.timedelta(days=1)), (0, Decimal('0'), Decimal('0')))
+        self.assertEqual(self._as_of(self.days[0]), (10, Decimal('2.00'), Decimal('20.00')))
+        self.assertEqual(self._as_of(self.days[2]), (15, Decimal('3.00'), Decimal('45.00')))
+
+    def test_as_of_starts_from_latest_snapshot(self):
+        """Test that only the movements after the latest snapshot are read"""
+        out = StringIO()
+        call_command('take_balance_snapshots', '--date', self.days[1].isoformat(), stdout=out)
+        self.assertIn('Wrote 1 balance snapshots', out.getvalue())
+        snapshot = ItemBalanceSnapshot.objects.get()
+        self.assertEqual((snapshot.balance, snapshot.unit_price, snapshot.value), (20, Decimal('3.00'), Decimal('60.00')))
+
+        # The rollup up to the snapshot is no longer needed
+        ItemDailyMovement.objects.filter(date__lte=self.days[1]).delete()
+        self.assertEqual(self._as_of(self.days[1]), (20, Decimal('3.00'), Decimal('60.00')))
+        self.assertEqual(self._as_of(self.days[2]), (15, Decimal('3.00'), Decimal('45.00')))
+
+    def test_backdated_postings_adjust_snapshots(self):
+        """Test that a posting dated before a snapshot is folded into it"""
+        snapshots.take_snapshots(self.days[1])
+        ItemDailyMovement.objects.filter(date__lte=self.days[1]).delete()
+
+        self._receive(10, '3.00', self.days[0])
+
+        snapshot = ItemBalanceSnapshot.objects.get()
+        self.assertEqual((snapshot.balance, snapshot.unit_price, snapshot.value), (30, Decimal('3.00'), Decimal('90.00')))
+        self.assertEqual(self._as_of(self.days[1]), (30, Decimal('3.00'), Decimal('90.00')))
+        self.assertEqual(self._as_of(self.days[2])[0], 25)
+
+        # A snapshot cannot go below zero either
+        with self.assertRaises(services.InsufficientStockError):
+            services.post_adjustment(self.item, -31, date=self.days[0], created_by=self.user)
+        self.assertEqual(ItemBalanceSnapshot.objects.get().balance, 30)
+        self.assertEqual(Item.objects.get(pk=self.item.pk).current_balance, 30)
+
+    def test_open_days_are_not_snapshotted(self):
+        """Test that today cannot be snapshotted before it is over"""
+        with self.assertRaises(CommandError):
+            call_command('take_balance_snapshots', '--date', timezone.now().date().isoformat(), stdout=StringIO())
+
+    def test_as_of_api(self):
+        """Test the as-of endpoint returns stock and value at the end of the day"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/items/as-of/', {'date': self.days[2].isoformat()})
+
+        self.assertEqual(response.status_code, 200)
+        row = response.data['results'][0]
+        self.assertEqual((row['code'], row['balance'], row['unit_price'], row['value']), ("PEN001", 15, '3.00', '45.00'))
+        self.assertEqual(client.get('/api/items/as-of/', {'date': 'March'}).status_code, 400)
+
+
+class LedgerPartitionTests(TestCase):
+    """Test cases for the monthly partitioning of the ledger"""
+
+    def test_month_helpers(self):
+        """Test month arithmetic and partition naming"""
+        self.assertEqual(partitions.add_months(date(2025, 11, 17), 3), date(2026, 2, 1))
+        self.assertEqual(partitions.parse_month('2025-03'), date(2025, 3, 1))
+        self.assertEqual(partitions.partition_name(date(2025, 3, 1)), 'inventory_itemtransaction_p2025_03')
+        with self.assertRaises(partitions.PartitioningError):
+            partitions.parse_month('March')
+
+    @unittest.skipIf(connection.vendor == 'postgresql', 'Partitioning is supported on PostgreSQL')
+    def test_needs_postgresql(self):
+        """Test that the command refuses to run on other databases"""
+        self.assertFalse(partitions.is_partitioned())
+        with self.assertRaises(CommandError):
+            call_command('ledger_partitions', 'convert', stdout=StringIO())
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL')
+    def test_convert_keeps_the_orm_working(self):
+        """Test that the converted ledger keeps its rows, ids and postings"""
+        user = User.objects.create_user(username="testuser", password="password123")
+        item = Item.objects.create(code="PEN001", description="Ballpoint Pen", current_price=Decimal('2.00'))
+        services.post_adjustment(item, 10, date=date(2024, 12, 5), created_by=user)
+        old = services.post_adjustment(item, -3, date=date(2025, 1, 5), created_by=user)[0]
+
+        created = partitions.convert_ledger(months_ahead=1, today=date(2025, 1, 20))
+
+        self.assertTrue(partitions.is_partitioned())
+        self.assertEqual(created, [partitions.partition_name(date(2024, 12, 1)),
+                                   partitions.partition_name(date(2025, 1, 1)),
+                                   partitions.partition_name(date(2025, 2, 1))])
+        self.assertEqual(ItemTransaction.objects.get(pk=old.pk).balance_after, 7)
+        new = services.post_adjustment(item, 1, date=date(2025, 2, 1), created_by=user)[0]
+        self.assertGreater(new.pk, old.pk)
+
+        self.assertEqual(partitions.detach_partitions(date(2025, 1, 1)), [partitions.partition_name(date(2024, 12, 1))])
+        self.assertEqual(ItemTransaction.objects.count(), 2)
+        partitions.attach_partition(date(2024, 12, 1))
+        self.assertEqual(ItemTransaction.objects.count(), 3)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL')
+    def test_rows_in_default_move_to_new_partition(self):
+        """Test that creating a month's partition moves its rows out of DEFAULT"""
+        user = User.objects.create_user(username="testuser", password="password123")
+        item = Item.objects.create(code="PEN001", description="Ballpoint Pen", current_price=Decimal('2.00'))
+        services.post_adjustment(item, 10, date=date(2025, 1, 5), created_by=user)
+        partitions.convert_ledger(months_ahead=0, today=date(2025, 1, 20))
+
+        # No partition for April yet: the row lands in DEFAULT
+        services.post_adjustment(item, -3, date=date(2025, 4, 2), created_by=user)
+
+        self.assertEqual(partitions.create_partitions(date(2025, 4, 1), date(2025, 4, 1)),
+                         [partitions.partition_name(date(2025, 4, 1))])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {partitions.default_partition_name()}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute(f'SELECT COUNT(*) FROM {partitions.partition_name(date(2025, 4, 1))}')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertIn(partitions.default_partition_name(), [name for name, _ in partitions.list_partitions()])
+        self.assertEqual(ItemTransaction.objects.count(), 2)
+
+
+class LedgerArchiveTests(TestCase):
+    """Test cases for ledger archival and opening-balance compaction"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.pen = Item.objects.create(code="PEN001", description="Ballpoint Pen")
+        self.clip = Item.objects.create(code="CLP001", description="Paper Clip", current_price=Decimal('0.10'))
+        self._post(self.pen, 10, '2.00', date(2024, 1, 10))
+        self._post(self.pen, -4, '2.00', date(2024, 2, 10))
+        self._post(self.clip, 3, '0.10', date(2024, 2, 11))
+        self._post(self.clip, -3, '0.10', date(2024, 6, 1))
+        self._post(self.pen, 5, '4.00', date(2025, 3, 5))
+        self.cutoff = date(2025, 1, 1)
+
+    def _post(self, item, quantity, unit_price, day):
+        services.post_adjustment(item, quantity, unit_price=Decimal(unit_price), date=day, created_by=self.user)
+
+    def test_archive_keeps_balance_continuity(self):
+        """Test that archived rows are replaced by an opening row the kept rows follow on from"""
+        archived_ids = set(ItemTransaction.objects.filter(date__lt=self.cutoff).values_list('id', flat=True))
+
+        result = archive.archive_ledger(self.cutoff, created_by=self.user)
+
+        self.assertEqual((result.row_count, result.item_count), (4, 2))
+        self.assertEqual(set(ArchivedItemTransaction.objects.values_list('id', flat=True)), archived_ids)
+        opening, receipt = ItemTransaction.objects.filter(item=self.pen).order_by('date')
+        self.assertEqual(
+            (opening.transaction_type, opening.date, opening.balance_after, opening.unit_price, opening.total_price),
+            ('opening', date(2024, 12, 31), 6, Decimal('2.00'), Decimal('12.00'))
+        )
+        self.assertEqual(receipt.balance_after - receipt.quantity_in + receipt.quantity_out, opening.balance_after)
+        # Nothing left in stock, so no opening row
+        self.assertFalse(ItemTransaction.objects.filter(item=self.clip).exists())
+        # The opening row starts the chain although the kept row is older
+        self.assertLess(receipt.id, opening.id)
+        self.assertFalse(reconcile.chain_breaks(self.pen.id, self.clip.id).exists())
+        self.assertFalse(reconcile.balance_drift(self.pen.id, self.clip.id).exists())
+
+        with self.assertRaises(archive.ArchiveError):
+            archive.archive_ledger(self.cutoff)
+
+    def test_opening_row_continues_a_nonzero_start(self):
+        """Test that the opening balance is the last archived balance, not the sum of the archived rows"""
+        stapler = Item.objects.create(code="STP001", description="Stapler", current_balance=10, current_price=Decimal('5.00'))
+        self._post(stapler, 5, '5.00', date(2024, 3, 1))
+
+        archive.archive_ledger(self.cutoff, created_by=self.user)
+        self._post(stapler, 1, '5.00', date(2025, 3, 1))
+
+        opening, receipt = ItemTransaction.objects.filter(item=stapler).order_by('date')
+        self.assertEqual((opening.quantity_in, opening.balance_after), (15, 15))
+        self.assertEqual(receipt.balance_after, 16)
+        self.assertFalse(reconcile.chain_breaks(stapler.id, stapler.id).exists())
+
+    def test_backdated_archived_row(self):
+        """Test that the opening balance includes an archived row posted after a kept one"""
+        self._post(self.pen, 2, '2.00', date(2024, 1, 5))
+        self.assertEqual(Item.objects.get(pk=self.pen.pk).current_balance, 13)
+
+        archive.archive_ledger(self.cutoff, created_by=self.user)
+
+        opening = ItemTransaction.objects.get(item=self.pen, transaction_type='opening')
+        self.assertEqual(opening.balance_after, 8)
+        self.assertFalse(reconcile.balance_drift(self.pen.id, self.pen.id).exists())
+        # The kept row's balance_after predates the back-dated row; repair
+        # re-chains it without moving the balance
+        self.assertTrue(reconcile.repair_item(self.pen.id))
+        self.assertFalse(reconcile.chain_breaks(self.pen.id, self.pen.id).exists())
+        self.assertEqual(Item.objects.get(pk=self.pen.pk).current_balance, 13)
+
+    def test_rebuild_keeps_archived_days(self):
+        """Test that a rollup rebuild leaves the archived days alone"""
+        before = list(ItemDailyMovement.objects.order_by('item_id', 'date').values_list('item_id', 'date', 'closing_balance'))
+        archive.archive_ledger(self.cutoff)
+
+        rollups.rebuild_movements()
+
+        after = list(ItemDailyMovement.objects.order_by('item_id', 'date').values_list('item_id', 'date', 'closing_balance'))
+        self.assertEqual(after, before)
+
+    def test_archive_to_file(self):
+        """Test archiving to gzipped NDJSON with the command"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ledger-2024.ndjson.gz')
+            out = StringIO()
+            call_command('archive_ledger', '--before', self.cutoff.isoformat(), '--file', path, stdout=out)
+
+            with gzip.open(path, 'rt') as f:
+                rows = [json.loads(line) for line in f]
+            with self.assertRaises(CommandError):
+                call_command('archive_ledger', '--before', '2025-02-01', '--file', path, stdout=StringIO())
+
+        self.assertIn('Archived 4 ledger rows', out.getvalue())
+        self.assertEqual([row['date'] for row in rows], ['2024-01-10', '2024-02-10', '2024-02-11', '2024-06-01'])
+        self.assertEqual(ArchivedItemTransaction.objects.count(), 0)
+        self.assertEqual(LedgerArchive.objects.get().location, path)
+
+
+class LedgerReconciliationTests(TestCase):
+    """Test cases for the ledger reconciliation command"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.pen = Item.objects.create(code="PEN001", description="Ballpoint Pen", current_price=Decimal('2.00'))
+        self.clip = Item.objects.create(code="CLP001", description="Paper Clip", current_price=Decimal('0.10'))
+        for quantity in (10, -4, 3):
+            services.post_adjustment(self.pen, quantity, created_by=self.user)
+            services.post_adjustment(self.clip, quantity * 2, created_by=self.user)
+
+    def _reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_ledger', '--workers', '1', '--range-size', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_consistent_ledger(self):
+        """Test that a ledger written by the posting service has no discrepancies"""
+        self.assertIn('0 broken ledger rows, 0 items off their ledger total', self._reconcile('--fail'))
+
+    def test_reports_and_repairs_discrepancies(self):
+        """Test broken balance_after chains and drifted balances are found and repaired"""
+        middle = ItemTransaction.objects.filter(item=self.pen).order_by('id')[1]
+        ItemTransaction.objects.filter(pk=middle.pk).update(balance_after=8)
+        Item.objects.filter(pk=self.clip.pk).update(current_balance=99)
+
+        output = self._reconcile()
+        # The changed row and the one after it no longer follow on
+        self.assertIn('2 broken ledger rows, 1 items off their ledger total', output)
+        self.assertIn(f'CHAIN    item {self.pen.id} transaction {middle.id}: previous balance 10, row starts from 12', output)
+        self.assertIn(f'BALANCE  item {self.clip.id} CLP001: current balance 99, ledger total 18', output)
+        with self.assertRaises(CommandError):
+            self._reconcile('--fail')
+
+        self.assertIn('Repaired 2 items', self._reconcile('--repair'))
+
+        self.assertEqual(ItemTransaction.objects.get(pk=middle.pk).balance_after, 6)
+        self.assertEqual(Item.objects.get(pk=self.clip.pk).current_balance, 18)
+        self.assertIn('0 broken ledger rows, 0 items off their ledger total', self._reconcile('--fail'))
+
+    def test_ledger_starting_from_a_balance(self):
+        """Test that items created with a balance are neither reported nor repaired to the bare ledger sum"""
+        stapler = Item.objects.create(code="STP001", description="Stapler", current_balance=20, current_price=Decimal('5.00'))
+        services.post_adjustment(stapler, 5, created_by=self.user)
+        # No ledger rows, nothing to check against
+        tape = Item.objects.create(code="TAP001", description="Tape", current_balance=7)
+
+        self.assertIn('0 broken ledger rows, 0 items off their ledger total', self._reconcile('--repair'))
+        self.assertEqual(Item.objects.get(pk=stapler.pk).current_balance, 25)
+        self.assertEqual(Item.objects.get(pk=tape.pk).current_balance, 7)
+
+        # Drift is measured from where the ledger starts, and repaired to where it ends
+        Item.objects.filter(pk=stapler.pk).update(current_balance=5)
+        self.assertIn(f'BALANCE  item {stapler.id} STP001: current balance 5, ledger total 25', self._reconcile())
+        self.assertIn('Repaired 1 items', self._reconcile('--repair'))
+        self.assertEqual(Item.objects.get(pk=stapler.pk).current_balance, 25)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardCacheTests(TestCase):
+    """Test cases for the cached dashboard statistics"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.department = Department.objects.create(name="Stores")
+        self.user = User.objects.create_user(username="keeper", password="password123", role='store_keeper')
+        self.controller = User.objects.create_user(username="controller", password="password123", role='controller')
+        self.item = Item.objects.create(code="PEN001", description="Ballpoint Pen", min_stock_level=5)
+        for status in ['pending', 'approved', 'approved']:
+            StoreRequisition.objects.create(
+                department=self.department,
+                requested_by=self.user,
+                requested_date=timezone.now().date(),
+                status=status
+            )
+
+    def test_stats_are_cached(self):
+        """Test that a second load of the dashboard does not query"""
+        stats = dashboard.dashboard_stats(self.user)
+        self.assertEqual(stats['low_stock_count'], 1)
+
+        with self.assertNumQueries(0):
+            dashboard.dashboard_stats(self.user)
+
+    def test_pending_count_per_role(self):
+        """Test that each role counts the requisitions on its pending requisitions page"""
+        manager = User.objects.create_user(username="manager", password="password123", role='manager')
+        staff = User.objects.create_user(username="staff", password="password123", role='staff')
+        for status in ['checked', 'partially_issued', 'issued', 'closed']:
+            StoreRequisition.objects.create(
+                department=self.department,
+                requested_by=staff,
+                requested_date=timezone.now().date(),
+                status=status
+            )
+
+        for user, expected in [(self.user, 3), (self.controller, 1), (manager, 2), (staff, 2)]:
+            stats = dashboard.dashboard_stats(user)
+            self.assertEqual(stats['pending_requisitions'], expected, user.username)
+            self.assertEqual(stats['pending_requisitions'], StoreRequisition.pending_for(user).count())
+
+        # Staff count only their own requisitions, so each has their own entry
+        other = User.objects.create_user(username="other", password="password123", role='staff')
+        self.assertEqual(dashboard.dashboard_stats(other)['pending_requisitions'], 0)
+
+    def test_requester_entry_is_invalidated(self):
+        """Test that a staff member's own count drops when their requisition changes"""
+        staff = User.objects.create_user(username="staff", password="password123", role='staff')
+        requisition = StoreRequisition.objects.create(
+            department=self.department,
+            requested_by=staff,
+            requested_date=timezone.now().date()
+        )
+        self.assertEqual(dashboard.dashboard_stats(staff)['pending_requisitions'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            requisition.status = 'rejected'
+            requisition.save()
+        self.assertEqual(dashboard.dashboard_stats(staff)['pending_requisitions'], 0)
+
+    def test_posting_invalidates_stock_stats(self):
+        """Test that stock posting and requisition changes drop the cached figures once committed"""
+        dashboard.dashboard_stats(self.user)
+        dashboard.dashboard_stats(self.controller)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.post_adjustment(self.item, 10, unit_price=Decimal('2.00'), created_by=self.user)
+        stats = dashboard.dashboard_stats(self.user)
+        self.assertEqual((stats['low_stock_count'], stats['inventory_value']), (0, Decimal('20.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StoreRequisition.objects.filter(status='pending').get().delete()
+        self.assertEqual(dashboard.dashboard_stats(self.controller)['pending_requisitions'], 0)
+        self.assertEqual(dashboard.dashboard_stats(self.user)['pending_requisitions'], 2)
 
-# Create your tests here.
@@ -1,12 +1,19 @@
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, mixins, permissions, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
-from inventory.models import Category, UnitOfMeasure, Item, ItemTransaction, Supplier
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from inventory.models import Category, UnitOfMeasure, Item, ItemTransaction, Supplier, DocumentIndex
+from store_requisition.models import SRItem
 from inventory.serializers import (
     CategorySerializer, UnitOfMeasureSerializer, ItemSerializer,
-    ItemTransactionSerializer, SupplierSerializer
+    ItemAvailabilitySerializer, ItemBalanceAsOfSerializer, ItemTransactionSerializer,
+    StockAdjustmentSerializer, SupplierSerializer, DocumentIndexSerializer
 )
+from inventory.pagination import LedgerCursorPagination
+from inventory import documents, search, services, snapshots
 
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
@@ -25,34 +32,124 @@ class UnitOfMeasureViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at']
 
 class ItemViewSet(viewsets.ModelViewSet):
-    queryset = Item.objects.all()
+    queryset = Item.objects.select_related('category', 'unit_of_measure')
     serializer_class = ItemSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, search.BackendSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'unit_of_measure']
     search_fields = ['code', 'description']
+    search_rank = True
     ordering_fields = ['code', 'description', 'current_price', 'current_balance', 'created_at']
+    availability_max_ids = 200
     
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
         """Return items with stock levels below minimum"""
-        low_stock_items = Item.objects.filter(current_balance__lte=models.F('min_stock_level'))
+        low_stock_items = self.get_queryset().filter(current_balance__lte=F('min_stock_level'))
         serializer = self.get_serializer(low_stock_items, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """Return UoM, price and stock for many items at once: ?ids=1,2,3"""
+        try:
+            ids = {int(item_id) for item_id in request.query_params.get('ids', '').split(',') if item_id.strip()}
+        except ValueError:
+            raise ValidationError({'ids': 'Expected a comma-separated list of item ids.'})
+        if len(ids) > self.availability_max_ids:
+            raise ValidationError({'ids': f'At most {self.availability_max_ids} ids per request.'})
+        
+        rows = self._availability_values(Item.objects.filter(id__in=ids)).order_by('id')
+        serializer = ItemAvailabilitySerializer(rows, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def typeahead(self, request):
+        """Return the items whose code or description starts with ?q="""
+        items = Item.objects.all()
+        if request.query_params.get('in_stock'):
+            items = items.alias(
+                promisable=F('current_balance') - F('reserved_qty')
+            ).filter(promisable__gt=0)
+        
+        limit = search.clamp_limit(request.query_params.get('limit'))
+        rows = search.typeahead(self._availability_values(items), request.query_params.get('q'), limit)
+        serializer = ItemAvailabilitySerializer(rows, many=True)
+        return Response(serializer.data)
+    
+    def _availability_values(self, items):
+        """
+        available_quantity is available to promise: on hand minus reserved.
+        With ?sr=, what that requisition holds reserved counts as available,
+        since issuing against it consumes its own reservation.
+        """
+        available = F('current_balance') - F('reserved_qty')
+        sr_id = self.request.query_params.get('sr')
+        if sr_id:
+            try:
+                sr_id = int(sr_id)
+            except ValueError:
+                raise ValidationError({'sr': 'Expected a store requisition id.'})
+            reserved = SRItem.objects.filter(sr_id=sr_id, item=OuterRef('pk')).values('reserved_qty')
+            available = available + Coalesce(Subquery(reserved), 0)
+        return items.values(
+            'id', 'code', 'description', 'current_price', 'current_balance', 'min_stock_level',
+            unit_of_measure_name=F('unit_of_measure__abbreviation'),
+            available_quantity=available
+        )
+    
+    @action(detail=False, methods=['get'], url_path='as-of')
+    def as_of(self, request):
+        """Return stock and value at the end of ?date=YYYY-MM-DD, with the list filters"""
+        as_of = snapshots.parse_date(request.query_params.get('date'))
+        if as_of is None:
+            raise ValidationError({'date': 'Expected a date as YYYY-MM-DD.'})
+        
+        items = self.filter_queryset(Item.objects.all())
+        if not items.query.order_by:
+            items = items.order_by('code')
+        rows = snapshots.annotate_as_of(items, as_of).values(
+            'id', 'code', 'description',
+            unit_of_measure_name=F('unit_of_measure__abbreviation'),
+            balance=F('as_of_balance'),
+            unit_price=F('as_of_price'),
+            value=F('as_of_value')
+        )
+        page = self.paginate_queryset(rows)
+        serializer = ItemBalanceAsOfSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=True, methods=['post'])
+    def adjust(self, request, pk=None):
+        """Post opening stock or a count correction: {"quantity": 5, "unit_price": "2.00"}"""
+        item = self.get_object()
+        serializer = StockAdjustmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            services.post_adjustment(item, created_by=request.user, **serializer.validated_data)
+        except services.InsufficientStockError as e:
+            raise ValidationError({'quantity': str(e)})
+        
+        item.refresh_from_db()
+        return Response(self.get_serializer(item).data)
+    
     @action(detail=True, methods=['get'])
     def transactions(self, request, pk=None):
         """Return transaction history for an item"""
         item = self.get_object()
-        transactions = ItemTransaction.objects.filter(item=item).order_by('-date', '-created_at')
-        serializer = ItemTransactionSerializer(transactions, many=True)
-        return Response(serializer.data)
+        transactions = ItemTransaction.objects.filter(item=item).select_related('item', 'created_by')
+        paginator = LedgerCursorPagination()
+        page = paginator.paginate_queryset(transactions, request, view=self)
+        serializer = ItemTransactionSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 class ItemTransactionViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = ItemTransaction.objects.all().order_by('-date', '-created_at')
+    queryset = ItemTransaction.objects.select_related('item', 'created_by').order_by('-date', '-created_at', '-id')
     serializer_class = ItemTransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = LedgerCursorPagination
+    filter_backends = [DjangoFilterBackend, search.BackendSearchFilter, filters.OrderingFilter]
     filterset_fields = ['item', 'transaction_type', 'date']
     search_fields = ['item__code', 'item__description']
     ordering_fields = ['date', 'created_at', 'quantity_in', 'quantity_out', 'balance_after']
@@ -64,3 +161,15 @@ class SupplierViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'contact_person', 'email', 'phone']
     ordering_fields = ['name', 'created_at']
+
+class DocumentSearchViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """Search SR, SIV, PR and GRN documents together: ?q=&type="""
+    queryset = DocumentIndex.objects.all()
+    serializer_class = DocumentIndexSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        document_type = self.request.query_params.get('type')
+        if document_type and document_type not in dict(DocumentIndex.DOCUMENT_TYPES):
+            raise ValidationError({'type': f'Expected one of {", ".join(dict(DocumentIndex.DOCUMENT_TYPES))}.'})
+        return documents.search_documents(self.request.query_params.get('q'), document_type)
@@ -2,48 +2,19 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Sum, F, Q
+from django.db.models import F
 from django.core.paginator import Paginator
 
-from inventory.models import Item, Category, ItemTransaction
-from store_requisition.models import StoreRequisition
-from goods_receiving.models import GoodsReceivingNote
+from inventory.models import Item, Category, ItemTransaction, DocumentIndex
+from inventory.pagination import keyset_page_or_first
+from inventory.search import apply_search
+from inventory.documents import search_documents
+from inventory.dashboard import dashboard_stats
 
 @login_required
 def dashboard(request):
-    # Get counts and summary data
-    total_items = Item.objects.count()
-    low_stock_items = Item.objects.filter(current_balance__lte=F('min_stock_level'))
-    low_stock_count = low_stock_items.count()
-    
-    # Calculate inventory value
-    inventory_value = Item.objects.aggregate(
-        total_value=Sum(F('current_balance') * F('current_price'))
-    )['total_value'] or 0
-    
-    # Get pending requisitions
-    pending_requisitions = StoreRequisition.objects.filter(
-        Q(status='pending') | Q(status='checked')
-    ).count()
-    
-    # Get recent requisitions
-    recent_requisitions = StoreRequisition.objects.order_by('-created_at')[:5]
-    
-    # Get recent goods receiving notes
-    recent_grns = GoodsReceivingNote.objects.order_by('-created_at')[:5]
-    
-    # Get top 5 low stock items for display
-    low_stock_display = low_stock_items.order_by('current_balance')[:5]
-    
-    context = {
-        'total_items': total_items,
-        'low_stock_count': low_stock_count,
-        'pending_requisitions': pending_requisitions,
-        'inventory_value': inventory_value,
-        'recent_requisitions': recent_requisitions,
-        'recent_grns': recent_grns,
-        'low_stock_items': low_stock_display,
-    }
+    # Counts, value and recent documents, cached per role (see inventory.dashboard)
+    context = dashboard_stats(request.user)
     
     return render(request, 'dashboard.html', context)
 
@@ -65,10 +36,7 @@ def item_list(request):
         items = items.filter(current_balance__lte=F('min_stock_level'))
     
     if search:
-        items = items.filter(
-            Q(code__icontains=search) | 
-            Q(description__icontains=search)
-        )
+        items = apply_search(items, search)
     
     # Order by code
     items = items.order_by('code')
@@ -92,8 +60,12 @@ def item_list(request):
 def item_detail(request, pk):
     item = get_object_or_404(Item, pk=pk)
     
-    # Get transaction history
-    transactions = ItemTransaction.objects.filter(item=item).order_by('-date', '-created_at')
+    # Get transaction history, one keyset page at a time
+    transactions = keyset_page_or_first(
+        ItemTransaction.objects.filter(item=item).select_related('created_by'),
+        request.GET.get('cursor'),
+        per_page=20
+    )
     
     context = {
         'item': item,
@@ -140,3 +112,27 @@ def item_edit(request, pk):
     }
     
     return render(request, 'inventory/item_form.html', context)
+
+@login_required
+def document_search(request):
+    # Get filter parameters
+    query = request.GET.get('q', '')
+    document_type = request.GET.get('type')
+    if document_type not in dict(DocumentIndex.DOCUMENT_TYPES):
+        document_type = None
+    
+    # One query on the document index across SR, SIV, PR and GRN
+    results = search_documents(query, document_type)
+    
+    # Pagination
+    paginator = Paginator(results, 20)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    
+    context = {
+        'documents': page_obj,
+        'query': query,
+        'document_types': DocumentIndex.DOCUMENT_TYPES,
+    }
+    
+    return render(request, 'inventory/document_search.html', context)
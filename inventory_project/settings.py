@@ -50,6 +50,7 @@ INSTALLED_APPS = [
     'store_requisition.apps.StoreRequisitionConfig',
     'purchase_requisition.apps.PurchaseRequisitionConfig',
     'goods_receiving.apps.GoodsReceivingConfig',
+    'reports.apps.ReportsConfig',
 ]
 
 MIDDLEWARE = [
@@ -154,8 +155,9 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        # First, so that failed token requests get 401 with a WWW-Authenticate header
+        'users.authentication.APITokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -168,3 +170,56 @@ REST_FRAMEWORK = {
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 LOGIN_URL = 'login'
+
+# Document numbering
+# Numbers reserved per worker process at a time. 1 keeps SR/SIV/PR/GRN
+# numbers gap-free; larger blocks reduce contention on the counter rows.
+DOCUMENT_NUMBER_BLOCK_SIZE = 1
+
+# Item search
+# Dotted path to a search backend class (see inventory.search). None picks
+# the pg_trgm backend on PostgreSQL and the portable one elsewhere.
+SEARCH_BACKEND = None
+
+# Ledger archival
+# `manage.py archive_ledger` moves ledger rows older than this many months
+# to the archive and leaves an opening balance per item in their place.
+LEDGER_ARCHIVE_MONTHS = 24
+
+# API tokens
+# Validated tokens are cached per process for this many seconds, so a
+# revoked token can still be accepted by other processes for up to the TTL.
+API_TOKEN_CACHE_SIZE = 1024
+API_TOKEN_CACHE_TTL = 60
+
+# Caching
+# CACHE_BACKEND/CACHE_LOCATION select the shared cache, e.g.
+# django.core.cache.backends.redis.RedisCache with redis://127.0.0.1:6379/1
+# or django.core.cache.backends.memcached.PyMemcacheCache with
+# 127.0.0.1:11211. The default file cache is shared by all workers on the
+# host; a local-memory cache would be per process.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+    }
+}
+
+# Dashboard
+# Cache alias for the dashboard figures (see inventory.dashboard), and the
+# longest they are kept if no change invalidates them first.
+DASHBOARD_CACHE = 'default'
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Report cache
+# Cache alias for report summaries and row ids (see reports.cache), and how
+# long an entry is kept; changes to the data retire entries before that.
+REPORT_CACHE = 'default'
+REPORT_CACHE_TIMEOUT = 600
+
+# Background report jobs
+# Finished exports (see reports.jobs) are kept under MEDIA_ROOT for this
+# many hours; a running job with no progress for this many minutes is
+# assumed to have lost its worker and is queued again.
+REPORT_JOB_EXPIRY_HOURS = 24
+REPORT_JOB_STALE_MINUTES = 30
@@ -2,15 +2,16 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from inventory.views import (
     CategoryViewSet, UnitOfMeasureViewSet, ItemViewSet,
-    ItemTransactionViewSet, SupplierViewSet
+    ItemTransactionViewSet, SupplierViewSet, DocumentSearchViewSet
 )
-from users.views import DepartmentViewSet, UserViewSet
+from users.views import DepartmentViewSet, UserViewSet, APITokenViewSet
 from store_requisition.views import (
     StoreRequisitionViewSet, SRItemViewSet,
     StoreIssueViewSet, SIVItemViewSet
 )
 from purchase_requisition.views import PurchaseRequisitionViewSet, PRItemViewSet
 from goods_receiving.views import GoodsReceivingNoteViewSet, GRNItemViewSet
+from reports.api import ReportJobViewSet
 
 # Create a router and register our viewsets with it
 router = DefaultRouter()
@@ -21,10 +22,12 @@ router.register(r'units-of-measure', UnitOfMeasureViewSet)
 router.register(r'items', ItemViewSet)
 router.register(r'item-transactions', ItemTransactionViewSet)
 router.register(r'suppliers', SupplierViewSet)
+router.register(r'documents', DocumentSearchViewSet, basename='document')
 
 # User routes
 router.register(r'departments', DepartmentViewSet)
 router.register(r'users', UserViewSet)
+router.register(r'tokens', APITokenViewSet, basename='api-token')
 
 # Store requisition routes
 router.register(r'store-requisitions', StoreRequisitionViewSet)
@@ -40,6 +43,9 @@ router.register(r'pr-items', PRItemViewSet)
 router.register(r'goods-receiving-notes', GoodsReceivingNoteViewSet)
 router.register(r'grn-items', GRNItemViewSet)
 
+# Report routes
+router.register(r'report-jobs', ReportJobViewSet, basename='report-job')
+
 # The API URLs are now determined automatically by the router
 urlpatterns = [
     path('api/', include(router.urls)),
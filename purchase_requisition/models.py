@@ -2,6 +2,7 @@ from django.db import models
 from django.utils import timezone
 from users.models import CustomUser
 from inventory.models import Item, Supplier
+from inventory.numbering import next_document_number
 
 class PurchaseRequisition(models.Model):
     STATUS_CHOICES = (
@@ -29,21 +30,15 @@ class PurchaseRequisition(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.pr_no:
-            today = timezone.now().date()
-            prefix = f"PR-{today.strftime('%Y%m')}-"
-            last_pr = PurchaseRequisition.objects.filter(
-                pr_no__startswith=prefix
-            ).order_by('-pr_no').first()
-            
-            if last_pr:
-                last_number = int(last_pr.pr_no.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-                
-            self.pr_no = f"{prefix}{new_number:04d}"
+            self.pr_no = next_document_number('PR', PurchaseRequisition, 'pr_no')
             
         super().save(*args, **kwargs)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='pr_status_created_idx'),
+            models.Index(fields=['-date'], name='pr_date_idx'),
+        ]
 
 class PRItem(models.Model):
     pr = models.ForeignKey(PurchaseRequisition, on_delete=models.CASCADE, related_name='items')
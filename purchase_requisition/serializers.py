@@ -1,8 +1,10 @@
 from rest_framework import serializers
+from inventory.fieldsets import DynamicFieldsMixin
 from purchase_requisition.models import PurchaseRequisition, PRItem
 from inventory.serializers import ItemSerializer
 
-class PRItemSerializer(serializers.ModelSerializer):
+class PRItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('item_details',)
     item_details = ItemSerializer(source='item', read_only=True)
     item_code = serializers.ReadOnlyField(source='item.code')
     item_description = serializers.ReadOnlyField(source='item.description')
@@ -12,7 +14,7 @@ class PRItemSerializer(serializers.ModelSerializer):
         model = PRItem
         fields = '__all__'
 
-class PurchaseRequisitionSerializer(serializers.ModelSerializer):
+class PurchaseRequisitionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = PRItemSerializer(many=True, read_only=True)
     requested_by_name = serializers.ReadOnlyField(source='requested_by.get_full_name')
     approved_by_name = serializers.ReadOnlyField(source='approved_by.get_full_name')
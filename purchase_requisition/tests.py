@@ -1,3 +1,51 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from inventory.models import Category, UnitOfMeasure, Item
+from purchase_requisition.models import PurchaseRequisition, PRItem
+
+User = get_user_model()
+
+
+class PurchaseRequisitionAPIQueryTests(TestCase):
+    """Lock in the query budget of the purchase requisition endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="manager", password="password123", role="manager")
+        category = Category.objects.create(name="Test Category")
+        uom = UnitOfMeasure.objects.create(name="Each", abbreviation="EA")
+        items = [
+            Item.objects.create(code=f"ITEM{n:03d}", description=f"Item {n}", category=category, unit_of_measure=uom)
+            for n in range(3)
+        ]
+        for _ in range(5):
+            self.requisition = PurchaseRequisition.objects.create(
+                date=timezone.now().date(),
+                requested_by=self.user,
+                approved_by=self.user
+            )
+            for item in items:
+                PRItem.objects.create(pr=self.requisition, item=item, quantity=2, unit_price=Decimal('1.50'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_requisition_list(self):
+        """Test listing purchase requisitions costs count + page + items"""
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/purchase-requisitions/')
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(response.data['results'][0]['total_amount'], Decimal('9.00'))
+
+    def test_requisition_detail(self):
+        """Test retrieving a purchase requisition costs the row + its items"""
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/purchase-requisitions/{self.requisition.id}/')
 
-# Create your tests here.
+    def test_item_list(self):
+        """Test the line endpoint joins its items"""
+        with self.assertNumQueries(2):
+            self.client.get('/api/pr-items/')
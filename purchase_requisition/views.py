@@ -1,14 +1,19 @@
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound
 from django_filters.rest_framework import DjangoFilterBackend
 from purchase_requisition.models import PurchaseRequisition, PRItem
 from purchase_requisition.serializers import PurchaseRequisitionSerializer, PRItemSerializer
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import Prefetch
+from inventory.fieldsets import is_requested, with_item_details
 
 class PurchaseRequisitionViewSet(viewsets.ModelViewSet):
-    queryset = PurchaseRequisition.objects.all().order_by('-created_at')
+    queryset = PurchaseRequisition.objects.select_related(
+        'requested_by', 'approved_by', 'rejected_by'
+    ).order_by('-created_at')
     serializer_class = PurchaseRequisitionSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -16,6 +21,14 @@ class PurchaseRequisitionViewSet(viewsets.ModelViewSet):
     search_fields = ['pr_no']
     ordering_fields = ['pr_no', 'date', 'created_at']
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if is_requested(self.request, 'items') or is_requested(self.request, 'total_amount'):
+            lines = PRItem.objects.select_related('item__unit_of_measure')
+            lines = with_item_details(lines, self.request, 'items.item_details')
+            queryset = queryset.prefetch_related(Prefetch('items', queryset=lines))
+        return queryset
+    
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
         """Approve a purchase requisition"""
@@ -35,9 +48,12 @@ class PurchaseRequisitionViewSet(viewsets.ModelViewSet):
         requisition.save()
         
         # Update items
+        pr_items = {str(pr_item.id): pr_item for pr_item in requisition.items.all()}
         items_data = request.data.get('items', [])
         for item_data in items_data:
-            pr_item = get_object_or_404(PRItem, id=item_data.get('id'), pr=requisition)
+            pr_item = pr_items.get(str(item_data.get('id')))
+            if pr_item is None:
+                raise NotFound('Requisition item not found.')
             pr_item.quantity = item_data.get('quantity', pr_item.quantity)
             pr_item.unit_price = item_data.get('unit_price', pr_item.unit_price)
             pr_item.save()
@@ -110,8 +126,11 @@ class PurchaseRequisitionViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 class PRItemViewSet(viewsets.ModelViewSet):
-    queryset = PRItem.objects.all()
+    queryset = PRItem.objects.select_related('item__unit_of_measure')
     serializer_class = PRItemSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['pr', 'item']
+    
+    def get_queryset(self):
+        return with_item_details(super().get_queryset(), self.request)
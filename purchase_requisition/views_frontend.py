@@ -111,16 +111,13 @@ def pr_create(request, item_id=None):
         except Exception as e:
             messages.error(request, f'Error creating purchase requisition: {str(e)}')
     
-    # Get items for dropdowns
-    items = Item.objects.all().order_by('code')
-    
+    # Items are looked up on demand by the form's item pickers
     # If item_id is provided (from low stock alert), get the item
     selected_item = None
     if item_id:
         selected_item = get_object_or_404(Item, pk=item_id)
     
     context = {
-        'items': items,
         'selected_item': selected_item,
         'today': timezone.now().date(),
     }
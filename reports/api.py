@@ -0,0 +1,40 @@
+import os
+
+from django.http import FileResponse
+from rest_framework import viewsets, mixins, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from reports import jobs
+from reports.models import ReportJob
+from reports.serializers import ReportJobSerializer
+
+class ReportJobViewSet(mixins.CreateModelMixin,
+                       mixins.ListModelMixin,
+                       mixins.RetrieveModelMixin,
+                       viewsets.GenericViewSet):
+    """The current user's background report exports; poll a job until it is done, then download it."""
+    serializer_class = ReportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return ReportJob.objects.filter(requested_by=self.request.user)
+    
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = jobs.enqueue(self.request.user, data['report'], data.get('params') or {})
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download a finished job's CSV"""
+        job = self.get_object()
+        
+        if job.status == 'expired' or (job.status == 'done' and not job.is_downloadable):
+            return Response({'detail': 'This report has expired.'}, status=status.HTTP_410_GONE)
+        
+        if job.status != 'done':
+            return Response(
+                {'detail': f'This report is not ready yet ({job.get_status_display()}).'},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=os.path.basename(job.file.name))
@@ -0,0 +1,107 @@
+"""
+Report result cache.
+
+The inventory, requisitions and purchases reports cache, per combination
+of filters, their summary figures and the ordered ids of the matching
+rows; a page is then one query fetching its rows by primary key, instead
+of the filtering, counting and aggregation of the whole report. The
+transactions report caches its summary only: its keyset pages are
+already cheap and the ledger's id list is unbounded.
+
+Keys hold the report name, the current version of the data it reads and
+a hash of the normalized filter parameters (stripped, empty ones dropped,
+in a fixed order), so `?status=&page=3` and `?page=1` share an entry.
+Posting stock, editing items and saving requisitions or purchases bump
+the version they affect when their transaction commits (see
+inventory.signals and services.post_movements); entries for older
+versions are never read again and expire after REPORT_CACHE_TIMEOUT.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import Paginator
+from django.db import transaction
+
+VERSION_KEY = 'reports:version:{}'
+RESULT_KEY = 'reports:{}:{}:{}'
+# Reports with more rows than this cache their summary but not their ids
+MAX_CACHED_IDS = 50000
+
+LEDGER = 'ledger'
+REQUISITIONS = 'requisitions'
+PURCHASES = 'purchases'
+
+
+def _cache():
+    return caches[settings.REPORT_CACHE]
+
+
+def get_version(scope):
+    cache = _cache()
+    key = VERSION_KEY.format(scope)
+    version = cache.get(key)
+    if version is None:
+        # Time-based, so a counter that was evicted does not restart at a
+        # value that older entries were stored under
+        cache.add(key, time.time_ns() // 1000, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(scope):
+    """Move `scope` to a new version once the current transaction commits."""
+    def bump():
+        cache = _cache()
+        try:
+            cache.incr(VERSION_KEY.format(scope))
+        except ValueError:
+            get_version(scope)
+    transaction.on_commit(bump)
+
+
+def normalize_filters(params, names):
+    """The non-empty filter parameters among `names`, stripped, in a fixed order."""
+    filters = []
+    for name in sorted(names):
+        value = (params.get(name) or '').strip()
+        if value:
+            filters.append((name, value))
+    return tuple(filters)
+
+
+def cached_results(report, scope, filters, compute):
+    """compute()'s result for `report` with `filters`, from the cache where possible."""
+    digest = hashlib.sha1(repr(filters).encode()).hexdigest()
+    key = RESULT_KEY.format(report, get_version(scope), digest)
+    cache = _cache()
+    results = cache.get(key)
+    if results is None:
+        results = compute()
+        cache.set(key, results, settings.REPORT_CACHE_TIMEOUT)
+    return results
+
+
+def row_ids(queryset, count):
+    """The ordered primary keys of `queryset`, or None if there are too many to cache."""
+    if count > MAX_CACHED_IDS:
+        return None
+    return list(queryset.values_list('pk', flat=True))
+
+
+def get_page(rows, filtered, ids, count, page_number, per_page):
+    """
+    A page of the report. With cached `ids`, its rows are fetched from
+    `rows` by primary key, in the cached order; otherwise `filtered` is
+    paged as usual.
+    """
+    if ids is None:
+        paginator = Paginator(filtered, per_page)
+        paginator.count = count  # Already counted
+        return paginator.get_page(page_number)
+
+    page = Paginator(ids, per_page).get_page(page_number)
+    found = rows.in_bulk(page.object_list)
+    page.object_list = [found[pk] for pk in page.object_list if pk in found]
+    return page
@@ -0,0 +1,143 @@
+"""
+Streaming CSV exports for the reports.
+
+Rows are read in chunks with QuerySet.iterator() (a server-side cursor on
+PostgreSQL) and written straight to a StreamingHttpResponse, so memory use
+stays flat however many rows are exported. Every column a report needs is
+fetched in the same query through values_list()/annotate(), instead of
+following foreign keys row by row.
+"""
+import csv
+
+from django.db.models import Count, Sum
+from django.http import StreamingHttpResponse
+
+from inventory.models import ItemTransaction
+from store_requisition.models import StoreRequisition
+from purchase_requisition.models import PurchaseRequisition
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() just returns what it is given."""
+
+    def write(self, value):
+        return value
+
+
+def full_name(first_name, last_name):
+    """Same result as AbstractUser.get_full_name() from raw columns."""
+    return f"{first_name or ''} {last_name or ''}".strip()
+
+
+def csv_lines(header, rows):
+    """Yield the encoded CSV lines for a header and an iterable of rows."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def streaming_csv_response(filename, header, rows):
+    response = StreamingHttpResponse(csv_lines(header, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+INVENTORY_HEADER = ['Code', 'Description', 'Category', 'UoM', 'Current Stock', 'Min Stock', 'Current Price', 'Value', 'Status']
+
+
+def inventory_rows(items, balance='current_balance', price='current_price'):
+    """`balance` and `price` name the columns or annotations to export, e.g. an as-of balance."""
+    rows = items.values_list(
+        'code', 'description', 'category__name', 'unit_of_measure__abbreviation',
+        balance, 'min_stock_level', price
+    )
+    for code, description, category, uom, balance, min_stock, price in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        status = 'Low Stock' if balance <= min_stock else 'Normal'
+        if balance == 0:
+            status = 'Out of Stock'
+        yield [code, description, category or '', uom or '', balance, min_stock, price, balance * price, status]
+
+
+TRANSACTIONS_HEADER = ['Date', 'Item Code', 'Description', 'Transaction Type', 'Reference', 'Quantity In', 'Quantity Out', 'Balance After', 'Unit Price', 'Created By']
+
+
+def transaction_rows(transactions):
+    type_labels = dict(ItemTransaction.TRANSACTION_TYPES)
+    rows = transactions.values_list(
+        'date', 'item__code', 'item__description', 'transaction_type',
+        'reference_type', 'reference_id', 'quantity_in', 'quantity_out',
+        'balance_after', 'unit_price', 'created_by__first_name', 'created_by__last_name'
+    )
+    for (date, code, description, transaction_type, reference_type, reference_id,
+         quantity_in, quantity_out, balance_after, unit_price, first_name, last_name) in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        reference = f"{reference_type} #{reference_id}" if reference_type else ''
+        yield [
+            date,
+            code,
+            description,
+            type_labels.get(transaction_type, transaction_type),
+            reference,
+            quantity_in or 0,
+            quantity_out or 0,
+            balance_after,
+            unit_price,
+            full_name(first_name, last_name),
+        ]
+
+
+REQUISITIONS_HEADER = ['Requisition No', 'Department', 'Requested Date', 'Delivery Date', 'Status', 'Requested By', 'Checked By', 'Approved By', 'Items Count']
+
+
+def requisition_rows(requisitions):
+    status_labels = dict(StoreRequisition.STATUS_CHOICES)
+    rows = requisitions.annotate(items_count=Count('items')).values_list(
+        'requisition_no', 'department__name', 'requested_date', 'delivery_date', 'status',
+        'requested_by__first_name', 'requested_by__last_name',
+        'checked_by__first_name', 'checked_by__last_name',
+        'approved_by__first_name', 'approved_by__last_name',
+        'items_count'
+    )
+    for (requisition_no, department, requested_date, delivery_date, status,
+         requested_first, requested_last, checked_first, checked_last,
+         approved_first, approved_last, items_count) in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            requisition_no,
+            department,
+            requested_date,
+            delivery_date,
+            status_labels.get(status, status),
+            full_name(requested_first, requested_last),
+            full_name(checked_first, checked_last),
+            full_name(approved_first, approved_last),
+            items_count,
+        ]
+
+
+PURCHASES_HEADER = ['PR No', 'Date', 'Status', 'Requested By', 'Approved By', 'Total Amount', 'Items Count']
+
+
+def purchase_rows(purchases):
+    status_labels = dict(PurchaseRequisition.STATUS_CHOICES)
+    rows = purchases.annotate(
+        total_amount=Sum('items__total_price'),
+        items_count=Count('items')
+    ).values_list(
+        'pr_no', 'date', 'status',
+        'requested_by__first_name', 'requested_by__last_name',
+        'approved_by__first_name', 'approved_by__last_name',
+        'total_amount', 'items_count'
+    )
+    for (pr_no, date, status, requested_first, requested_last,
+         approved_first, approved_last, total_amount, items_count) in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            pr_no,
+            date,
+            status_labels.get(status, status),
+            full_name(requested_first, requested_last),
+            full_name(approved_first, approved_last),
+            total_amount or 0,
+            items_count,
+        ]
@@ -0,0 +1,119 @@
+"""
+The filtered, ordered querysets behind each report, built from its GET
+parameters. The report views and the background export jobs (see
+reports.jobs) both start from these, so a job exports exactly the rows
+the report showed.
+"""
+from django.db.models import F
+
+from inventory import snapshots
+from inventory.models import Item, ItemTransaction
+from inventory.search import apply_search
+from store_requisition.models import StoreRequisition
+from purchase_requisition.models import PurchaseRequisition
+
+# Filter parameters per report; these key the result cache and are what a
+# background job stores
+FILTER_NAMES = {
+    'inventory': ['category', 'low_stock', 'search', 'as_of'],
+    'transactions': ['item', 'transaction_type', 'date_from', 'date_to'],
+    'requisitions': ['department', 'status', 'date_from', 'date_to'],
+    'purchases': ['status', 'date_from', 'date_to'],
+}
+
+
+def inventory_items(params):
+    """
+    Items for the inventory report, and the names of the balance and price
+    to report. With an as-of date they are the ones at the end of that day,
+    from the latest snapshot and the movements after it.
+    """
+    category_id = params.get('category')
+    low_stock = params.get('low_stock')
+    search = params.get('search')
+    as_of = snapshots.parse_date(params.get('as_of'))
+    
+    items = Item.objects.all()
+    balance, price = 'current_balance', 'current_price'
+    if as_of:
+        items = snapshots.annotate_as_of(items, as_of)
+        balance, price = 'as_of_balance', 'as_of_price'
+    
+    if category_id:
+        items = items.filter(category_id=category_id)
+    
+    if low_stock == 'true':
+        items = items.filter(**{f'{balance}__lte': F('min_stock_level')})
+    
+    if search:
+        items = apply_search(items, search)
+    
+    return items.order_by('code'), balance, price, as_of
+
+
+def transactions(params):
+    """Ledger rows for the transactions report, newest first."""
+    item_id = params.get('item')
+    transaction_type = params.get('transaction_type')
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+    
+    rows = ItemTransaction.objects.all()
+    
+    if item_id:
+        rows = rows.filter(item_id=item_id)
+    
+    if transaction_type:
+        rows = rows.filter(transaction_type=transaction_type)
+    
+    if date_from:
+        rows = rows.filter(date__gte=date_from)
+    
+    if date_to:
+        rows = rows.filter(date__lte=date_to)
+    
+    return rows.order_by('-date', '-created_at', '-id')
+
+
+def requisitions(params):
+    """Store requisitions for the requisitions report, newest first."""
+    department_id = params.get('department')
+    status = params.get('status')
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+    
+    rows = StoreRequisition.objects.all()
+    
+    if department_id:
+        rows = rows.filter(department_id=department_id)
+    
+    if status:
+        rows = rows.filter(status=status)
+    
+    if date_from:
+        rows = rows.filter(requested_date__gte=date_from)
+    
+    if date_to:
+        rows = rows.filter(requested_date__lte=date_to)
+    
+    return rows.order_by('-requested_date')
+
+
+def purchases(params):
+    """Purchase requisitions for the purchases report, newest first."""
+    status = params.get('status')
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+    
+    rows = PurchaseRequisition.objects.all()
+    
+    if status:
+        rows = rows.filter(status=status)
+    
+    if date_from:
+        rows = rows.filter(date__gte=date_from)
+    
+    if date_to:
+        rows = rows.filter(date__lte=date_to)
+    
+    return rows.order_by('-date')
@@ -0,0 +1,188 @@
+"""
+Background report exports.
+
+Exports of large reports (a year of ledger rows, every item as of a past
+date) take longer than a request may, so a report view called with
+`?export=csv&background=1` only queues a ReportJob with its normalized
+filters and answers 202 with the job's status URL
+(/api/report-jobs/<id>/). `manage.py run_report_worker` claims queued
+jobs one at a time with SELECT ... FOR UPDATE SKIP LOCKED, so several
+workers can share the queue, and writes the CSV with the same row
+generators as the streaming exports, recording progress as it goes.
+
+Finished files are stored under MEDIA_ROOT/report_jobs/ and kept for
+REPORT_JOB_EXPIRY_HOURS; the worker deletes expired files between jobs.
+A job whose worker died (no progress for REPORT_JOB_STALE_MINUTES) is
+queued again. A slow worker can be taken for a dead one, so every write
+a worker makes is conditional on the job still being on the attempt it
+claimed: once the job has been requeued, the old worker stops and leaves
+it to whichever worker claims it next.
+"""
+import datetime
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from reports import cache as report_cache, exports, filters
+from reports.models import ReportJob
+
+# Progress is saved every this many rows
+PROGRESS_INTERVAL = exports.EXPORT_CHUNK_SIZE
+
+
+class _JobLost(Exception):
+    """The job was requeued while this worker was still running it."""
+
+
+def _inventory(params):
+    items, balance, price, _ = filters.inventory_items(params)
+    return items, exports.inventory_rows(items, balance, price)
+
+
+def _transactions(params):
+    rows = filters.transactions(params)
+    return rows, exports.transaction_rows(rows)
+
+
+def _requisitions(params):
+    rows = filters.requisitions(params)
+    return rows, exports.requisition_rows(rows)
+
+
+def _purchases(params):
+    rows = filters.purchases(params)
+    return rows, exports.purchase_rows(rows)
+
+
+# File name, CSV header and (queryset, rows) builder per report
+REPORTS = {
+    'inventory': ('inventory_report.csv', exports.INVENTORY_HEADER, _inventory),
+    'transactions': ('transactions_report.csv', exports.TRANSACTIONS_HEADER, _transactions),
+    'requisitions': ('requisitions_report.csv', exports.REQUISITIONS_HEADER, _requisitions),
+    'purchases': ('purchases_report.csv', exports.PURCHASES_HEADER, _purchases),
+}
+
+
+def enqueue(user, report, params):
+    """Queue an export of `report` with the report's filters from `params`."""
+    if report not in REPORTS:
+        raise ValueError(f"Unknown report: {report}")
+    filter_values = dict(report_cache.normalize_filters(params, filters.FILTER_NAMES[report]))
+    return ReportJob.objects.create(report=report, params=filter_values, requested_by=user)
+
+
+def claim_next():
+    """Mark the oldest queued job running and return it, or None if the queue is empty."""
+    with transaction.atomic():
+        job = ReportJob.objects.select_for_update(skip_locked=True).filter(status='queued').order_by('id').first()
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'attempts', 'updated_at'])
+    return job
+
+
+def _update_claimed(job, **fields):
+    """Write `fields` to the job if it is still on the attempt this worker claimed."""
+    updated = ReportJob.objects.filter(pk=job.pk, status='running', attempts=job.attempts).update(
+        updated_at=timezone.now(), **fields
+    )
+    if not updated:
+        raise _JobLost()
+
+
+def _record_progress(job, rows_written):
+    job.rows_written = rows_written
+    _update_claimed(job, rows_written=rows_written)
+
+
+def run_job(job):
+    """
+    Write the job's CSV to storage. Failures are recorded on the job rather
+    than raised. If the job is requeued meanwhile, nothing more is written
+    to it and it is returned as it now stands.
+    """
+    filename, header, build = REPORTS[job.report]
+    try:
+        queryset, rows = build(job.params)
+        job.total_rows = queryset.count()
+        _update_claimed(job, total_rows=job.total_rows)
+
+        with tempfile.TemporaryFile() as output:
+            lines = exports.csv_lines(header, rows)
+            output.write(next(lines).encode())
+            written = 0
+            for written, line in enumerate(lines, 1):
+                output.write(line.encode())
+                if written % PROGRESS_INTERVAL == 0:
+                    _record_progress(job, written)
+            output.seek(0)
+            job.file.save(f'{job.pk}/{filename}', File(output), save=False)
+
+        job.rows_written = written
+        job.status = 'done'
+        job.expires_at = timezone.now() + datetime.timedelta(hours=settings.REPORT_JOB_EXPIRY_HOURS)
+    except _JobLost:
+        job.refresh_from_db()
+        return job
+    except Exception as e:
+        job.status = 'failed'
+        job.error = f'{type(e).__name__}: {e}'
+    job.finished_at = timezone.now()
+    try:
+        _update_claimed(
+            job,
+            status=job.status,
+            rows_written=job.rows_written,
+            file=job.file.name,
+            error=job.error,
+            finished_at=job.finished_at,
+            expires_at=job.expires_at,
+        )
+    except _JobLost:
+        if job.file:
+            job.file.delete(save=False)
+        job.refresh_from_db()
+    return job
+
+
+def expire_jobs(now=None):
+    """Delete the files of finished jobs past their expiry. Returns how many expired."""
+    now = now or timezone.now()
+    expired = 0
+    for job in ReportJob.objects.filter(status='done', expires_at__lte=now):
+        job.file.delete(save=False)
+        job.status = 'expired'
+        job.save(update_fields=['file', 'status', 'updated_at'])
+        expired += 1
+    return expired
+
+
+def requeue_stale(now=None):
+    """Queue again the running jobs whose worker stopped making progress. Returns how many."""
+    cutoff = (now or timezone.now()) - datetime.timedelta(minutes=settings.REPORT_JOB_STALE_MINUTES)
+    return ReportJob.objects.filter(status='running', updated_at__lt=cutoff).update(
+        status='queued', rows_written=0, started_at=None
+    )
+
+
+def run_worker(once=False, sleep=2.0, log=None):
+    """Process queued jobs; with `once`, stop when the queue is empty."""
+    while True:
+        requeue_stale()
+        job = claim_next()
+        if job is not None:
+            run_job(job)
+            if log:
+                log(job)
+            continue
+        expire_jobs()
+        if once:
+            return
+        time.sleep(sleep)
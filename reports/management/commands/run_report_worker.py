@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reports import jobs
+
+
+class Command(BaseCommand):
+    help = 'Generate queued background report exports'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when the queue is empty instead of waiting for new jobs',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls of an empty queue',
+        )
+
+    def handle(self, *args, **options):
+        if options['sleep'] <= 0:
+            raise CommandError('--sleep must be positive.')
+
+        def log(job):
+            if job.status == 'done':
+                self.stdout.write(self.style.SUCCESS(f'{job}: {job.rows_written} rows written to {job.file.name}'))
+            elif job.status == 'failed':
+                self.stdout.write(self.style.ERROR(f'{job}: {job.error}'))
+            else:
+                self.stdout.write(self.style.WARNING(f'{job}: requeued while running, left to the worker that claimed it'))
+
+        jobs.run_worker(once=options['once'], sleep=options['sleep'], log=log)
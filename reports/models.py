@@ -0,0 +1,66 @@
+from django.db import models
+from django.utils import timezone
+from users.models import CustomUser
+
+class ReportJob(models.Model):
+    """
+    A report export generated in the background by `manage.py
+    run_report_worker` (see reports.jobs), instead of inside the request.
+    """
+    REPORT_CHOICES = (
+        ('inventory', 'Inventory Status'),
+        ('transactions', 'Inventory Transactions'),
+        ('requisitions', 'Store Requisitions'),
+        ('purchases', 'Purchases'),
+    )
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    )
+    
+    report = models.CharField(max_length=20, choices=REPORT_CHOICES)
+    # Normalized filter parameters, as the report view reads them
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    requested_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='report_jobs')
+    total_rows = models.IntegerField(null=True, blank=True)
+    rows_written = models.IntegerField(default=0)
+    file = models.FileField(upload_to='report_jobs/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Also moved forward with progress, so a dead worker's job can be requeued
+    updated_at = models.DateTimeField(auto_now=True)
+    # Times the job was claimed; a worker only writes to the attempt it claimed
+    attempts = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.get_report_display()} report #{self.pk} ({self.status})"
+    
+    @property
+    def progress(self):
+        """Percentage of rows written, once the total is known."""
+        if self.status == 'done':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(100, self.rows_written * 100 // self.total_rows)
+    
+    @property
+    def is_downloadable(self):
+        return self.status == 'done' and bool(self.file) and (
+            self.expires_at is None or self.expires_at > timezone.now()
+        )
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # The worker's queue scan and the expiry sweep
+            models.Index(fields=['status', 'id'], name='report_job_status_idx'),
+            models.Index(fields=['requested_by', '-created_at'], name='report_job_user_idx'),
+        ]
@@ -0,0 +1,139 @@
+"""
+Date-bucketed stock movement aggregates for the reports.
+
+Each function runs a single grouped query and fills in empty buckets in
+Python, instead of issuing one aggregate query per day or per category.
+Movement totals are read from the ItemDailyMovement rollup rather than
+from the transaction ledger.
+"""
+from datetime import timedelta
+
+from django.db.models import Sum, F
+from django.db.models.functions import TruncWeek, TruncMonth
+from django.utils import timezone
+
+from inventory.models import Item, ItemDailyMovement
+
+WINDOW_CHOICES = (7, 30, 90, 365)
+DEFAULT_WINDOW = 30
+
+BUCKET_CHOICES = ('day', 'week', 'month')
+DEFAULT_BUCKET = 'day'
+
+
+def parse_window(value):
+    """Return a supported window length in days, falling back to the default."""
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_WINDOW
+    return days if days in WINDOW_CHOICES else DEFAULT_WINDOW
+
+
+def parse_bucket(value):
+    """Return a supported bucket size, falling back to the default."""
+    return value if value in BUCKET_CHOICES else DEFAULT_BUCKET
+
+
+def bucket_start(date, bucket):
+    """First day of the bucket containing `date`."""
+    if bucket == 'week':
+        return date - timedelta(days=date.weekday())
+    if bucket == 'month':
+        return date.replace(day=1)
+    return date
+
+
+def bucket_range(start_date, end_date, bucket):
+    """All bucket start dates between two dates, inclusive."""
+    buckets = []
+    current = bucket_start(start_date, bucket)
+    while current <= end_date:
+        buckets.append(current)
+        if bucket == 'week':
+            current += timedelta(days=7)
+        elif bucket == 'month':
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=1)
+    return buckets
+
+
+def _bucket_expression(bucket):
+    if bucket == 'week':
+        return TruncWeek('date')
+    if bucket == 'month':
+        return TruncMonth('date')
+    return F('date')
+
+
+def movement_series(days=DEFAULT_WINDOW, bucket=DEFAULT_BUCKET, end_date=None, daily_movements=None):
+    """
+    Quantity in/out per bucket over the last `days` days (today included).
+    Returns a chronological list of {'date', 'in', 'out'} dicts with zeros
+    for buckets that had no movement.
+    """
+    end_date = end_date or timezone.now().date()
+    start_date = end_date - timedelta(days=days - 1)
+    if daily_movements is None:
+        daily_movements = ItemDailyMovement.objects.all()
+
+    rows = daily_movements.filter(
+        date__gte=start_date,
+        date__lte=end_date
+    ).annotate(
+        bucket=_bucket_expression(bucket)
+    ).values('bucket').annotate(
+        in_qty=Sum('quantity_in'),
+        out_qty=Sum('quantity_out')
+    ).order_by()
+
+    totals = {}
+    for row in rows:
+        key = row['bucket']
+        # TruncWeek/TruncMonth may come back as datetimes on some backends
+        if hasattr(key, 'date'):
+            key = key.date()
+        totals[key] = (row['in_qty'] or 0, row['out_qty'] or 0)
+
+    series = []
+    for date in bucket_range(start_date, end_date, bucket):
+        in_qty, out_qty = totals.get(date, (0, 0))
+        series.append({
+            'date': date.strftime('%Y-%m-%d'),
+            'in': in_qty,
+            'out': out_qty,
+        })
+    return series
+
+
+def category_valuation(items=None):
+    """
+    Stock value per category in one grouped query, highest first.
+    Categories without stock value are left out.
+    """
+    if items is None:
+        items = Item.objects.all()
+
+    rows = items.filter(
+        category__isnull=False
+    ).values('category__name').annotate(
+        total_value=Sum(F('current_balance') * F('current_price'))
+    ).filter(
+        total_value__gt=0
+    ).order_by('-total_value')
+
+    return [
+        {'name': row['category__name'], 'total_value': row['total_value']}
+        for row in rows
+    ]
+
+
+def movement_totals(daily_movements):
+    """Ledger row count and quantity in/out over a filtered rollup queryset."""
+    totals = daily_movements.aggregate(
+        total_transactions=Sum('transaction_count'),
+        total_in=Sum('quantity_in'),
+        total_out=Sum('quantity_out')
+    )
+    return {key: value or 0 for key, value in totals.items()}
@@ -0,0 +1,32 @@
+from django.urls import reverse
+from rest_framework import serializers
+from reports.models import ReportJob
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    report_display = serializers.ReadOnlyField(source='get_report_display')
+    progress = serializers.ReadOnlyField()
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ReportJob
+        fields = ['id', 'report', 'report_display', 'params', 'status', 'progress',
+                 'total_rows', 'rows_written', 'error', 'created_at', 'started_at',
+                 'finished_at', 'expires_at', 'download_url']
+        read_only_fields = ['status', 'total_rows', 'rows_written', 'error', 'created_at',
+                           'started_at', 'finished_at', 'expires_at']
+    
+    def validate_params(self, value):
+        """Filters arrive as query-string values, so they must be a mapping of strings"""
+        if value is None:
+            return {}
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Expected an object of filter names to values.')
+        invalid = sorted(name for name, param in value.items() if not isinstance(param, str))
+        if invalid:
+            raise serializers.ValidationError(f"Filter values must be strings: {', '.join(invalid)}.")
+        return value
+    
+    def get_download_url(self, obj):
+        if not obj.is_downloadable:
+            return None
+        return reverse('report-job-download', args=[obj.pk])
@@ -0,0 +1,365 @@
+import datetime
+import os
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.core.cache import caches
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from inventory import rollups, services
+from inventory.models import Category, Item, ItemTransaction
+from reports import cache as report_cache, jobs, movements
+from reports.models import ReportJob
+from purchase_requisition.models import PurchaseRequisition, PRItem
+from reports.views import report_transactions, report_inventory, report_purchases, report_requisitions
+
+User = get_user_model()
+
+
+class MovementSeriesTests(TestCase):
+    """Test cases for the date-bucketed movement aggregates"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Office Supplies")
+        self.item = Item.objects.create(
+            code="PEN001",
+            description="Ballpoint Pen",
+            category=self.category,
+            current_balance=10,
+            current_price=Decimal('1.50')
+        )
+        for day, quantity_in, quantity_out in [(3, 10, 0), (3, 0, 4), (10, 0, 2)]:
+            ItemTransaction.objects.create(
+                item=self.item,
+                transaction_type='purchase' if quantity_in else 'issue',
+                quantity_in=quantity_in,
+                quantity_out=quantity_out,
+                balance_after=0,
+                unit_price=Decimal('1.50'),
+                total_price=Decimal('1.50'),
+                date=date(2025, 3, day)
+            )
+        rollups.rebuild_movements()
+
+    def test_daily_series_is_zero_filled(self):
+        """Test one point per day with zeros for days without movement"""
+        with self.assertNumQueries(1):
+            series = movements.movement_series(days=7, end_date=date(2025, 3, 9))
+
+        self.assertEqual(len(series), 7)
+        self.assertEqual(series[0], {'date': '2025-03-03', 'in': 10, 'out': 4})
+        self.assertEqual(series[1], {'date': '2025-03-04', 'in': 0, 'out': 0})
+
+    def test_weekly_and_monthly_buckets(self):
+        """Test week buckets start on Monday and month buckets on the 1st"""
+        weekly = movements.movement_series(days=30, bucket='week', end_date=date(2025, 3, 16))
+        self.assertIn({'date': '2025-03-03', 'in': 10, 'out': 4}, weekly)
+        self.assertIn({'date': '2025-03-10', 'in': 0, 'out': 2}, weekly)
+
+        monthly = movements.movement_series(days=90, bucket='month', end_date=date(2025, 3, 31))
+        self.assertEqual([point['date'] for point in monthly], ['2025-01-01', '2025-02-01', '2025-03-01'])
+        self.assertEqual(monthly[-1], {'date': '2025-03-01', 'in': 10, 'out': 6})
+
+    def test_category_valuation(self):
+        """Test category values come from one grouped query"""
+        Item.objects.create(code="EMPTY", description="No stock", category=Category.objects.create(name="Empty"))
+
+        with self.assertNumQueries(1):
+            values = movements.category_valuation()
+
+        self.assertEqual(values, [{'name': "Office Supplies", 'total_value': Decimal('15.00')}])
+
+    def test_parameter_parsing(self):
+        """Test unsupported windows and buckets fall back to the defaults"""
+        self.assertEqual(movements.parse_window('90'), 90)
+        self.assertEqual(movements.parse_window('45'), movements.DEFAULT_WINDOW)
+        self.assertEqual(movements.parse_bucket('year'), movements.DEFAULT_BUCKET)
+
+
+class StreamingExportTests(TestCase):
+    """Test cases for the streaming CSV exports"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="manager",
+            password="password123",
+            first_name="Store",
+            last_name="Manager"
+        )
+        self.items = [Item.objects.create(code=f"ITEM{n:03d}", description=f"Item {n}") for n in range(5)]
+        for item in self.items:
+            for n in range(4):
+                ItemTransaction.objects.create(
+                    item=item,
+                    transaction_type='issue',
+                    reference_type='SIV',
+                    reference_id=n,
+                    quantity_out=1,
+                    balance_after=0,
+                    unit_price=Decimal('1.00'),
+                    total_price=Decimal('1.00'),
+                    date=date(2025, 3, 1),
+                    created_by=self.user
+                )
+
+    def test_transactions_export_streams_in_one_query(self):
+        """Test that exporting the ledger does not query per row"""
+        request = RequestFactory().get('/reports/transactions/', {'export': 'csv'})
+        request.user = self.user
+
+        response = report_transactions(request)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions_report.csv"')
+
+        with self.assertNumQueries(1):
+            lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(len(lines), 21)
+        self.assertTrue(lines[0].startswith('Date,Item Code'))
+        self.assertIn(',Issue,SIV #3,0,1,0,1.00,Store Manager', lines[1])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReportSummaryTests(TestCase):
+    """Test cases for the database-side report summaries"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username="manager", password="password123")
+        self.factory = RequestFactory()
+        Item.objects.create(code="A", description="Normal", current_balance=10, min_stock_level=2, current_price=Decimal('2.00'))
+        Item.objects.create(code="B", description="Low", current_balance=1, min_stock_level=2, current_price=Decimal('5.00'))
+        Item.objects.create(code="C", description="Out", current_balance=0, min_stock_level=2)
+
+    def _context(self, view, params=None):
+        request = self.factory.get('/reports/', params)
+        request.user = self.user
+        with mock.patch('reports.views.render', return_value=HttpResponse()) as render:
+            view(request)
+        return render.call_args[0][2]
+
+    def test_inventory_summary(self):
+        """Test inventory totals, low stock and out of stock counts"""
+        # One aggregate for the summary, one for the row ids and one for the page
+        with self.assertNumQueries(3):
+            context = self._context(report_inventory)
+            page_items = list(context['items'])
+
+        self.assertEqual(context['total_items'], 3)
+        self.assertEqual(context['total_value'], Decimal('25.00'))
+        self.assertEqual(context['low_stock_count'], 2)
+        self.assertEqual(context['out_of_stock_count'], 1)
+        self.assertEqual(page_items[0].stock_value, Decimal('20.00'))
+
+    def test_inventory_as_of(self):
+        """Test the inventory report at the end of a past day"""
+        item = Item.objects.get(code="B")
+        services.post_adjustment(item, 4, date=date(2025, 3, 1), created_by=self.user)
+        services.post_adjustment(item, -2, date=date(2025, 4, 1), created_by=self.user)
+
+        context = self._context(report_inventory, {'as_of': '2025-03-31', 'low_stock': 'true'})
+
+        # A and C were created with a balance but never posted, so the
+        # ledger has them empty; B had 4 on 31 March and was not low
+        self.assertEqual(context['as_of'], date(2025, 3, 31))
+        self.assertEqual(context['total_items'], 2)
+        self.assertEqual(context['out_of_stock_count'], 2)
+
+        context = self._context(report_inventory, {'as_of': '2025-03-31'})
+        self.assertEqual(context['total_value'], Decimal('20.00'))
+        b = [item for item in context['items'] if item.code == "B"][0]
+        self.assertEqual((b.stock_balance, b.stock_value), (4, Decimal('20.00')))
+
+    def test_purchases_summary(self):
+        """Test purchase counts and amounts are not inflated by the item join"""
+        items = list(Item.objects.order_by('code'))
+        for status in ['pending_approval', 'ordered']:
+            pr = PurchaseRequisition.objects.create(requested_by=self.user, date=date(2025, 3, 1), status=status)
+            for item in items:
+                PRItem.objects.create(pr=pr, item=item, quantity=2, unit_price=Decimal('1.50'))
+
+        context = self._context(report_purchases)
+
+        self.assertEqual(context['total_purchases'], 2)
+        self.assertEqual(context['pending_count'], 1)
+        self.assertEqual(context['ordered_count'], 1)
+        self.assertEqual(context['total_amount'], Decimal('18.00'))
+        first = list(context['purchases'])[0]
+        self.assertEqual((first.total_amount, first.items_count), (Decimal('9.00'), 3))
+
+    def test_transactions_summary_reads_rollup(self):
+        """Test ledger totals come from the daily rollup unless filtered by type"""
+        item = Item.objects.get(code="A")
+        services.post_adjustment(item, 5, date=date(2025, 3, 1), created_by=self.user)
+        services.post_adjustment(item, -3, date=date(2025, 3, 2), created_by=self.user)
+
+        request = self.factory.get('/reports/transactions/', {'date_from': '2025-03-02'})
+        request.user = self.user
+        with mock.patch('reports.views.render', return_value=HttpResponse()) as render:
+            report_transactions(request)
+        context = render.call_args[0][2]
+        self.assertEqual((context['total_transactions'], context['total_in'], context['total_out']), (1, 0, 3))
+
+        request = self.factory.get('/reports/transactions/', {'transaction_type': 'adjustment'})
+        request.user = self.user
+        with mock.patch('reports.views.render', return_value=HttpResponse()) as render:
+            report_transactions(request)
+        context = render.call_args[0][2]
+        self.assertEqual((context['total_transactions'], context['total_in'], context['total_out']), (2, 5, 3))
+
+    def test_cached_pages_cost_one_query(self):
+        """Test that paging a cached report only fetches the page's rows"""
+        for n in range(25):
+            Item.objects.create(code=f"X{n:02d}", description=f"Extra {n}")
+        self._context(report_inventory, {'search': ' ', 'page': '1'})
+
+        # Same filters once normalized; the summary and ids come from the cache
+        with self.assertNumQueries(1):
+            context = self._context(report_inventory, {'page': '2', 'category': ''})
+        self.assertEqual(context['total_items'], 28)
+        self.assertEqual([item.code for item in context['items']], ["X17", "X18", "X19", "X20", "X21", "X22", "X23", "X24"])
+        self.assertEqual(context['items'][0].stock_value, 0)
+
+    def test_changes_retire_cached_results(self):
+        """Test that committed changes move the report to a new version"""
+        context = self._context(report_requisitions)
+        self.assertEqual(context['total_requisitions'], 0)
+        version = report_cache.get_version(report_cache.REQUISITIONS)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pr = PurchaseRequisition.objects.create(requested_by=self.user, date=date(2025, 3, 1))
+        self.assertEqual(report_cache.get_version(report_cache.REQUISITIONS), version)
+        self.assertEqual(self._context(report_purchases)['total_purchases'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PRItem.objects.create(pr=pr, item=Item.objects.get(code="A"), quantity=2, unit_price=Decimal('1.50'))
+        self.assertEqual(self._context(report_purchases)['total_amount'], Decimal('3.00'))
+
+        self.assertEqual(self._context(report_inventory)['out_of_stock_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.post_adjustment(Item.objects.get(code="C"), 3, unit_price=Decimal('1.00'), created_by=self.user)
+        self.assertEqual(self._context(report_inventory)['out_of_stock_count'], 0)
+
+
+class ReportJobTests(TestCase):
+    """Test cases for background report exports"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user(username="manager", password="password123")
+        self.factory = RequestFactory()
+        category = Category.objects.create(name="Office Supplies")
+        for n in range(3):
+            Item.objects.create(code=f"ITEM{n}", description=f"Item {n}", category=category, current_balance=n)
+
+    def _export(self, view, params):
+        request = self.factory.get('/reports/', params)
+        request.user = self.user
+        return view(request)
+
+    def test_background_mode_queues_a_job(self):
+        """Test that a background export is queued with the normalized filters"""
+        response = self._export(report_inventory, {'export': 'csv', 'background': '1', 'low_stock': 'true', 'search': '', 'page': '2'})
+
+        self.assertEqual(response.status_code, 202)
+        job = ReportJob.objects.get()
+        self.assertEqual((job.report, job.status, job.params), ('inventory', 'queued', {'low_stock': 'true'}))
+        self.assertIn(f'/api/report-jobs/{job.pk}/', response.content.decode())
+
+    def test_worker_writes_the_export(self):
+        """Test that the worker writes the same CSV as the streaming export"""
+        self._export(report_inventory, {'export': 'csv', 'background': '1'})
+        streamed = b''.join(self._export(report_inventory, {'export': 'csv'}).streaming_content)
+
+        jobs.run_worker(once=True)
+
+        job = ReportJob.objects.get()
+        self.assertEqual((job.status, job.total_rows, job.rows_written, job.progress), ('done', 3, 3, 100))
+        self.assertTrue(job.file.name.endswith('inventory_report.csv'))
+        with job.file.open('rb') as f:
+            self.assertEqual(f.read(), streamed)
+        self.assertTrue(job.is_downloadable)
+
+    def test_failed_job_records_the_error(self):
+        """Test that a job that cannot be generated is marked failed"""
+        job = jobs.enqueue(self.user, 'transactions', {'date_from': 'not a date'})
+
+        jobs.run_worker(once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('ValidationError', job.error)
+
+    def test_polling_download_and_expiry(self):
+        """Test the job status endpoint, the download and file expiry"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/report-jobs/', {'report': 'purchases', 'params': {'status': 'ordered'}}, format='json')
+        self.assertEqual(response.status_code, 201)
+        job_id = response.data['id']
+
+        response = client.get(f'/api/report-jobs/{job_id}/download/')
+        self.assertEqual(response.status_code, 409)
+
+        jobs.run_worker(once=True)
+        response = client.get(f'/api/report-jobs/{job_id}/')
+        self.assertEqual((response.data['status'], response.data['progress']), ('done', 100))
+        response = client.get(response.data['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PR No,Date'))
+
+        job = ReportJob.objects.get(pk=job_id)
+        path = job.file.path
+        self.assertEqual(jobs.expire_jobs(now=job.expires_at + datetime.timedelta(seconds=1)), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(client.get(f'/api/report-jobs/{job_id}/download/').status_code, 410)
+
+    def test_params_must_be_strings(self):
+        """Test that non-string or non-object params are a 400, not a failed request"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for params in [{'category': 5}, {'search': None}, ['category'], 'category']:
+            response = client.post('/api/report-jobs/', {'report': 'inventory', 'params': params}, format='json')
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('params', response.data)
+
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_stale_jobs_are_requeued(self):
+        """Test that a running job without progress is queued again"""
+        job = jobs.enqueue(self.user, 'requisitions', {})
+        self.assertEqual(jobs.claim_next().pk, job.pk)
+        self.assertIsNone(jobs.claim_next())
+
+        self.assertEqual(jobs.requeue_stale(), 0)
+        self.assertEqual(jobs.requeue_stale(now=timezone.now() + datetime.timedelta(hours=1)), 1)
+        self.assertEqual(ReportJob.objects.get().status, 'queued')
+
+    def test_requeued_job_is_left_to_its_new_worker(self):
+        """Test that a slow worker whose job was requeued does not overwrite the new attempt"""
+        jobs.enqueue(self.user, 'inventory', {})
+        slow = jobs.claim_next()
+        jobs.requeue_stale(now=timezone.now() + datetime.timedelta(hours=1))
+        current = jobs.claim_next()
+        self.assertEqual((slow.pk, slow.attempts, current.attempts), (current.pk, 1, 2))
+
+        slow = jobs.run_job(slow)
+        self.assertEqual((slow.status, slow.attempts, slow.file.name), ('running', 2, ''))
+        self.assertEqual(os.listdir(self.media_root), [])
+
+        current = jobs.run_job(current)
+        job = ReportJob.objects.get()
+        self.assertEqual((job.status, job.rows_written, job.file.name), ('done', 3, current.file.name))
+
@@ -3,95 +3,90 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from django.db.models import Sum, F, Q, Count
-from django.core.paginator import Paginator
 from django.http import JsonResponse, HttpResponse
+from django.urls import reverse
 import csv
 import io
 from datetime import datetime, timedelta
 import json
 
-from inventory.models import Item, ItemTransaction, Category, UnitOfMeasure
+from inventory.models import Item, ItemTransaction, ItemDailyMovement, Category, UnitOfMeasure
+from inventory.pagination import keyset_page_or_first
+from inventory import snapshots
 from store_requisition.models import StoreRequisition, StoreIssue
 from purchase_requisition.models import PurchaseRequisition
 from goods_receiving.models import GoodsReceivingNote
 from users.models import Department
+from reports import cache as report_cache, exports, filters, jobs, movements
+
+def background_export(request, report):
+    """Queue a report export for the worker and point the client at the job's status"""
+    job = jobs.enqueue(request.user, report, request.GET)
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'status_url': reverse('report-job-detail', args=[job.pk]),
+    }, status=202)
 
 @login_required
 def report_inventory(request):
     """Inventory Status Report"""
-    # Get filter parameters
-    category_id = request.GET.get('category')
-    low_stock = request.GET.get('low_stock')
-    search = request.GET.get('search')
     export = request.GET.get('export')
     
-    # Base queryset
-    items = Item.objects.all()
-    
-    # Apply filters
-    if category_id:
-        items = items.filter(category_id=category_id)
-    
-    if low_stock == 'true':
-        items = items.filter(current_balance__lte=F('min_stock_level'))
-    
-    if search:
-        items = items.filter(
-            Q(code__icontains=search) | 
-            Q(description__icontains=search)
-        )
+    # Filtered items; with an as-of date the balance and price are the ones
+    # at the end of that day, from the latest snapshot and the movements after it
+    items, balance, price, as_of = filters.inventory_items(request.GET)
     
-    # Order by code
-    items = items.order_by('code')
-    
-    # Export to CSV if requested
+    # Export to CSV if requested, in the background for large reports
     if export == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="inventory_report.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Code', 'Description', 'Category', 'UoM', 'Current Stock', 'Min Stock', 'Current Price', 'Value', 'Status'])
-        
-        for item in items:
-            status = 'Low Stock' if item.is_low_stock else 'Normal'
-            if item.current_balance == 0:
-                status = 'Out of Stock'
-                
-            writer.writerow([
-                item.code,
-                item.description,
-                item.category.name,
-                item.unit_of_measure.abbreviation,
-                item.current_balance,
-                item.min_stock_level,
-                item.current_price,
-                item.current_balance * item.current_price,
-                status
-            ])
-        
-        return response
+        if request.GET.get('background'):
+            return background_export(request, 'inventory')
+        return exports.streaming_csv_response(
+            'inventory_report.csv', exports.INVENTORY_HEADER, exports.inventory_rows(items, balance, price)
+        )
     
     # Get all categories for filter dropdown
     categories = Category.objects.all().order_by('name')
     
-    # Calculate summary statistics
-    total_items = items.count()
-    total_value = sum(item.current_balance * item.current_price for item in items)
-    low_stock_count = sum(1 for item in items if item.is_low_stock)
-    out_of_stock_count = sum(1 for item in items if item.current_balance == 0)
-    
-    # Pagination
-    paginator = Paginator(items, 20)  # Show 20 items per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Summary statistics in one conditional aggregation, and the ordered
+    # row ids, cached per filter combination until the ledger changes
+    def compute():
+        summary = items.aggregate(
+            total_items=Count('id'),
+            total_value=Sum(F(balance) * F(price)),
+            low_stock_count=Count('id', filter=Q(**{f'{balance}__lte': F('min_stock_level')})),
+            out_of_stock_count=Count('id', filter=Q(**{balance: 0})),
+        )
+        return {'summary': summary, 'ids': report_cache.row_ids(items, summary['total_items'])}
+    
+    results = report_cache.cached_results(
+        'inventory', report_cache.LEDGER,
+        report_cache.normalize_filters(request.GET, filters.FILTER_NAMES['inventory']),
+        compute
+    )
+    summary = results['summary']
+    
+    # Pagination, with the row value computed by the database; a cached
+    # page is fetched by id, so without the filters
+    row_values = {'stock_balance': F(balance), 'stock_price': F(price), 'stock_value': F(balance) * F(price)}
+    rows = Item.objects.all()
+    if as_of:
+        rows = snapshots.annotate_as_of(rows, as_of)
+    page_obj = report_cache.get_page(
+        rows.select_related('category', 'unit_of_measure').annotate(**row_values),
+        items.select_related('category', 'unit_of_measure').annotate(**row_values),
+        results['ids'], summary['total_items'],
+        request.GET.get('page'), 20  # Show 20 items per page
+    )
     
     context = {
         'items': page_obj,
         'categories': categories,
-        'total_items': total_items,
-        'total_value': total_value,
-        'low_stock_count': low_stock_count,
-        'out_of_stock_count': out_of_stock_count,
+        'as_of': as_of,
+        'total_items': summary['total_items'],
+        'total_value': summary['total_value'] or 0,
+        'low_stock_count': summary['low_stock_count'],
+        'out_of_stock_count': summary['out_of_stock_count'],
         'title': 'Inventory Status Report',
     }
     
@@ -107,69 +102,60 @@ def report_transactions(request):
     date_to = request.GET.get('date_to')
     export = request.GET.get('export')
     
-    # Base queryset
-    transactions = ItemTransaction.objects.all()
-    
-    # Apply filters
-    if item_id:
-        transactions = transactions.filter(item_id=item_id)
-    
-    if transaction_type:
-        transactions = transactions.filter(transaction_type=transaction_type)
-    
-    if date_from:
-        transactions = transactions.filter(date__gte=date_from)
-    
-    if date_to:
-        transactions = transactions.filter(date__lte=date_to)
-    
-    # Order by date and time
-    transactions = transactions.order_by('-date', '-created_at')
+    # Filtered ledger rows, newest first
+    transactions = filters.transactions(request.GET)
     
-    # Export to CSV if requested
+    # Export to CSV if requested, in the background for large reports
     if export == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="transactions_report.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Date', 'Item Code', 'Description', 'Transaction Type', 'Reference', 'Quantity In', 'Quantity Out', 'Balance After', 'Unit Price', 'Created By'])
-        
-        for transaction in transactions:
-            writer.writerow([
-                transaction.date,
-                transaction.item.code,
-                transaction.item.description,
-                transaction.get_transaction_type_display(),
-                transaction.reference,
-                transaction.quantity_in or 0,
-                transaction.quantity_out or 0,
-                transaction.balance_after,
-                transaction.unit_price,
-                transaction.created_by.get_full_name() if transaction.created_by else ''
-            ])
-        
-        return response
+        if request.GET.get('background'):
+            return background_export(request, 'transactions')
+        return exports.streaming_csv_response(
+            'transactions_report.csv', exports.TRANSACTIONS_HEADER, exports.transaction_rows(transactions)
+        )
     
     # Get all items for filter dropdown
     items = Item.objects.all().order_by('code')
     
-    # Calculate summary statistics
-    total_transactions = transactions.count()
-    total_in = transactions.aggregate(Sum('quantity_in'))['quantity_in__sum'] or 0
-    total_out = transactions.aggregate(Sum('quantity_out'))['quantity_out__sum'] or 0
-    
-    # Pagination
-    paginator = Paginator(transactions, 20)  # Show 20 transactions per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Calculate summary statistics, cached per filter combination until the
+    # ledger changes; the daily rollup has no transaction type, so only a
+    # type filter needs the ledger itself
+    def compute():
+        if transaction_type:
+            return transactions.aggregate(
+                total_transactions=Count('id'),
+                total_in=Sum('quantity_in'),
+                total_out=Sum('quantity_out')
+            )
+        else:
+            daily_movements = ItemDailyMovement.objects.all()
+            if item_id:
+                daily_movements = daily_movements.filter(item_id=item_id)
+            if date_from:
+                daily_movements = daily_movements.filter(date__gte=date_from)
+            if date_to:
+                daily_movements = daily_movements.filter(date__lte=date_to)
+            return movements.movement_totals(daily_movements)
+    
+    summary = report_cache.cached_results(
+        'transactions', report_cache.LEDGER,
+        report_cache.normalize_filters(request.GET, filters.FILTER_NAMES['transactions']),
+        compute
+    )
+    
+    # Keyset pagination: deep pages cost the same as the first one
+    page_obj = keyset_page_or_first(
+        transactions.select_related('item', 'created_by'),
+        request.GET.get('cursor'),
+        per_page=20  # Show 20 transactions per page
+    )
     
     context = {
         'transactions': page_obj,
         'items': items,
         'transaction_types': ItemTransaction.TRANSACTION_TYPES,
-        'total_transactions': total_transactions,
-        'total_in': total_in,
-        'total_out': total_out,
+        'total_transactions': summary['total_transactions'],
+        'total_in': summary['total_in'] or 0,
+        'total_out': summary['total_out'] or 0,
         'title': 'Inventory Transactions Report',
     }
     
@@ -178,77 +164,54 @@ def report_transactions(request):
 @login_required
 def report_requisitions(request):
     """Store Requisitions Report"""
-    # Get filter parameters
-    department_id = request.GET.get('department')
-    status = request.GET.get('status')
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
     export = request.GET.get('export')
     
-    # Base queryset
-    requisitions = StoreRequisition.objects.all()
-    
-    # Apply filters
-    if department_id:
-        requisitions = requisitions.filter(department_id=department_id)
-    
-    if status:
-        requisitions = requisitions.filter(status=status)
-    
-    if date_from:
-        requisitions = requisitions.filter(requested_date__gte=date_from)
-    
-    if date_to:
-        requisitions = requisitions.filter(requested_date__lte=date_to)
-    
-    # Order by date
-    requisitions = requisitions.order_by('-requested_date')
+    # Filtered requisitions, newest first
+    requisitions = filters.requisitions(request.GET)
     
-    # Export to CSV if requested
+    # Export to CSV if requested, in the background for large reports
     if export == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="requisitions_report.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Requisition No', 'Department', 'Requested Date', 'Delivery Date', 'Status', 'Requested By', 'Checked By', 'Approved By', 'Items Count'])
-        
-        for req in requisitions:
-            writer.writerow([
-                req.requisition_no,
-                req.department.name,
-                req.requested_date,
-                req.delivery_date,
-                req.get_status_display(),
-                req.requested_by.get_full_name() if req.requested_by else '',
-                req.checked_by.get_full_name() if req.checked_by else '',
-                req.approved_by.get_full_name() if req.approved_by else '',
-                req.items.count()
-            ])
-        
-        return response
+        if request.GET.get('background'):
+            return background_export(request, 'requisitions')
+        return exports.streaming_csv_response(
+            'requisitions_report.csv', exports.REQUISITIONS_HEADER, exports.requisition_rows(requisitions)
+        )
     
     # Get all departments for filter dropdown
     departments = Department.objects.all().order_by('name')
     
-    # Calculate summary statistics
-    total_requisitions = requisitions.count()
-    pending_count = requisitions.filter(status='pending').count()
-    approved_count = requisitions.filter(status='approved').count()
-    issued_count = requisitions.filter(status='issued').count()
+    # Summary statistics in one conditional aggregation, and the ordered
+    # row ids, cached per filter combination until a requisition changes
+    def compute():
+        summary = requisitions.aggregate(
+            total_requisitions=Count('id'),
+            pending_count=Count('id', filter=Q(status='pending')),
+            approved_count=Count('id', filter=Q(status='approved')),
+            issued_count=Count('id', filter=Q(status='issued')),
+        )
+        return {'summary': summary, 'ids': report_cache.row_ids(requisitions, summary['total_requisitions'])}
+    
+    results = report_cache.cached_results(
+        'requisitions', report_cache.REQUISITIONS,
+        report_cache.normalize_filters(request.GET, filters.FILTER_NAMES['requisitions']),
+        compute
+    )
+    summary = results['summary']
     
     # Pagination
-    paginator = Paginator(requisitions, 20)  # Show 20 requisitions per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = report_cache.get_page(
+        StoreRequisition.objects.all(), requisitions, results['ids'], summary['total_requisitions'],
+        request.GET.get('page'), 20  # Show 20 requisitions per page
+    )
     
     context = {
         'requisitions': page_obj,
         'departments': departments,
         'status_choices': StoreRequisition.STATUS_CHOICES,
-        'total_requisitions': total_requisitions,
-        'pending_count': pending_count,
-        'approved_count': approved_count,
-        'issued_count': issued_count,
+        'total_requisitions': summary['total_requisitions'],
+        'pending_count': summary['pending_count'],
+        'approved_count': summary['approved_count'],
+        'issued_count': summary['issued_count'],
         'title': 'Store Requisitions Report',
     }
     
@@ -257,76 +220,58 @@ def report_requisitions(request):
 @login_required
 def report_purchases(request):
     """Purchases Report"""
-    # Get filter parameters
-    status = request.GET.get('status')
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
     export = request.GET.get('export')
     
-    # Base queryset
-    purchases = PurchaseRequisition.objects.all()
-    
-    # Apply filters
-    if status:
-        purchases = purchases.filter(status=status)
-    
-    if date_from:
-        purchases = purchases.filter(date__gte=date_from)
-    
-    if date_to:
-        purchases = purchases.filter(date__lte=date_to)
+    # Filtered purchase requisitions, newest first
+    purchases = filters.purchases(request.GET)
     
-    # Order by date
-    purchases = purchases.order_by('-date')
-    
-    # Export to CSV if requested
+    # Export to CSV if requested, in the background for large reports
     if export == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="purchases_report.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['PR No', 'Date', 'Status', 'Requested By', 'Approved By', 'Total Amount', 'Items Count'])
-        
-        for pr in purchases:
-            total_amount = sum(item.total_price or 0 for item in pr.items.all())
-            writer.writerow([
-                pr.pr_no,
-                pr.date,
-                pr.get_status_display(),
-                pr.requested_by.get_full_name() if pr.requested_by else '',
-                pr.approved_by.get_full_name() if pr.approved_by else '',
-                total_amount,
-                pr.items.count()
-            ])
-        
-        return response
-    
-    # Calculate summary statistics
-    total_purchases = purchases.count()
-    pending_count = purchases.filter(status='pending_approval').count()
-    approved_count = purchases.filter(status='approved').count()
-    ordered_count = purchases.filter(status='ordered').count()
-    received_count = purchases.filter(status='received').count()
-    
-    # Calculate total amount
-    total_amount = 0
-    for pr in purchases:
-        total_amount += sum(item.total_price or 0 for item in pr.items.all())
+        if request.GET.get('background'):
+            return background_export(request, 'purchases')
+        return exports.streaming_csv_response(
+            'purchases_report.csv', exports.PURCHASES_HEADER, exports.purchase_rows(purchases)
+        )
     
-    # Pagination
-    paginator = Paginator(purchases, 20)  # Show 20 purchases per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Calculate summary statistics and the total amount in one query.
+    # Counts are distinct because the item join repeats each requisition.
+    # Cached, with the ordered row ids, until a purchase changes.
+    def compute():
+        summary = purchases.aggregate(
+            total_purchases=Count('id', distinct=True),
+            pending_count=Count('id', distinct=True, filter=Q(status='pending_approval')),
+            approved_count=Count('id', distinct=True, filter=Q(status='approved')),
+            ordered_count=Count('id', distinct=True, filter=Q(status='ordered')),
+            received_count=Count('id', distinct=True, filter=Q(status='received')),
+            total_amount=Sum('items__total_price'),
+        )
+        return {'summary': summary, 'ids': report_cache.row_ids(purchases, summary['total_purchases'])}
+    
+    results = report_cache.cached_results(
+        'purchases', report_cache.PURCHASES,
+        report_cache.normalize_filters(request.GET, filters.FILTER_NAMES['purchases']),
+        compute
+    )
+    summary = results['summary']
+    
+    # Pagination, with per-row totals and item counts
+    row_values = {'total_amount': Sum('items__total_price'), 'items_count': Count('items')}
+    page_obj = report_cache.get_page(
+        PurchaseRequisition.objects.select_related('requested_by', 'approved_by').annotate(**row_values),
+        purchases.select_related('requested_by', 'approved_by').annotate(**row_values),
+        results['ids'], summary['total_purchases'],
+        request.GET.get('page'), 20  # Show 20 purchases per page
+    )
     
     context = {
         'purchases': page_obj,
         'status_choices': PurchaseRequisition.STATUS_CHOICES,
-        'total_purchases': total_purchases,
-        'pending_count': pending_count,
-        'approved_count': approved_count,
-        'ordered_count': ordered_count,
-        'received_count': received_count,
-        'total_amount': total_amount,
+        'total_purchases': summary['total_purchases'],
+        'pending_count': summary['pending_count'],
+        'approved_count': summary['approved_count'],
+        'ordered_count': summary['ordered_count'],
+        'received_count': summary['received_count'],
+        'total_amount': summary['total_amount'] or 0,
         'title': 'Purchases Report',
     }
     
@@ -335,9 +280,11 @@ def report_purchases(request):
 @login_required
 def report_dashboard(request):
     """Dashboard Report with charts and statistics"""
-    # Date range for trend data
+    # Window and bucket size for trend data
+    window = movements.parse_window(request.GET.get('days'))
+    bucket = movements.parse_bucket(request.GET.get('bucket'))
     end_date = timezone.now().date()
-    start_date = end_date - timedelta(days=30)
+    start_date = end_date - timedelta(days=window)
     
     # Get inventory statistics
     total_items = Item.objects.count()
@@ -365,54 +312,25 @@ def report_dashboard(request):
         date__lte=end_date
     ).count()
     
-    # Get top categories by value
-    top_categories = Category.objects.annotate(
-        total_value=Sum(F('items__current_balance') * F('items__current_price'))
-    ).order_by('-total_value')[:5]
+    # Category valuation in one grouped query, used for both the top list
+    # and the distribution chart
+    category_values = movements.category_valuation()
+    top_categories = category_values[:5]
     
     # Get top departments by requisitions
     top_departments = Department.objects.annotate(
-        req_count=Count('store_requisitions')
+        req_count=Count('storerequisition')
     ).order_by('-req_count')[:5]
     
     # Prepare data for charts
-    # Daily transactions for the past 30 days
-    daily_transactions = []
-    for i in range(30):
-        date = end_date - timedelta(days=i)
-        in_qty = ItemTransaction.objects.filter(
-            date=date,
-            quantity_in__isnull=False
-        ).aggregate(Sum('quantity_in'))['quantity_in__sum'] or 0
-        
-        out_qty = ItemTransaction.objects.filter(
-            date=date,
-            quantity_out__isnull=False
-        ).aggregate(Sum('quantity_out'))['quantity_out__sum'] or 0
-        
-        daily_transactions.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'in': in_qty,
-            'out': out_qty
-        })
-    
-    # Reverse to get chronological order
-    daily_transactions.reverse()
+    # Transactions per day/week/month over the window, zero-filled
+    daily_transactions = movements.movement_series(days=window, bucket=bucket, end_date=end_date)
     
     # Category distribution data
-    category_data = []
-    for category in Category.objects.all():
-        value = Item.objects.filter(
-            category=category
-        ).aggregate(
-            total_value=Sum(F('current_balance') * F('current_price'))
-        )['total_value'] or 0
-        
-        if value > 0:
-            category_data.append({
-                'name': category.name,
-                'value': value
-            })
+    category_data = [
+        {'name': category['name'], 'value': float(category['total_value'])}
+        for category in category_values
+    ]
     
     context = {
         'total_items': total_items,
@@ -426,6 +344,10 @@ def report_dashboard(request):
         'top_departments': top_departments,
         'daily_transactions': json.dumps(daily_transactions),
         'category_data': json.dumps(category_data),
+        'window': window,
+        'bucket': bucket,
+        'window_choices': movements.WINDOW_CHOICES,
+        'bucket_choices': movements.BUCKET_CHOICES,
         'title': 'Dashboard Report',
     }
     
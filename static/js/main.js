@@ -43,22 +43,28 @@ $(document).ready(function() {
     
     // Item selection change handler
     function initializeItemSelect() {
-        $('.item-select').on('change', function() {
+        // Delegated once, so adding rows does not stack handlers
+        if (initializeItemSelect.bound) {
+            return;
+        }
+        initializeItemSelect.bound = true;
+        
+        $(document).on('change', '.item-select', function() {
             const row = $(this).closest('.item-row');
             const itemId = $(this).val();
             
             if (itemId) {
-                // Fetch item details via API
-                $.ajax({
-                    url: `/api/items/${itemId}/`,
-                    method: 'GET',
-                    success: function(data) {
-                        row.find('.item-uom').text(data.unit_of_measure_name);
-                        row.find('.item-price').val(data.current_price);
-                        row.find('.item-balance').text(data.current_balance);
-                        row.find('.item-quantity').attr('max', data.current_balance);
-                        updateRowTotal(row);
+                // Fetch item details through the batched lookup
+                itemAvailability.get(itemId, function(data) {
+                    // Ignore answers for a selection that has since changed
+                    if (!data || row.find('.item-select').val() !== itemId) {
+                        return;
                     }
+                    row.find('.item-uom').text(data.unit_of_measure_name || '');
+                    row.find('.item-price').val(data.current_price);
+                    row.find('.item-balance').text(data.available_quantity);
+                    row.find('.item-quantity').attr('max', data.available_quantity);
+                    updateRowTotal(row);
                 });
             } else {
                 row.find('.item-uom').text('');
@@ -69,6 +75,30 @@ $(document).ready(function() {
         });
     }
     
+    // Item search: load matching options into the row's select on demand
+    $(document).on('input', '.item-search', function() {
+        const input = $(this);
+        const select = input.closest('.item-row').find('.item-select');
+        clearTimeout(input.data('timer'));
+        input.data('timer', setTimeout(function() {
+            itemTypeahead.search(input.val(), select.data('in-stock'), function(rows) {
+                // Ignore answers for a term that has since changed
+                if (input.val() === this.term) {
+                    setItemOptions(select, rows);
+                }
+            });
+        }, itemTypeahead.delay));
+    });
+    
+    // Issue vouchers: availability includes the chosen requisition's reservations
+    const srSelect = $('#dynamic-form-container select[name="sr"]');
+    if (srSelect.length) {
+        itemAvailability.forRequisition(srSelect.val());
+        srSelect.on('change', function() {
+            itemAvailability.forRequisition($(this).val());
+        });
+    }
+    
     // Quantity or price change handler
     $(document).on('input', '.item-quantity, .item-price', function() {
         updateRowTotal($(this).closest('.item-row'));
@@ -154,3 +184,140 @@ $(document).ready(function() {
         });
     }
 });
+
+// Item availability lookups, coalesced into batched requests and cached for the page
+const itemAvailability = {
+    url: '/api/items/availability/',
+    batchSize: 100,
+    delay: 30,
+    cache: {},
+    waiting: {},
+    timer: null,
+    // Extra query parameters, e.g. {sr: id} on an issue voucher form
+    params: {},
+    
+    // Count the requisition's own reservations as available when issuing against it
+    forRequisition: function(srId) {
+        this.params = srId ? {sr: srId} : {};
+        this.cache = {};
+    },
+    
+    get: function(itemId, callback) {
+        itemId = String(itemId);
+        if (this.cache.hasOwnProperty(itemId)) {
+            callback(this.cache[itemId]);
+            return;
+        }
+        if (!this.waiting[itemId]) {
+            this.waiting[itemId] = [];
+        }
+        this.waiting[itemId].push(callback);
+        
+        // Selections made within the delay share one request
+        if (!this.timer) {
+            this.timer = setTimeout(this.flush.bind(this), this.delay);
+        }
+    },
+    
+    flush: function() {
+        const waiting = this.waiting;
+        const ids = Object.keys(waiting);
+        this.waiting = {};
+        this.timer = null;
+        
+        for (let start = 0; start < ids.length; start += this.batchSize) {
+            this.fetch(ids.slice(start, start + this.batchSize), waiting);
+        }
+    },
+    
+    prime: function(rows) {
+        const cache = this.cache;
+        rows.forEach(function(row) {
+            cache[String(row.id)] = row;
+        });
+    },
+    
+    fetch: function(ids, waiting) {
+        const self = this;
+        $.ajax({
+            url: this.url,
+            method: 'GET',
+            data: $.extend({ids: ids.join(',')}, this.params),
+            success: function(rows) {
+                self.prime(rows);
+                ids.forEach(function(itemId) {
+                    const data = self.cache.hasOwnProperty(itemId) ? self.cache[itemId] : null;
+                    waiting[itemId].forEach(function(callback) {
+                        callback(data);
+                    });
+                });
+            }
+        });
+    }
+};
+
+// Server-side item search for the item pickers
+const itemTypeahead = {
+    url: '/api/items/typeahead/',
+    delay: 250,
+    
+    search: function(term, inStock, callback) {
+        term = $.trim(term);
+        const context = {term: term};
+        if (!term) {
+            callback.call(context, []);
+            return;
+        }
+        $.ajax({
+            url: this.url,
+            method: 'GET',
+            data: $.extend(inStock ? {q: term, in_stock: 1} : {q: term}, itemAvailability.params),
+            success: function(rows) {
+                itemAvailability.prime(rows);
+                callback.call(context, rows);
+            }
+        });
+    }
+};
+
+function itemOption(data) {
+    const option = new Option(`${data.code} - ${data.description}`, data.id);
+    $(option).attr({
+        'data-uom': data.unit_of_measure_name || '',
+        'data-price': data.current_price,
+        'data-balance': data.available_quantity,
+        'data-current-stock': data.current_balance,
+        'data-min-stock': data.min_stock_level
+    });
+    return option;
+}
+
+// Replace a select's options with search results, keeping the current choice
+function setItemOptions(select, rows) {
+    const selected = select.val();
+    select.find('option').filter(function() {
+        return this.value && this.value !== selected;
+    }).remove();
+    rows.forEach(function(row) {
+        if (String(row.id) !== selected) {
+            select.append(itemOption(row));
+        }
+    });
+}
+
+// Select an item that may not be among the loaded options, e.g. when
+// rows are filled in from another document
+function selectItem(select, itemId, callback) {
+    itemAvailability.get(itemId, function(data) {
+        if (!data) {
+            return;
+        }
+        if (!select.find(`option[value="${data.id}"]`).length) {
+            select.append(itemOption(data));
+        }
+        select.val(String(data.id)).trigger('change');
+        if (callback) {
+            callback(data);
+        }
+    });
+}
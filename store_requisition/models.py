@@ -2,6 +2,7 @@ from django.db import models
 from django.utils import timezone
 from users.models import CustomUser, Department
 from inventory.models import Item
+from inventory.numbering import next_document_number
 
 class StoreRequisition(models.Model):
     STATUS_CHOICES = (
@@ -11,7 +12,19 @@ class StoreRequisition(models.Model):
         ('rejected', 'Rejected'),
         ('issued', 'Issued'),
         ('partially_issued', 'Partially Issued'),
+        ('closed', 'Closed'),
     )
+    # Statuses a store issue voucher can be made against
+    ISSUABLE_STATUSES = ['approved', 'partially_issued']
+    # Statuses each role acts on; everyone else follows their own open requisitions
+    ROLE_PENDING_STATUSES = {
+        'controller': ['pending'],
+        'admin': ['pending', 'checked'],
+        'manager': ['pending', 'checked'],
+        'store_keeper': ISSUABLE_STATUSES,
+    }
+    # Statuses that need no further action
+    FINISHED_STATUSES = ['issued', 'rejected', 'closed']
     
     requisition_no = models.CharField(max_length=20, unique=True, editable=False)
     department = models.ForeignKey(Department, on_delete=models.CASCADE)
@@ -29,23 +42,33 @@ class StoreRequisition(models.Model):
     def __str__(self):
         return self.requisition_no
     
+    @classmethod
+    def pending_for(cls, user):
+        """The requisitions waiting on `user`, as listed on the pending requisitions page"""
+        statuses = cls.ROLE_PENDING_STATUSES.get(user.role)
+        if statuses is None:
+            return cls.objects.filter(requested_by=user).exclude(status__in=cls.FINISHED_STATUSES)
+        return cls.objects.filter(status__in=statuses)
+    
     def save(self, *args, **kwargs):
         if not self.requisition_no:
-            today = timezone.now().date()
-            prefix = f"SR-{today.strftime('%Y%m')}-"
-            last_sr = StoreRequisition.objects.filter(
-                requisition_no__startswith=prefix
-            ).order_by('-requisition_no').first()
-            
-            if last_sr:
-                last_number = int(last_sr.requisition_no.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-                
-            self.requisition_no = f"{prefix}{new_number:04d}"
+            self.requisition_no = next_document_number('SR', StoreRequisition, 'requisition_no')
             
         super().save(*args, **kwargs)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='sr_status_created_idx'),
+            models.Index(fields=['department', '-created_at'], name='sr_department_created_idx'),
+            models.Index(fields=['requested_by', '-created_at'], name='sr_requester_created_idx'),
+            models.Index(fields=['-requested_date'], name='sr_requested_date_idx'),
+            # Partial index for the pending/checked approval queues
+            models.Index(
+                fields=['-created_at'],
+                name='sr_pending_queue_idx',
+                condition=models.Q(status__in=['pending', 'checked']),
+            ),
+        ]
 
 class SRItem(models.Model):
     sr = models.ForeignKey(StoreRequisition, on_delete=models.CASCADE, related_name='items')
@@ -53,6 +76,10 @@ class SRItem(models.Model):
     requested_qty = models.PositiveIntegerField()
     checked_qty = models.PositiveIntegerField(null=True, blank=True)
     approved_qty = models.PositiveIntegerField(null=True, blank=True)
+    # Part of the approved quantity still held in Item.reserved_qty
+    reserved_qty = models.PositiveIntegerField(default=0)
+    # Total issued on all SIVs against this line, kept by the posting service
+    issued_qty = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -61,6 +88,11 @@ class SRItem(models.Model):
     
     def __str__(self):
         return f"{self.sr.requisition_no} - {self.item.code}"
+    
+    @property
+    def approved_quantity(self):
+        """The quantity to issue: approved, else checked, else requested."""
+        return self.approved_qty or self.checked_qty or self.requested_qty
 
 class StoreIssue(models.Model):
     siv_no = models.CharField(max_length=20, unique=True, editable=False)
@@ -78,21 +110,15 @@ class StoreIssue(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.siv_no:
-            today = timezone.now().date()
-            prefix = f"SIV-{today.strftime('%Y%m')}-"
-            last_siv = StoreIssue.objects.filter(
-                siv_no__startswith=prefix
-            ).order_by('-siv_no').first()
-            
-            if last_siv:
-                last_number = int(last_siv.siv_no.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-                
-            self.siv_no = f"{prefix}{new_number:04d}"
+            self.siv_no = next_document_number('SIV', StoreIssue, 'siv_no')
             
         super().save(*args, **kwargs)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='siv_created_idx'),
+            models.Index(fields=['-date'], name='siv_date_idx'),
+        ]
 
 class SIVItem(models.Model):
     siv = models.ForeignKey(StoreIssue, on_delete=models.CASCADE, related_name='items')
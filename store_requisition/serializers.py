@@ -1,19 +1,23 @@
 from rest_framework import serializers
+from inventory.fieldsets import DynamicFieldsMixin
 from store_requisition.models import StoreRequisition, SRItem, StoreIssue, SIVItem
 from inventory.serializers import ItemSerializer
 
-class SRItemSerializer(serializers.ModelSerializer):
+class SRItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('item_details',)
     item_details = ItemSerializer(source='item', read_only=True)
     item_code = serializers.ReadOnlyField(source='item.code')
     item_description = serializers.ReadOnlyField(source='item.description')
     unit_of_measure = serializers.ReadOnlyField(source='item.unit_of_measure.abbreviation')
     current_balance = serializers.ReadOnlyField(source='item.current_balance')
+    available_quantity = serializers.ReadOnlyField(source='item.available_quantity')
     
     class Meta:
         model = SRItem
         fields = '__all__'
+        read_only_fields = ['reserved_qty', 'issued_qty']
 
-class StoreRequisitionSerializer(serializers.ModelSerializer):
+class StoreRequisitionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = SRItemSerializer(many=True, read_only=True)
     department_name = serializers.ReadOnlyField(source='department.name')
     requested_by_name = serializers.ReadOnlyField(source='requested_by.get_full_name')
@@ -25,7 +29,8 @@ class StoreRequisitionSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['requisition_no']
 
-class SIVItemSerializer(serializers.ModelSerializer):
+class SIVItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('item_details',)
     item_details = ItemSerializer(source='item', read_only=True)
     item_code = serializers.ReadOnlyField(source='item.code')
     item_description = serializers.ReadOnlyField(source='item.description')
@@ -35,7 +40,7 @@ class SIVItemSerializer(serializers.ModelSerializer):
         model = SIVItem
         fields = '__all__'
 
-class StoreIssueSerializer(serializers.ModelSerializer):
+class StoreIssueSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = SIVItemSerializer(many=True, read_only=True)
     sr_no = serializers.ReadOnlyField(source='sr.requisition_no')
     department_name = serializers.ReadOnlyField(source='sr.department.name')
@@ -47,3 +52,8 @@ class StoreIssueSerializer(serializers.ModelSerializer):
         model = StoreIssue
         fields = '__all__'
         read_only_fields = ['siv_no']
+    
+    def validate_sr(self, value):
+        if self.instance is None and value.status not in StoreRequisition.ISSUABLE_STATUSES:
+            raise serializers.ValidationError('Only approved or partially issued requisitions can be issued.')
+        return value
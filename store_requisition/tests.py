@@ -1,3 +1,420 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from inventory import services
+from inventory.models import Category, UnitOfMeasure, Item
+from store_requisition.models import StoreRequisition, SRItem, StoreIssue, SIVItem
+from store_requisition.views import StoreRequisitionViewSet
+from store_requisition.views_frontend import siv_create
+from users.models import Department
+
+User = get_user_model()
+
+
+class StoreRequisitionAPIQueryTests(TestCase):
+    """Lock in the query budget of the store requisition endpoints"""
+
+    def setUp(self):
+        self.department = Department.objects.create(name="IT Department")
+        self.user = User.objects.create_user(username="manager", password="password123", role="manager")
+        category = Category.objects.create(name="Test Category")
+        uom = UnitOfMeasure.objects.create(name="Each", abbreviation="EA")
+        self.items = [
+            Item.objects.create(
+                code=f"ITEM{n:03d}",
+                description=f"Item {n}",
+                category=category,
+                unit_of_measure=uom,
+                current_balance=100,
+                current_price=Decimal('2.00')
+            )
+            for n in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create_requisitions(self, count):
+        for _ in range(count):
+            requisition = StoreRequisition.objects.create(
+                department=self.department,
+                requested_by=self.user,
+                checked_by=self.user,
+                approved_by=self.user,
+                requested_date=timezone.now().date(),
+                status='approved'
+            )
+            for item in self.items:
+                SRItem.objects.create(sr=requisition, item=item, requested_qty=2, approved_qty=2)
+            issue = StoreIssue.objects.create(
+                sr=requisition,
+                date=timezone.now().date(),
+                prepared_by=self.user,
+                checked_by=self.user,
+                issued_by=self.user,
+                received_by="Jane Doe"
+            )
+            for item in self.items:
+                SIVItem.objects.create(siv=issue, item=item, quantity=1, unit_price=Decimal('2.00'), total_price=0)
+        return requisition, issue
+
+    def test_requisition_list(self):
+        """Test listing requisitions costs count + page + items"""
+        self._create_requisitions(5)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/store-requisitions/')
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(len(response.data['results'][0]['items']), 3)
+
+    def test_requisition_detail(self):
+        """Test retrieving a requisition costs the row + its items"""
+        requisition, _ = self._create_requisitions(1)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/store-requisitions/{requisition.id}/')
+        self.assertEqual(response.data['department_name'], "IT Department")
+
+    def test_issue_list(self):
+        """Test listing store issues costs count + page + items"""
+        self._create_requisitions(5)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/store-issues/')
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_line_lists(self):
+        """Test the line endpoints join their items instead of querying per row"""
+        self._create_requisitions(3)
+        with self.assertNumQueries(2):
+            self.client.get('/api/sr-items/')
+        with self.assertNumQueries(2):
+            self.client.get('/api/siv-items/')
+
+    def test_item_details_are_opt_in(self):
+        """Test that nested item details are only serialized when expanded"""
+        requisition, _ = self._create_requisitions(1)
+
+        response = self.client.get(f'/api/store-requisitions/{requisition.id}/')
+        line = response.data['items'][0]
+        self.assertNotIn('item_details', line)
+        self.assertEqual(line['unit_of_measure'], "EA")
+
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                f'/api/store-requisitions/{requisition.id}/', {'expand': 'items.item_details'}
+            )
+        self.assertEqual(response.data['items'][0]['item_details']['category_name'], "Test Category")
+
+    def test_sparse_fieldsets(self):
+        """Test that ?fields= trims the output and skips unused prefetches"""
+        self._create_requisitions(5)
+
+        # No items requested, so no items prefetch
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/store-requisitions/', {'fields': 'id,requisition_no,status'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'requisition_no', 'status'})
+
+        response = self.client.get('/api/store-requisitions/', {'fields': 'requisition_no,items.item_code'})
+        result = response.data['results'][0]
+        self.assertEqual(set(result), {'requisition_no', 'items'})
+        self.assertEqual(set(result['items'][0]), {'item_code'})
+
+    def test_fields_do_not_affect_writes(self):
+        """Test that ?fields= on a write still validates every field"""
+        response = self.client.post(
+            '/api/sr-items/?fields=id', {'item': self.items[0].id, 'requested_qty': 1}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sr', response.data)
+
+
+class StockReservationTests(TestCase):
+    """Test cases for reserving approved requisition quantities"""
+
+    def setUp(self):
+        self.department = Department.objects.create(name="IT Department")
+        self.user = User.objects.create_user(username="manager", password="password123", role="manager")
+        self.item = Item.objects.create(
+            code="PEN001", description="Ballpoint Pen", current_balance=10, current_price=Decimal('2.00')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _requisition(self, quantity):
+        requisition = StoreRequisition.objects.create(
+            department=self.department,
+            requested_by=self.user,
+            requested_date=timezone.now().date()
+        )
+        SRItem.objects.create(sr=requisition, item=self.item, requested_qty=quantity)
+        return requisition
+
+    def _approve(self, requisition):
+        return self.client.post(f'/api/store-requisitions/{requisition.id}/approve/', {}, format='json')
+
+    def _issue(self, requisition, quantity):
+        return self.client.post('/api/store-issues/', {
+            'sr': requisition.id,
+            'date': timezone.now().date().isoformat(),
+            'prepared_by': self.user.id,
+            'received_by': "Jane Doe",
+            'items': [{'item_id': self.item.id, 'quantity': quantity, 'unit_price': '2.00'}],
+        }, format='json')
+
+    def test_approval_reserves_available_stock(self):
+        """Test that approval reserves stock and cannot promise it twice"""
+        first, second = self._requisition(6), self._requisition(6)
+
+        self.assertEqual(self._approve(first).status_code, 200)
+        response = self._approve(second)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('4 available to promise', response.data['detail'])
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'pending')
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.reserved_qty, self.item.available_quantity), (6, 4))
+        self.assertEqual(SRItem.objects.get(sr=first).reserved_qty, 6)
+
+        response = self.client.get('/api/items/availability/', {'ids': self.item.id})
+        self.assertEqual(response.data[0]['available_quantity'], 4)
+        response = self.client.get('/api/items/availability/', {'ids': self.item.id, 'sr': first.id})
+        self.assertEqual(response.data[0]['available_quantity'], 10)
+
+    def test_issue_consumes_reservation(self):
+        """Test that an issue takes its own reservation but not other requisitions'"""
+        first, second = self._requisition(6), self._requisition(5)
+        self._approve(first)
+
+        self.assertEqual(self._issue(first, 4).status_code, 201)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.current_balance, self.item.reserved_qty), (6, 2))
+        self.assertEqual(SRItem.objects.get(sr=first).reserved_qty, 2)
+
+        # Only 4 of the 6 on hand are not promised to the first requisition
+        response = self._issue(second, 5)
+        self.assertEqual(response.status_code, 400)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.current_balance, self.item.reserved_qty), (6, 2))
+
+    def test_invalid_issue_lines_are_rejected(self):
+        """Test that duplicate items and quantities below 1 are a 400"""
+        requisition = self._requisition(6)
+        self._approve(requisition)
+
+        self.assertEqual(self._issue(requisition, -5).status_code, 400)
+        response = self.client.post('/api/store-issues/', {
+            'sr': requisition.id,
+            'date': timezone.now().date().isoformat(),
+            'prepared_by': self.user.id,
+            'received_by': "Jane Doe",
+            'items': [{'item_id': self.item.id, 'quantity': 1, 'unit_price': '2.00'}] * 2,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.data)
+
+        self.assertFalse(StoreIssue.objects.exists())
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.current_balance, self.item.reserved_qty), (10, 6))
+
+    def test_close_releases_the_rest(self):
+        """Test that closing a partially issued requisition frees what was not issued"""
+        requisition = self._requisition(6)
+        self._approve(requisition)
+        self._issue(requisition, 2)
+
+        response = self.client.post(f'/api/store-requisitions/{requisition.id}/close/')
+
+        self.assertEqual((response.status_code, response.data['status']), (200, 'closed'))
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.current_balance, self.item.reserved_qty, self.item.available_quantity), (8, 0, 8))
+        self.assertEqual(SRItem.objects.get(sr=requisition).reserved_qty, 0)
+
+        # Nothing more can be issued against it, and it cannot be closed twice
+        self.assertEqual(self._issue(requisition, 1).status_code, 400)
+        self.assertEqual(self.client.post(f'/api/store-requisitions/{requisition.id}/close/').status_code, 400)
+
+    def test_close_needs_an_approved_requisition(self):
+        """Test that pending requisitions are rejected, not closed"""
+        requisition = self._requisition(6)
+
+        response = self.client.post(f'/api/store-requisitions/{requisition.id}/close/')
+
+        self.assertEqual(response.status_code, 400)
+        requisition.refresh_from_db()
+        self.assertEqual(requisition.status, 'pending')
+
+    def test_status_is_checked_under_the_lock(self):
+        """Test that a requisition changed since it was read is neither approved twice nor closed after rejection"""
+        requisition = self._requisition(6)
+        stale = StoreRequisition.objects.get(pk=requisition.pk)
+        self._approve(requisition)
+
+        with mock.patch.object(StoreRequisitionViewSet, 'get_object', return_value=stale):
+            self.assertEqual(self._approve(requisition).status_code, 400)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.reserved_qty, 6)
+
+        self.client.post(f'/api/store-requisitions/{requisition.id}/close/')
+        stale.status = 'approved'
+        with mock.patch.object(StoreRequisitionViewSet, 'get_object', return_value=stale):
+            self.assertEqual(self.client.post(f'/api/store-requisitions/{requisition.id}/close/').status_code, 400)
+            self.assertEqual(self.client.post(f'/api/store-requisitions/{requisition.id}/reject/').status_code, 400)
+        requisition.refresh_from_db()
+        self.item.refresh_from_db()
+        self.assertEqual((requisition.status, self.item.reserved_qty), ('closed', 0))
+
+    def test_issue_rechecks_the_status_under_the_lock(self):
+        """Test that an issue validated before the requisition was closed is not posted"""
+        requisition = self._requisition(6)
+        self._approve(requisition)
+        store_issue = StoreIssue.objects.create(
+            sr=requisition,
+            date=timezone.now().date(),
+            prepared_by=self.user,
+            received_by="Jane Doe"
+        )
+        self.client.post(f'/api/store-requisitions/{requisition.id}/close/')
+
+        with self.assertRaises(services.RequisitionNotIssuableError):
+            services.issue_siv_items(store_issue, [{'item_id': self.item.id, 'quantity': 2, 'unit_price': '2.00'}])
+
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.current_balance, self.item.reserved_qty), (10, 0))
+        self.assertEqual(SRItem.objects.get(sr=requisition).issued_qty, 0)
+
+    def test_delete_releases_reservation(self):
+        """Test that deleting an approved requisition frees its stock"""
+        requisition = self._requisition(6)
+        self._approve(requisition)
+
+        requisition.delete()
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.reserved_qty, 0)
+
+
+class IssueStatusTests(TestCase):
+    """Test cases for the issued quantities and status of requisitions issued in waves"""
+
+    def setUp(self):
+        department = Department.objects.create(name="IT Department")
+        self.user = User.objects.create_user(username="storekeeper", password="password123")
+        self.pen = Item.objects.create(code="PEN001", description="Ballpoint Pen", current_balance=10)
+        self.clip = Item.objects.create(code="CLP001", description="Paper Clip", current_balance=10)
+        self.requisition = StoreRequisition.objects.create(
+            department=department,
+            requested_by=self.user,
+            requested_date=timezone.now().date(),
+            status='approved'
+        )
+        SRItem.objects.create(sr=self.requisition, item=self.pen, requested_qty=6, approved_qty=5)
+        SRItem.objects.create(sr=self.requisition, item=self.clip, requested_qty=2)
+
+    def _issue(self, quantities):
+        issue = StoreIssue.objects.create(
+            sr=self.requisition,
+            date=timezone.now().date(),
+            prepared_by=self.user,
+            received_by="Jane Doe"
+        )
+        services.issue_siv_items(issue, [
+            {'item_id': item.id, 'quantity': quantity, 'unit_price': '1.00'}
+            for item, quantity in quantities
+        ])
+        self.requisition.refresh_from_db()
+
+    def test_status_follows_all_issues(self):
+        """Test that the status counts every issue, not just the latest one"""
+        # Creating the voucher alone issues nothing
+        self._issue([])
+        self.assertEqual(self.requisition.status, 'approved')
+
+        self._issue([(self.pen, 3)])
+        self.assertEqual(self.requisition.status, 'partially_issued')
+
+        self._issue([(self.pen, 2)])
+        self.assertEqual(self.requisition.status, 'partially_issued')
+
+        self._issue([(self.clip, 2)])
+        self.assertEqual(self.requisition.status, 'issued')
+        self.assertEqual(
+            dict(self.requisition.items.values_list('item__code', 'issued_qty')),
+            {"PEN001": 5, "CLP001": 2}
+        )
+
+
+class PartialIssueTests(TestCase):
+    """Test cases for issuing the rest of a partially issued requisition"""
+
+    def setUp(self):
+        self.department = Department.objects.create(name="IT Department")
+        self.user = User.objects.create_user(username="storekeeper", password="password123", role="store_keeper")
+        self.item = Item.objects.create(code="PEN001", description="Ballpoint Pen", current_balance=10)
+        self.requisition = StoreRequisition.objects.create(
+            department=self.department,
+            requested_by=self.user,
+            requested_date=timezone.now().date(),
+            status='approved'
+        )
+        SRItem.objects.create(sr=self.requisition, item=self.item, requested_qty=6, approved_qty=6)
+        services.reserve_sr_items(self.requisition.items.all())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self._issue_api(2)
+
+    def _issue_api(self, quantity):
+        return self.client.post('/api/store-issues/', {
+            'sr': self.requisition.id,
+            'date': timezone.now().date().isoformat(),
+            'prepared_by': self.user.id,
+            'received_by': "Jane Doe",
+            'items': [{'item_id': self.item.id, 'quantity': quantity, 'unit_price': '1.00'}],
+        }, format='json')
+
+    def _siv_create(self, data=None):
+        request = RequestFactory().post('/siv/create/', data) if data else RequestFactory().get('/siv/create/')
+        request.user = self.user
+        with mock.patch('store_requisition.views_frontend.render', return_value=HttpResponse()) as render, \
+                mock.patch('store_requisition.views_frontend.redirect', return_value=HttpResponse()), \
+                mock.patch('store_requisition.views_frontend.messages') as messages:
+            siv_create(request)
+        return render, messages
+
+    def _assert_state(self, status, issued, reserved):
+        self.requisition.refresh_from_db()
+        self.item.refresh_from_db()
+        sr_item = self.requisition.items.get()
+        self.assertEqual(self.requisition.status, status)
+        self.assertEqual((sr_item.issued_qty, sr_item.reserved_qty, self.item.reserved_qty), (issued, reserved, reserved))
+
+    def test_second_batch_from_the_form(self):
+        """Test that the issue form offers and accepts a partially issued requisition"""
+        self._assert_state('partially_issued', 2, 4)
+
+        render, _ = self._siv_create()
+        self.assertIn(self.requisition, render.call_args[0][2]['approved_requisitions'])
+
+        _, messages = self._siv_create({
+            'sr': self.requisition.id,
+            'received_by': "Jane Doe",
+            'items[0][item]': self.item.id,
+            'items[0][quantity]': 4,
+            'items[0][unit_price]': '1.00',
+        })
+        messages.error.assert_not_called()
+        self._assert_state('issued', 6, 0)
+        self.assertEqual(Item.objects.get(pk=self.item.pk).current_balance, 4)
+
+    def test_second_batch_from_the_api(self):
+        """Test that the API accepts a partially issued requisition but not a fully issued one"""
+        self.assertEqual(self._issue_api(4).status_code, 201)
+        self._assert_state('issued', 6, 0)
+
+        response = self._issue_api(1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sr', response.data)
 
-# Create your tests here.
@@ -1,17 +1,25 @@
-from rest_framework import viewsets, permissions, filters, status
+from rest_framework import viewsets, permissions, filters, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound
 from django_filters.rest_framework import DjangoFilterBackend
 from store_requisition.models import StoreRequisition, SRItem, StoreIssue, SIVItem
 from store_requisition.serializers import (
     StoreRequisitionSerializer, SRItemSerializer, 
     StoreIssueSerializer, SIVItemSerializer
 )
+from inventory import services
+from inventory.models import Item
+from inventory.serializers import DocumentLineSerializer
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import Prefetch
+from inventory.fieldsets import is_requested, with_item_details
 
 class StoreRequisitionViewSet(viewsets.ModelViewSet):
-    queryset = StoreRequisition.objects.all().order_by('-created_at')
+    queryset = StoreRequisition.objects.select_related(
+        'department', 'requested_by', 'checked_by', 'approved_by'
+    ).order_by('-created_at')
     serializer_class = StoreRequisitionSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -19,6 +27,14 @@ class StoreRequisitionViewSet(viewsets.ModelViewSet):
     search_fields = ['requisition_no', 'department__name']
     ordering_fields = ['requisition_no', 'requested_date', 'created_at']
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if is_requested(self.request, 'items'):
+            lines = SRItem.objects.select_related('item__unit_of_measure')
+            lines = with_item_details(lines, self.request, 'items.item_details')
+            queryset = queryset.prefetch_related(Prefetch('items', queryset=lines))
+        return queryset
+    
     @action(detail=True, methods=['post'])
     def check(self, request, pk=None):
         """Check a store requisition"""
@@ -38,9 +54,12 @@ class StoreRequisitionViewSet(viewsets.ModelViewSet):
         requisition.save()
         
         # Update items
+        sr_items = {str(sr_item.id): sr_item for sr_item in requisition.items.all()}
         items_data = request.data.get('items', [])
         for item_data in items_data:
-            sr_item = get_object_or_404(SRItem, id=item_data.get('id'), sr=requisition)
+            sr_item = sr_items.get(str(item_data.get('id')))
+            if sr_item is None:
+                raise NotFound('Requisition item not found.')
             sr_item.checked_qty = item_data.get('checked_qty', sr_item.requested_qty)
             sr_item.save()
         
@@ -49,28 +68,39 @@ class StoreRequisitionViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
-        """Approve a store requisition"""
+        """Approve a store requisition, reserving the approved quantities"""
         requisition = self.get_object()
         
-        # Validate status
-        if requisition.status not in ['pending', 'checked']:
-            return Response(
-                {'detail': 'Only pending or checked requisitions can be approved.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Update requisition
-        requisition.approved_by = request.user
-        requisition.approved_date = request.data.get('approved_date')
-        requisition.status = 'approved'
-        requisition.save()
-        
-        # Update items
-        items_data = request.data.get('items', [])
-        for item_data in items_data:
-            sr_item = get_object_or_404(SRItem, id=item_data.get('id'), sr=requisition)
-            sr_item.approved_qty = item_data.get('approved_qty', sr_item.checked_qty or sr_item.requested_qty)
-            sr_item.save()
+        try:
+            with transaction.atomic():
+                # Validate status, with the requisition locked
+                requisition = services.lock_requisition(requisition.pk)
+                if requisition.status not in ['pending', 'checked']:
+                    return Response(
+                        {'detail': 'Only pending or checked requisitions can be approved.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                # Update requisition
+                requisition.approved_by = request.user
+                requisition.approved_date = request.data.get('approved_date')
+                requisition.status = 'approved'
+                requisition.save()
+                
+                # Update items
+                sr_items = {str(sr_item.id): sr_item for sr_item in requisition.items.all()}
+                items_data = request.data.get('items', [])
+                for item_data in items_data:
+                    sr_item = sr_items.get(str(item_data.get('id')))
+                    if sr_item is None:
+                        raise NotFound('Requisition item not found.')
+                    sr_item.approved_qty = item_data.get('approved_qty', sr_item.checked_qty or sr_item.requested_qty)
+                    sr_item.save()
+                
+                # Reserve the approved quantities; fails if stock is already promised
+                services.reserve_sr_items(requisition.items.all())
+        except services.InsufficientStockError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(requisition)
         return Response(serializer.data)
@@ -80,29 +110,64 @@ class StoreRequisitionViewSet(viewsets.ModelViewSet):
         """Reject a store requisition"""
         requisition = self.get_object()
         
-        # Validate status
-        if requisition.status not in ['pending', 'checked']:
-            return Response(
-                {'detail': 'Only pending or checked requisitions can be rejected.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        with transaction.atomic():
+            # Validate status, with the requisition locked
+            requisition = services.lock_requisition(requisition.pk)
+            if requisition.status not in ['pending', 'checked']:
+                return Response(
+                    {'detail': 'Only pending or checked requisitions can be rejected.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Update requisition
+            requisition.status = 'rejected'
+            requisition.save()
+            
+            # Release anything still reserved
+            services.release_sr_items(requisition.items.all())
         
-        # Update requisition
-        requisition.status = 'rejected'
-        requisition.save()
+        serializer = self.get_serializer(requisition)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['post'])
+    def close(self, request, pk=None):
+        """Close an approved or partially issued store requisition, releasing what it still reserves"""
+        requisition = self.get_object()
+        
+        with transaction.atomic():
+            # Validate status, with the requisition locked so an issue cannot
+            # consume the reservations being released
+            requisition = services.lock_requisition(requisition.pk)
+            if requisition.status not in StoreRequisition.ISSUABLE_STATUSES:
+                return Response(
+                    {'detail': 'Only approved or partially issued requisitions can be closed.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Update requisition
+            requisition.status = 'closed'
+            requisition.save()
+            
+            # Nothing more will be issued against it
+            services.release_sr_items(requisition.items.all())
         
         serializer = self.get_serializer(requisition)
         return Response(serializer.data)
 
 class SRItemViewSet(viewsets.ModelViewSet):
-    queryset = SRItem.objects.all()
+    queryset = SRItem.objects.select_related('item__unit_of_measure')
     serializer_class = SRItemSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['sr', 'item']
+    
+    def get_queryset(self):
+        return with_item_details(super().get_queryset(), self.request)
 
 class StoreIssueViewSet(viewsets.ModelViewSet):
-    queryset = StoreIssue.objects.all().order_by('-created_at')
+    queryset = StoreIssue.objects.select_related(
+        'sr__department', 'prepared_by', 'checked_by', 'issued_by'
+    ).order_by('-created_at')
     serializer_class = StoreIssueSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -110,32 +175,46 @@ class StoreIssueViewSet(viewsets.ModelViewSet):
     search_fields = ['siv_no', 'sr__requisition_no']
     ordering_fields = ['siv_no', 'date', 'created_at']
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if is_requested(self.request, 'items'):
+            lines = SIVItem.objects.select_related('item__unit_of_measure')
+            lines = with_item_details(lines, self.request, 'items.item_details')
+            queryset = queryset.prefetch_related(Prefetch('items', queryset=lines))
+        return queryset
+    
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         """Create a store issue with items"""
-        # Extract nested items data
-        items_data = request.data.pop('items', [])
+        # Extract and check the nested lines
+        lines = DocumentLineSerializer(data=request.data.pop('items', []), many=True)
+        if not lines.is_valid():
+            raise serializers.ValidationError({'items': lines.errors})
         
         # Create store issue
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         store_issue = serializer.save()
         
-        # Create items
-        for item_data in items_data:
-            item_data['siv'] = store_issue.id
-            item_serializer = SIVItemSerializer(data=item_data)
-            item_serializer.is_valid(raise_exception=True)
-            item_serializer.save()
+        # Create items and post them out of stock in one go
+        try:
+            services.issue_siv_items(store_issue, lines.validated_data)
+        except services.RequisitionNotIssuableError as e:
+            raise serializers.ValidationError({'sr': str(e)})
+        except (KeyError, TypeError, ValueError, ArithmeticError, Item.DoesNotExist, services.InsufficientStockError) as e:
+            raise serializers.ValidationError({'items': str(e)})
         
         # Refresh and return the complete object
-        store_issue = self.get_object()
+        store_issue = self.get_queryset().get(id=store_issue.id)
         serializer = self.get_serializer(store_issue)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 class SIVItemViewSet(viewsets.ModelViewSet):
-    queryset = SIVItem.objects.all()
+    queryset = SIVItem.objects.select_related('item__unit_of_measure')
     serializer_class = SIVItemSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['siv', 'item']
+    
+    def get_queryset(self):
+        return with_item_details(super().get_queryset(), self.request)
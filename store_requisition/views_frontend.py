@@ -9,8 +9,8 @@ from django.views.decorators.http import require_POST
 from django.db import transaction
 
 from store_requisition.models import StoreRequisition, SRItem, StoreIssue, SIVItem
-from inventory.models import Item, Department
-from users.models import CustomUser
+from inventory import services
+from users.models import CustomUser, Department
 
 @login_required
 def sr_list(request):
@@ -119,13 +119,11 @@ def sr_create(request):
         except Exception as e:
             messages.error(request, f'Error creating store requisition: {str(e)}')
     
-    # Get departments and items for dropdowns
+    # Get departments for dropdown; items are looked up on demand by the form
     departments = Department.objects.all().order_by('name')
-    items = Item.objects.filter(current_balance__gt=0).order_by('code')
     
     context = {
         'departments': departments,
-        'items': items,
         'today': timezone.now().date(),
     }
     
@@ -190,6 +188,11 @@ def sr_approve(request, pk):
     if request.method == 'POST':
         try:
             with transaction.atomic():
+                # Check the status again, with the requisition locked
+                requisition = services.lock_requisition(requisition.pk)
+                if requisition.status not in ['pending', 'checked']:
+                    raise ValueError('Only pending or checked requisitions can be approved.')
+                
                 # Update requisition
                 requisition.approved_by = request.user
                 requisition.approved_date = timezone.now().date()
@@ -203,6 +206,9 @@ def sr_approve(request, pk):
                         item.approved_qty = approved_qty
                         item.save()
                 
+                # Reserve the approved quantities; fails if stock is already promised
+                services.reserve_sr_items(requisition.items.all())
+                
                 messages.success(request, f'Store Requisition {requisition.requisition_no} approved successfully.')
                 return redirect('sr_detail', pk=requisition.id)
                 
@@ -231,9 +237,18 @@ def sr_reject(request, pk):
     
     if request.method == 'POST':
         try:
-            # Update requisition
-            requisition.status = 'rejected'
-            requisition.save()
+            with transaction.atomic():
+                # Check the status again, with the requisition locked
+                requisition = services.lock_requisition(requisition.pk)
+                if requisition.status not in ['pending', 'checked']:
+                    raise ValueError('Only pending or checked requisitions can be rejected.')
+                
+                # Update requisition
+                requisition.status = 'rejected'
+                requisition.save()
+                
+                # Release anything still reserved
+                services.release_sr_items(requisition.items.all())
             
             messages.success(request, f'Store Requisition {requisition.requisition_no} rejected successfully.')
             return redirect('sr_detail', pk=requisition.id)
@@ -247,6 +262,47 @@ def sr_reject(request, pk):
     
     return render(request, 'store_requisition/sr_reject.html', context)
 
+@login_required
+def sr_close(request, pk):
+    requisition = get_object_or_404(StoreRequisition, pk=pk)
+    
+    # Check if user has permission to close requisitions
+    if request.user.role not in ['admin', 'manager']:
+        messages.error(request, 'You do not have permission to close requisitions.')
+        return redirect('sr_detail', pk=requisition.id)
+    
+    # Check if requisition is approved or partially issued
+    if requisition.status not in StoreRequisition.ISSUABLE_STATUSES:
+        messages.error(request, 'Only approved or partially issued requisitions can be closed.')
+        return redirect('sr_detail', pk=requisition.id)
+    
+    if request.method == 'POST':
+        try:
+            with transaction.atomic():
+                # Check the status again, with the requisition locked
+                requisition = services.lock_requisition(requisition.pk)
+                if requisition.status not in StoreRequisition.ISSUABLE_STATUSES:
+                    raise ValueError('Only approved or partially issued requisitions can be closed.')
+                
+                # Update requisition
+                requisition.status = 'closed'
+                requisition.save()
+                
+                # Release the quantities that will no longer be issued
+                services.release_sr_items(requisition.items.all())
+            
+            messages.success(request, f'Store Requisition {requisition.requisition_no} closed successfully.')
+            return redirect('sr_detail', pk=requisition.id)
+                
+        except Exception as e:
+            messages.error(request, f'Error closing store requisition: {str(e)}')
+    
+    context = {
+        'requisition': requisition,
+    }
+    
+    return render(request, 'store_requisition/sr_close.html', context)
+
 @login_required
 def siv_create(request, sr_id=None):
     # If sr_id is provided, get the store requisition
@@ -254,14 +310,21 @@ def siv_create(request, sr_id=None):
     if sr_id:
         sr = get_object_or_404(StoreRequisition, pk=sr_id)
         
-        # Check if requisition is approved
-        if sr.status != 'approved':
-            messages.error(request, 'Only approved requisitions can be issued.')
+        # Check if requisition is approved and not yet fully issued
+        if sr.status not in StoreRequisition.ISSUABLE_STATUSES:
+            messages.error(request, 'Only approved or partially issued requisitions can be issued.')
             return redirect('sr_detail', pk=sr_id)
     
     if request.method == 'POST':
         try:
             with transaction.atomic():
+                # The posted requisition must still be open for issue
+                issuable = StoreRequisition.objects.filter(
+                    pk=request.POST.get('sr'), status__in=StoreRequisition.ISSUABLE_STATUSES
+                )
+                if not issuable.exists():
+                    raise ValueError('Only approved or partially issued requisitions can be issued.')
+                
                 # Create store issue
                 store_issue = StoreIssue(
                     sr_id=request.POST.get('sr'),
@@ -289,15 +352,8 @@ def siv_create(request, sr_id=None):
                                 'unit_price': unit_price
                             })
                 
-                # Create SIV items
-                for item_data in items_data:
-                    SIVItem.objects.create(
-                        siv=store_issue,
-                        item_id=item_data['item_id'],
-                        quantity=item_data['quantity'],
-                        unit_price=item_data['unit_price'],
-                        total_price=float(item_data['quantity']) * float(item_data['unit_price'])
-                    )
+                # Create SIV items and post them out of stock in one go
+                services.issue_siv_items(store_issue, items_data)
                 
                 messages.success(request, f'Store Issue Voucher {store_issue.siv_no} created successfully.')
                 return redirect('siv_detail', pk=store_issue.id)
@@ -305,16 +361,15 @@ def siv_create(request, sr_id=None):
         except Exception as e:
             messages.error(request, f'Error creating store issue voucher: {str(e)}')
     
-    # Get approved requisitions for dropdown
-    approved_requisitions = StoreRequisition.objects.filter(status='approved').order_by('-created_at')
-    
-    # Get items with stock for dropdowns
-    items = Item.objects.filter(current_balance__gt=0).order_by('code')
+    # Get requisitions still to issue for dropdown
+    approved_requisitions = StoreRequisition.objects.filter(
+        status__in=StoreRequisition.ISSUABLE_STATUSES
+    ).order_by('-created_at')
     
+    # Items are looked up on demand by the form's item pickers
     context = {
         'sr': sr,
         'approved_requisitions': approved_requisitions,
-        'items': items,
     }
     
     return render(request, 'store_requisition/siv_create.html', context)
@@ -373,25 +428,8 @@ def siv_detail(request, pk):
 
 @login_required
 def sr_pending(request):
-    # Get requisitions that need action based on user role
-    user_role = request.user.role
-    
-    if user_role == 'controller':
-        # Controllers see pending requisitions
-        requisitions = StoreRequisition.objects.filter(status='pending')
-    elif user_role in ['admin', 'manager']:
-        # Managers see checked requisitions and pending requisitions
-        requisitions = StoreRequisition.objects.filter(
-            Q(status='checked') | Q(status='pending')
-        )
-    elif user_role == 'store_keeper':
-        # Store keepers see approved requisitions
-        requisitions = StoreRequisition.objects.filter(status='approved')
-    else:
-        # Staff see their own pending requisitions
-        requisitions = StoreRequisition.objects.filter(
-            requested_by=request.user
-        ).exclude(status__in=['issued', 'rejected'])
+    # Get requisitions that need action based on user role; staff see their own open ones
+    requisitions = StoreRequisition.pending_for(request.user)
     
     # Order by most recent first
     requisitions = requisitions.order_by('-created_at')
@@ -410,8 +448,8 @@ def sr_pending(request):
 
 @login_required
 def sr_approved(request):
-    # Get approved requisitions
-    requisitions = StoreRequisition.objects.filter(status='approved')
+    # Get approved requisitions, including partially issued ones
+    requisitions = StoreRequisition.objects.filter(status__in=StoreRequisition.ISSUABLE_STATUSES)
     
     # Order by most recent first
     requisitions = requisitions.order_by('-approved_date')
@@ -0,0 +1,114 @@
+"""
+API token authentication.
+
+Clients send `Authorization: Token <key>`. The key's SHA-256 is looked up
+in APIToken; validated tokens are kept in a process-local LRU cache for
+API_TOKEN_CACHE_TTL seconds, so a busy client costs one dictionary lookup
+per request instead of a query, and BasicAuthentication's password hash
+is not needed at all.
+
+Revoking a token evicts it from the cache of the process that revoked it;
+other processes stop accepting it when their entry expires, at most
+API_TOKEN_CACHE_TTL seconds later.
+
+Scopes are checked here rather than in a permission class, because every
+viewset sets its own permission_classes: a token without 'write' can
+only make safe (read) requests.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import authentication, exceptions
+from rest_framework.permissions import SAFE_METHODS
+
+from users.models import APIToken
+
+
+class TokenCache:
+    """A thread-safe LRU cache whose entries expire `ttl` seconds after they are stored."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(settings.API_TOKEN_CACHE_SIZE, settings.API_TOKEN_CACHE_TTL)
+
+
+def required_scope(request):
+    return 'read' if request.method in SAFE_METHODS else 'write'
+
+
+class APITokenAuthentication(authentication.BaseAuthentication):
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        token = self.get_token(APIToken.hash_key(key))
+        scope = required_scope(request)
+        if scope not in token.scopes:
+            raise exceptions.PermissionDenied(f"This token does not have the '{scope}' scope.")
+        return (token.user, token)
+
+    def get_token(self, key_hash):
+        token = token_cache.get(key_hash)
+        if token is None:
+            try:
+                token = APIToken.objects.select_related('user').get(key_hash=key_hash)
+            except APIToken.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            if token.is_active and token.user.is_active:
+                # Recorded on cache misses only, so at most once per TTL per process
+                token.last_used_at = timezone.now()
+                APIToken.objects.filter(pk=token.pk).update(last_used_at=token.last_used_at)
+                token_cache.set(key_hash, token)
+
+        if not token.is_active:
+            raise exceptions.AuthenticationFailed('Token revoked or expired.')
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return token
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,47 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.models import APIToken, CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Issue an API token for a user, e.g. for a scanner or an integration, and print its key once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--name', required=True, help='What the token is for')
+        parser.add_argument(
+            '--scopes',
+            default='read',
+            help='Comma-separated scopes: read, write (default: read)',
+        )
+        parser.add_argument(
+            '--expires',
+            help='Last day the token is valid (YYYY-MM-DD); defaults to never',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+
+        scopes = [scope.strip() for scope in options['scopes'].split(',') if scope.strip()]
+        valid = dict(APIToken.SCOPE_CHOICES)
+        unknown = [scope for scope in scopes if scope not in valid]
+        if unknown or not scopes:
+            raise CommandError(f"Invalid --scopes: {options['scopes']}; choose from {', '.join(valid)}")
+
+        expires_at = None
+        if options['expires']:
+            try:
+                last_day = datetime.strptime(options['expires'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f"Invalid date for --expires: {options['expires']}")
+            expires_at = timezone.make_aware(datetime.combine(last_day, time.max))
+
+        token, key = APIToken.issue(user, options['name'], scopes=scopes, expires_at=expires_at)
+        self.stdout.write(self.style.SUCCESS(f'Created token {token}. Its key will not be shown again:'))
+        self.stdout.write(key)
@@ -1,5 +1,9 @@
+import hashlib
+import secrets
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 class Department(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -24,3 +28,60 @@ class CustomUser(AbstractUser):
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.username})"
+
+class APIToken(models.Model):
+    """
+    An API key for a user. Only the SHA-256 of the key is stored: keys are
+    random and long, so a fast hash is enough and checking one costs
+    microseconds, unlike a password hash. `scopes` limits what the key may
+    do (see users.authentication).
+    """
+    SCOPE_CHOICES = (
+        ('read', 'Read'),
+        ('write', 'Write'),
+    )
+    KEY_PREFIX_LENGTH = 8
+    
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100)
+    # The first characters of the key, to tell keys apart in lists
+    prefix = models.CharField(max_length=KEY_PREFIX_LENGTH, editable=False)
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    scopes = models.JSONField(default=list)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+    last_used_at = models.DateTimeField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.prefix}...)"
+    
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+    
+    @classmethod
+    def issue(cls, user, name, scopes=('read',), expires_at=None):
+        """Create a token; returns it and its key, which is not stored and cannot be shown again."""
+        key = secrets.token_urlsafe(32)
+        token = cls.objects.create(
+            user=user,
+            name=name,
+            prefix=key[:cls.KEY_PREFIX_LENGTH],
+            key_hash=cls.hash_key(key),
+            scopes=list(scopes),
+            expires_at=expires_at,
+        )
+        return token, key
+    
+    @property
+    def is_active(self):
+        if self.revoked_at:
+            return False
+        return self.expires_at is None or self.expires_at > timezone.now()
+    
+    def revoke(self):
+        from users.authentication import token_cache
+        self.revoked_at = timezone.now()
+        self.save(update_fields=['revoked_at'])
+        token_cache.discard(self.key_hash)
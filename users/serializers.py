@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from users.models import Department, CustomUser
+from users.models import Department, CustomUser, APIToken
 from django.contrib.auth.password_validation import validate_password
 
 class DepartmentSerializer(serializers.ModelSerializer):
@@ -37,3 +37,27 @@ class UserSerializer(serializers.ModelSerializer):
             user.set_password(password)
             user.save()
         return user
+
+class APITokenSerializer(serializers.ModelSerializer):
+    scopes = serializers.ListField(
+        child=serializers.ChoiceField(choices=APIToken.SCOPE_CHOICES), allow_empty=False, default=['read']
+    )
+    is_active = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = APIToken
+        fields = ['id', 'name', 'prefix', 'scopes', 'expires_at', 'revoked_at',
+                 'last_used_at', 'created_at', 'is_active']
+        read_only_fields = ['revoked_at', 'created_at']
+    
+    def create(self, validated_data):
+        token, key = APIToken.issue(self.context['request'].user, **validated_data)
+        # The key is shown once, in the response to its creation
+        token.key = key
+        return token
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if hasattr(instance, 'key'):
+            data['key'] = instance.key
+        return data
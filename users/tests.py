@@ -1,3 +1,109 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.authentication import token_cache
+from users.models import APIToken, CustomUser
+
+
+class APITokenTests(TestCase):
+    """Test cases for API token authentication"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = CustomUser.objects.create_user(username="scanner", password="password123")
+        self.client = APIClient()
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def _use(self, key):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+
+    def test_only_the_hash_is_stored(self):
+        """Test that the key is not stored and its hash authenticates"""
+        token, key = APIToken.issue(self.user, "Scanner", scopes=['read'])
+
+        self.assertNotIn(key, (token.key_hash, token.prefix))
+        self.assertEqual(token.key_hash, APIToken.hash_key(key))
+        self._use(key)
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], "scanner")
+
+        self._use(key + 'x')
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_validated_tokens_are_cached(self):
+        """Test that repeated requests do not look the token up again"""
+        token, key = APIToken.issue(self.user, "Scanner", scopes=['read'])
+        self._use(key)
+        self.client.get('/api/users/me/')
+        self.assertIsNotNone(APIToken.objects.get(pk=token.pk).last_used_at)
+
+        # The token and its user come from the cache; only the view's query is left
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+    def test_scopes(self):
+        """Test that a read-only token cannot make unsafe requests"""
+        _, key = APIToken.issue(self.user, "Reports", scopes=['read'])
+        self._use(key)
+
+        self.assertEqual(self.client.get('/api/departments/').status_code, 200)
+        response = self.client.post('/api/departments/', {'name': "Stores"})
+        self.assertEqual(response.status_code, 403)
+
+        _, key = APIToken.issue(self.user, "Scanner", scopes=['read', 'write'])
+        self._use(key)
+        self.assertEqual(self.client.post('/api/departments/', {'name': "Stores"}).status_code, 201)
+
+    def test_revoked_and_expired_tokens(self):
+        """Test that revoking a token evicts it from the cache and expired tokens fail"""
+        token, key = APIToken.issue(self.user, "Scanner", scopes=['read'])
+        self._use(key)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+        token.revoke()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+        _, key = APIToken.issue(self.user, "Old", expires_at=timezone.now() - timedelta(days=1))
+        self._use(key)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_token_management_api(self):
+        """Test that the key is returned once and tokens can be revoked"""
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/tokens/', {'name': "Scanner", 'scopes': ['read', 'write']}, format='json')
+        self.assertEqual(response.status_code, 201)
+        key = response.data['key']
+        token_id = response.data['id']
+
+        response = self.client.get(f'/api/tokens/{token_id}/')
+        self.assertNotIn('key', response.data)
+        self.assertEqual(response.data['prefix'], key[:APIToken.KEY_PREFIX_LENGTH])
+
+        response = self.client.post(f'/api/tokens/{token_id}/revoke/')
+        self.assertFalse(response.data['is_active'])
+
+        self.client.force_authenticate(None)
+        self._use(key)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_tokens_cannot_manage_tokens(self):
+        """Test that a token cannot mint, list or revoke tokens"""
+        token, key = APIToken.issue(self.user, "Scanner", scopes=['read', 'write'])
+        self._use(key)
+
+        response = self.client.post('/api/tokens/', {'name': "Successor", 'scopes': ['read', 'write']}, format='json')
+        self.assertIn(response.status_code, (401, 403))
+        self.assertEqual(APIToken.objects.count(), 1)
+        self.assertIn(self.client.get('/api/tokens/').status_code, (401, 403))
+        self.assertIn(self.client.post(f'/api/tokens/{token.id}/revoke/').status_code, (401, 403))
 
-# Create your tests here.
+        # A logged-in session still can
+        self.client.credentials()
+        self.client.login(username="scanner", password="password123")
+        self.assertEqual(self.client.get('/api/tokens/').status_code, 200)
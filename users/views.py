@@ -1,9 +1,10 @@
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, mixins, permissions, filters
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from users.models import Department, CustomUser
-from users.serializers import DepartmentSerializer, UserSerializer
+from users.models import Department, CustomUser, APIToken
+from users.serializers import DepartmentSerializer, UserSerializer, APITokenSerializer
 
 class DepartmentViewSet(viewsets.ModelViewSet):
     queryset = Department.objects.all()
@@ -14,7 +15,7 @@ class DepartmentViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at']
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = CustomUser.objects.all()
+    queryset = CustomUser.objects.select_related('department')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -27,3 +28,28 @@ class UserViewSet(viewsets.ModelViewSet):
         """Return the current user's details"""
         serializer = self.get_serializer(request.user)
         return Response(serializer.data)
+
+class APITokenViewSet(mixins.CreateModelMixin,
+                      mixins.ListModelMixin,
+                      mixins.RetrieveModelMixin,
+                      viewsets.GenericViewSet):
+    """The current user's API tokens. The key is only returned on creation.
+    
+    Only a logged-in session can manage tokens, so a leaked token cannot mint
+    itself a successor or outlive its own revocation.
+    """
+    serializer_class = APITokenSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [SessionAuthentication]
+    
+    def get_queryset(self):
+        return APIToken.objects.filter(user=self.request.user).order_by('-created_at')
+    
+    @action(detail=True, methods=['post'])
+    def revoke(self, request, pk=None):
+        """Revoke a token; other processes stop accepting it within API_TOKEN_CACHE_TTL"""
+        token = self.get_object()
+        if token.revoked_at is None:
+            token.revoke()
+        serializer = self.get_serializer(token)
+        return Response(serializer.data)